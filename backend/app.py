@@ -2,14 +2,22 @@ from flask import Flask
 from flask_cors import CORS
 from auth_routes import auth_bp
 from profile_routes import profile_bp
-from ngo_routes import ngo_bp
+from ngo_routes import ngo_bp, dashboard_flight_stats
 from utilization_routes import utilization_bp
-from donation_routes import donation_bp
+from donation_routes import donation_bp, donation_summary_cache_stats
 from donor_routes import donor_bp
-from ngo_analytics_routes import ngo_analytics_bp
+from ngo_analytics_routes import ngo_analytics_bp, reports_flight_stats
 from donor_analytics_routes import donor_analytics_bp
-from admin_routes import admin_bp
+from admin_routes import admin_bp, admin_dashboard_cache_stats
 from reports_routes import reports_bp
+from db import release_request_connections, pool_stats
+from identity import load_identity, identity_cache_stats
+from jwt_utils import decode_cache_stats
+from idempotency import idempotency_cache_stats
+from ngo_directory import ngo_name_cache_stats
+from json_provider import make_json_provider
+import query_stats
+import metrics
 import os
 
 app = Flask(__name__)
@@ -17,6 +25,27 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'change-me-please')
 # Allow cross-origin requests from the frontend dev server (and others) for /api/* routes
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+# jsonify accepts Decimal/datetime/UUID as returned by psycopg2 (see json_provider.py)
+app.json = make_json_provider(app)
+
+# Per-request statement counts and DB time: Server-Timing header + JSON log line; registered
+# first so its before_request hook runs ahead of every other one
+query_stats.init_app(app)
+
+# Request rate/latency/error metrics per blueprint and route, served at /metrics
+metrics.init_app(app)
+metrics.register_collector("db_pool", pool_stats)
+metrics.register_collector("identity_cache", identity_cache_stats)
+metrics.register_collector("jwt_cache", decode_cache_stats)
+metrics.register_collector("admin_dashboard_cache", admin_dashboard_cache_stats)
+metrics.register_collector("ngo_dashboard_flight", dashboard_flight_stats)
+metrics.register_collector("ngo_reports_flight", reports_flight_stats)
+metrics.register_collector("idempotency_cache", idempotency_cache_stats)
+metrics.register_collector("ngo_name_cache", ngo_name_cache_stats)
+metrics.register_collector("donation_summary_cache", donation_summary_cache_stats)
+
+# Decode the bearer token and resolve ngo_id/donor_id once per request (see identity.py)
+app.before_request(load_identity)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(profile_bp)
@@ -29,6 +58,9 @@ app.register_blueprint(donor_analytics_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(reports_bp)
 
+# Hand pooled connections back even when a handler returns or raises early
+app.teardown_appcontext(release_request_connections)
+
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, current_app
 from db import get_db
 from psycopg2.extras import RealDictCursor
 from jwt_utils import encode_jwt
+from identity import invalidate_identity
+from ngo_directory import refresh_ngo_names
 import datetime
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
@@ -17,11 +19,13 @@ def login():
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     cur.execute("""
-        SELECT user_id, role
-        FROM users
-        WHERE email = %s
-          AND role = %s
-          AND password_hash = crypt(%s, password_hash)
+        SELECT u.user_id, u.role, n.ngo_id, dn.donor_id
+        FROM users u
+        LEFT JOIN ngos n ON n.user_id = u.user_id
+        LEFT JOIN donors dn ON dn.user_id = u.user_id
+        WHERE u.email = %s
+          AND u.role = %s
+          AND u.password_hash = crypt(%s, u.password_hash)
     """, (email, role, password))
 
     user = cur.fetchone()
@@ -31,7 +35,8 @@ def login():
     if not user:
         return jsonify({"error": "Invalid credentials"}), 401
 
-    # create JWT token containing user_id and role
+    # create JWT token containing user_id, role and the ngo_id/donor_id the
+    # identity layer would otherwise have to look up on every request
     # expiry as unix timestamp
     exp_ts = int((datetime.datetime.utcnow() + datetime.timedelta(days=7)).timestamp())
     payload = {
@@ -39,6 +44,10 @@ def login():
         "role": user["role"].lower(),
         "exp": exp_ts
     }
+    if user["ngo_id"] is not None:
+        payload["ngo_id"] = user["ngo_id"]
+    if user["donor_id"] is not None:
+        payload["donor_id"] = user["donor_id"]
     token = encode_jwt(payload, current_app.config["SECRET_KEY"])
 
     return jsonify({
@@ -86,6 +95,9 @@ def signup():
     conn.commit()
     cur.close()
     conn.close()
+    invalidate_identity(user_id)
+    if role == "NGO":
+        refresh_ngo_names()
 
     return jsonify({
         "message": "Signup successful",
@@ -0,0 +1,79 @@
+"""Throughput of bulk_import for a generated CSV.
+
+    python benchmarks/bench_bulk_import.py --rows 50000
+    python benchmarks/bench_bulk_import.py --rows 50000 --dry-run   # validate only, write nothing
+    python benchmarks/bench_bulk_import.py --kind utilizations --rows 10000
+
+Donations reference donors by email, as in a settlement file; utilizations
+spend a small slice of existing donations of one NGO.  Needs existing donors,
+NGOs and donations (e.g. from bench_reports.py --seed).  Uses the DATABASE_URL / DB_*
+settings from db.py; point them at a scratch database.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_import import import_donations, import_utilizations  # noqa: E402
+from db import db_connection  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kind", choices=["donations", "utilizations"], default="donations")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        rng = random.Random(42)
+        buf = io.StringIO()
+        if args.kind == "donations":
+            cur.execute("SELECT email FROM donors WHERE email IS NOT NULL LIMIT 5000")
+            emails = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT ngo_id FROM ngos LIMIT 200")
+            ngo_ids = [row[0] for row in cur.fetchall()]
+            if not emails or not ngo_ids:
+                sys.exit("no donors/NGOs to reference; seed the database first")
+            buf.write("donor_email,ngo_id,amount,purpose,donated_at\n")
+            for i in range(args.rows):
+                buf.write(f"{rng.choice(emails)},{rng.choice(ngo_ids)},{rng.randint(100, 10000)}.00,"
+                          f"{rng.choice(['Education', 'Health', 'Food'])},2026-01-{1 + i % 28:02d} 10:00:00\n")
+        else:
+            cur.execute("""
+                SELECT ngo_id FROM donations GROUP BY ngo_id ORDER BY COUNT(*) DESC LIMIT 1
+            """)
+            ngo_id = cur.fetchone()[0]
+            cur.execute("""
+                SELECT donation_id FROM donations
+                WHERE ngo_id = %s AND remaining_balance >= 50 LIMIT %s
+            """, (ngo_id, args.rows))
+            donation_ids = [row[0] for row in cur.fetchall()]
+            if not donation_ids:
+                sys.exit("no donations with a remaining balance; seed the database first")
+            buf.write("donation_id,amount_utilized,purpose,beneficiaries,location,utilized_at\n")
+            for i in range(args.rows):
+                buf.write(f"{donation_ids[i % len(donation_ids)]},{rng.randint(1, 10)}.00,Supplies,"
+                          f"{rng.randint(0, 20)},Field,2026-02-{1 + i % 28:02d}\n")
+        cur.close()
+        conn.rollback()
+        body = io.BytesIO(buf.getvalue().encode())
+
+        started = time.perf_counter()
+        if args.kind == "donations":
+            report = import_donations(conn, body, "csv", dry_run=args.dry_run)
+        else:
+            report = import_utilizations(conn, body, "csv", ngo_id=ngo_id, dry_run=args.dry_run)
+        elapsed = time.perf_counter() - started
+
+    print(f"{report['rows']} rows, {report['inserted']} inserted, {report['error_count']} invalid "
+          f"in {elapsed:.2f}s = {report['rows'] / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+"""Throughput and latency percentiles for every route, with baseline diffing.
+
+    python benchmarks/bench_endpoints.py --dataset 1m --out results.json
+    python benchmarks/bench_endpoints.py --dataset 100k=gen_100k --dataset 1m=gen_1m --out results.json
+    python benchmarks/bench_endpoints.py --dataset 1m --endpoint reports --baseline baseline.json
+    python benchmarks/bench_endpoints.py --compare results.json baseline.json --tolerance 0.1
+
+Boots ``app`` under werkzeug's threaded server in a child process (or targets
+--url, e.g. a gunicorn started with the same SECRET_KEY) and drives each
+endpoint with --concurrency client threads for --duration seconds after
+--warmup requests.  Every endpoint is first probed once; one that answers 4xx/5xx
+is reported as failed instead of timed.  Per endpoint the results hold
+requests/s, mean/p50/p90/p95/p99/max latency, the status counts and, from the
+Server-Timing header (query_stats.py), mean DB time and statements per request.
+
+A dataset is one database: ``--dataset LABEL`` benchmarks the DATABASE_URL /
+DB_* settings from db.py, ``--dataset LABEL=DBNAME`` (or ``LABEL=DSN``) runs a
+child benchmark per database.  Load each size with generate_dataset.py first;
+the busiest NGO and one of its donors are the principals, logging in uses
+--password.  Write endpoints (signup, create donation, add project/utilization,
+profile updates) only run with --writes; the bulk endpoints run as dry runs.
+Routes in app.url_map that no scenario covers are listed so new routes get added.
+
+--out merges the run into the file under its dataset label, so sizes can be
+measured separately.  --baseline / --compare flag an endpoint when a latency
+percentile grows or throughput drops by more than --tolerance (ignoring
+changes below --min-delta-ms), when it makes more statements per request, or
+when it starts failing; the exit status is 1 if anything regressed.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import db_cursor  # noqa: E402
+from jwt_utils import encode_jwt  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+IGNORED_ENDPOINTS = ("static", "metrics")
+
+_unique = count(1)
+
+
+def _donation_csv(ctx):
+    rows = "".join(f"{ctx['donor_id']},{ctx['ngo_id']},{100 + i},General\n" for i in range(100))
+    return "donor_id,ngo_id,amount,purpose\n" + rows
+
+
+def _utilization_csv(ctx):
+    return "donation_id,amount_utilized,purpose\n" + f"{ctx['donation_id']},0.01,Supplies\n" * 100
+
+
+# (label, method, path, principal, body(ctx) or None, writes)
+SCENARIOS = [
+    ("auth login", "POST", "/api/auth/login", None,
+     lambda ctx: {"email": ctx["ngo_email"], "password": ctx["password"], "role": "ngo"}, False),
+    ("ngo list", "GET", "/api/ngo/list", None, None, False),
+    ("ngo dashboard", "GET", "/api/ngo/dashboard", "ngo", None, False),
+    ("ngo profile", "GET", "/api/profile/ngo", "ngo", None, False),
+    ("donation records", "GET", "/api/donations/records?limit=100", None, None, False),
+    ("ngo donation records", "GET", "/api/donations/records?limit=100", "ngo", None, False),
+    ("ngo donation records filtered", "GET",
+     "/api/donations/records?date_from={recent}&purpose=Education&limit=50", "ngo", None, False),
+    ("ngo donation export 30d", "GET", "/api/donations/export?date_from={recent}", "ngo", None, False),
+    ("donor donation history", "GET", "/api/donations/donor/history", "donor", None, False),
+    ("ngo projects", "GET", "/api/utilization/projects?limit=200", "ngo", None, False),
+    ("ngo donations for utilization", "GET", "/api/utilization/donations", "ngo", None, False),
+    ("utilization records", "GET", "/api/utilization/records?limit=100", "ngo", None, False),
+    ("utilization export", "GET", "/api/utilization/export", "ngo", None, False),
+    ("donor list", "GET", "/api/donors/list", "ngo", None, False),
+    ("donor history", "GET", "/api/donors/{donor_id}/history", "ngo", None, False),
+    ("ngo reports", "GET", "/api/ngo-analytics/reports", "ngo", None, False),
+    ("donor reports", "GET", "/api/donor-analytics/reports", "donor", None, False),
+    ("admin dashboard", "GET", "/api/admin/dashboard", None, None, False),
+    ("overall report", "GET", "/api/reports/overall", None, None, False),
+    ("bulk donations dry run", "POST", "/api/donations/bulk?dry_run=1", "ngo", _donation_csv, False),
+    ("bulk utilizations dry run", "POST", "/api/utilization/bulk?dry_run=1", "ngo", _utilization_csv, False),
+    ("auth signup", "POST", "/api/auth/signup", None,
+     lambda ctx: {"email": f"bench-signup-{ctx['run']}-{next(_unique)}@example.org",
+                  "password": ctx["password"], "role": "donor", "name": "Bench Donor"}, True),
+    ("create donation", "POST", "/api/donations/create", "donor",
+     lambda ctx: {"ngo_id": ctx["ngo_id"], "amount": 1, "purpose": "General"}, True),
+    ("add project", "POST", "/api/utilization/add-project", "ngo",
+     lambda ctx: {"name": f"Bench project {ctx['run']}-{next(_unique)}", "budget": 1000}, True),
+    ("add utilization", "POST", "/api/utilization/add-utilization", "ngo",
+     lambda ctx: {"donation_id": ctx["donation_id"], "amount_utilized": 0.01, "purpose": "Supplies"}, True),
+    ("update donor profile", "POST", "/api/profile/donor", None, lambda ctx: ctx["donor_profile"], True),
+    ("update ngo profile", "POST", "/api/profile/ngo", None, lambda ctx: ctx["ngo_profile"], True),
+]
+
+
+def _context(password):
+    """Principals and ids the scenarios refer to, looked up in the benchmarked database."""
+    with app.app_context(), db_cursor() as cur:
+        cur.execute("""
+            SELECT n.ngo_id, n.user_id, n.email FROM ngos n
+            JOIN donations d ON d.ngo_id = n.ngo_id
+            WHERE n.user_id IS NOT NULL
+            GROUP BY n.ngo_id ORDER BY COUNT(*) DESC, n.ngo_id LIMIT 1
+        """)
+        ngo = cur.fetchone()
+        if not ngo:
+            sys.exit("needs NGOs with donations; load the database with generate_dataset.py first")
+        cur.execute("""
+            SELECT dn.donor_id, dn.user_id, dn.name, dn.phone FROM donors dn
+            JOIN donations d ON d.donor_id = dn.donor_id
+            WHERE d.ngo_id = %s AND dn.user_id IS NOT NULL
+            GROUP BY dn.donor_id ORDER BY COUNT(*) DESC, dn.donor_id LIMIT 1
+        """, (ngo["ngo_id"],))
+        donor = cur.fetchone()
+        cur.execute("""
+            SELECT donation_id FROM donations WHERE ngo_id = %s
+            ORDER BY remaining_balance DESC, donation_id LIMIT 1
+        """, (ngo["ngo_id"],))
+        donation = cur.fetchone()
+        cur.execute("SELECT MAX(donated_at) as latest FROM donations WHERE ngo_id = %s", (ngo["ngo_id"],))
+        latest = cur.fetchone()["latest"]
+        cur.execute("""
+            SELECT registration_number, registration_date::text, category, phone, city, state,
+                   country, mission, vision, website, user_id
+            FROM ngos WHERE ngo_id = %s
+        """, (ngo["ngo_id"],))
+        ngo_profile = dict(cur.fetchone())
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM donations) as donations,
+                   (SELECT COUNT(*) FROM utilizations) as utilizations,
+                   (SELECT COUNT(*) FROM ngos) as ngos,
+                   (SELECT COUNT(*) FROM donors) as donors,
+                   (SELECT COUNT(*) FROM projects) as projects
+        """)
+        rows = dict(cur.fetchone())
+    if not donor:
+        sys.exit("needs a donor with donations to the busiest NGO")
+
+    exp = int(time.time()) + 24 * 3600
+    secret = app.config["SECRET_KEY"]
+    tokens = {
+        "ngo": encode_jwt({"user_id": ngo["user_id"], "role": "ngo", "ngo_id": ngo["ngo_id"], "exp": exp}, secret),
+        "donor": encode_jwt({"user_id": donor["user_id"], "role": "donor", "donor_id": donor["donor_id"],
+                             "exp": exp}, secret),
+    }
+    return {
+        "run": int(time.time()),
+        "password": password,
+        "tokens": tokens,
+        "ngo_id": ngo["ngo_id"],
+        "ngo_email": ngo["email"],
+        "donor_id": donor["donor_id"],
+        "donation_id": donation["donation_id"],
+        "recent": (latest - timedelta(days=30)).date().isoformat(),
+        "ngo_profile": ngo_profile,
+        "donor_profile": {"user_id": donor["user_id"], "name": donor["name"], "phone": donor["phone"]},
+        "rows": rows,
+    }
+
+
+def _uncovered_routes():
+    covered = {(method, urlsplit(path).path) for _, method, path, _, _, _ in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in IGNORED_ENDPOINTS:
+            continue
+        path = rule.rule.replace("<donor_id>", "{donor_id}")
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (method, path) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+def _request(conn, method, path, headers, body):
+    started = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    payload = response.read()
+    elapsed = time.perf_counter() - started
+    return elapsed, response.status, response.getheader("Server-Timing"), payload
+
+
+def _server_timing(header):
+    """(db ms, statements) from query_stats' Server-Timing header, or (None, None)."""
+    if not header:
+        return None, None
+    for part in header.split(","):
+        fields = part.strip().split(";")
+        if fields[0] != "db":
+            continue
+        db_ms = statements = None
+        for field in fields[1:]:
+            if field.startswith("dur="):
+                db_ms = float(field[4:])
+            elif field.startswith("desc="):
+                statements = int(field[5:].strip('"').split()[0])
+        return db_ms, statements
+    return None, None
+
+
+class Target:
+    def __init__(self, url, ctx):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.ctx = ctx
+
+    def connection(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=120)
+
+    def prepare(self, method, path, principal, body):
+        path = path.format(**self.ctx)
+        headers = {}
+        if principal:
+            headers["Authorization"] = "Bearer " + self.ctx["tokens"][principal]
+
+        def make_body():
+            if body is None:
+                return None
+            value = body(self.ctx)
+            if isinstance(value, str):
+                headers["Content-Type"] = "text/csv"
+                return value.encode("utf-8")
+            headers["Content-Type"] = "application/json"
+            return json.dumps(value).encode("utf-8")
+
+        return path, headers, make_body
+
+
+def _percentile(sorted_values, pct):
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(target, scenario, concurrency, duration, warmup):
+    """Probe once, warm up, then time ``concurrency`` clients for ``duration`` seconds."""
+    label, method, path, principal, body, _ = scenario
+    path, headers, make_body = target.prepare(method, path, principal, body)
+
+    conn = target.connection()
+    try:
+        _, status, _, payload = _request(conn, method, path, headers, make_body())
+        if status >= 400:
+            return None, f"{method} {path} returned {status}: {payload[:300].decode('utf-8', 'replace')}"
+        for _ in range(warmup):
+            _request(conn, method, path, headers, make_body())
+    finally:
+        conn.close()
+
+    lock = threading.Lock()
+    latencies, statuses, db_times, statements = [], {}, [], []
+    errors = [0]
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def client():
+        conn = target.connection()
+        mine = []
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    mine.append(_request(conn, method, path, headers, make_body())[:3])
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    with lock:
+                        errors[0] += 1
+        finally:
+            conn.close()
+        with lock:
+            for elapsed, status, timing in mine:
+                latencies.append(elapsed * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status >= 400:
+                    errors[0] += 1
+                db_ms, count_ = _server_timing(timing)
+                if db_ms is not None:
+                    db_times.append(db_ms)
+                    statements.append(count_)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "method": method,
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "db_mean_ms": round(sum(db_times) / len(db_times), 3) if db_times else None,
+        "db_statements": round(sum(statements) / len(statements), 2) if statements else None,
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(_percentile(latencies, pct), 3) if latencies else None
+    return result, None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server():
+    port = _free_port()
+    env = dict(os.environ)
+    env.setdefault("DB_REQUEST_LOG", "0")
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                              env=env, stdout=subprocess.DEVNULL)
+    for _ in range(300):
+        if server.poll() is not None:
+            sys.exit(f"server exited with status {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit("server did not start listening")
+
+
+def _serve(port):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def benchmark(args):
+    ctx = _context(args.password)
+    server = None
+    url = args.url
+    if url is None:
+        server, url = _start_server()
+    target = Target(url, ctx)
+    endpoints, failed = {}, {}
+    try:
+        for scenario in SCENARIOS:
+            name = scenario[0]
+            if scenario[5] and not args.writes:
+                continue
+            if args.endpoint and not any(part in name for part in args.endpoint):
+                continue
+            result, error = run_endpoint(target, scenario, args.concurrency, args.duration, args.warmup)
+            if error:
+                failed[name] = error
+                print(f"FAIL  {name}: {error}")
+                continue
+            endpoints[name] = result
+            print(f"{name:32s} {result['rps']:9.1f} req/s  p50 {result['p50_ms']:8.1f}  "
+                  f"p95 {result['p95_ms']:8.1f}  p99 {result['p99_ms']:8.1f} ms  "
+                  f"errors {result['errors']}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "url": args.url or "werkzeug (threaded)",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "writes": args.writes,
+        },
+        "rows": ctx["rows"],
+        "endpoints": endpoints,
+        "failed": failed,
+    }
+
+
+def _merge(path, label, dataset):
+    results = {"datasets": {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            results = json.load(f)
+    results.setdefault("datasets", {})[label] = dataset
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print the per-endpoint changes; returns the list of regressions."""
+    regressions = []
+    for label, dataset in sorted(results.get("datasets", {}).items()):
+        base_dataset = baseline.get("datasets", {}).get(label)
+        if base_dataset is None:
+            print(f"[{label}] not in the baseline")
+            continue
+        print(f"[{label}] {dataset['rows'].get('donations')} donations "
+              f"(baseline {base_dataset['rows'].get('donations')})")
+        base_endpoints = base_dataset.get("endpoints", {})
+        for name in sorted(set(dataset.get("failed", {})) & set(base_endpoints)):
+            regressions.append((label, name, "now fails"))
+            print(f"  REGRESSION  {name}: now fails ({dataset['failed'][name]})")
+        for name, new in sorted(dataset.get("endpoints", {}).items()):
+            base = base_endpoints.get(name)
+            if base is None:
+                print(f"  new         {name}")
+                continue
+            problems, changes = [], []
+            for metric in LATENCY_METRICS:
+                if new[metric] is None or not base[metric]:
+                    continue
+                change = new[metric] / base[metric] - 1
+                changes.append(f"{metric[:-3]} {base[metric]:.1f}->{new[metric]:.1f}ms ({change:+.0%})")
+                if change > tolerance and new[metric] - base[metric] >= min_delta_ms:
+                    problems.append(f"{metric} {change:+.0%}")
+            if base["rps"]:
+                change = new["rps"] / base["rps"] - 1
+                changes.append(f"rps {base['rps']:.0f}->{new['rps']:.0f} ({change:+.0%})")
+                if change < -tolerance:
+                    problems.append(f"rps {change:+.0%}")
+            if (new.get("db_statements") or 0) > (base.get("db_statements") or 0) + 0.5:
+                problems.append(f"statements {base.get('db_statements')}->{new['db_statements']}")
+            if new["errors"] and not base["errors"]:
+                problems.append(f"{new['errors']} errors")
+            verdict = "REGRESSION" if problems else "ok"
+            print(f"  {verdict:10s}  {name}: {', '.join(problems + changes)}")
+            regressions.extend((label, name, problem) for problem in problems)
+        for name in sorted(set(base_endpoints) - set(dataset.get("endpoints", {})) - set(dataset.get("failed", {}))):
+            print(f"  missing     {name} (in the baseline, not measured)")
+    print(f"{len(regressions)} regression(s) at tolerance {tolerance:.0%}")
+    return regressions
+
+
+def _child_env(database):
+    env = dict(os.environ)
+    if "=" in database or "://" in database:
+        env["DATABASE_URL"] = database
+    else:
+        env.pop("DATABASE_URL", None)
+        env["DB_NAME"] = database
+    return env
+
+
+def _run_child(args, label, database):
+    if args.url:
+        sys.exit("--url benchmarks one server; give --dataset LABEL for the database it uses")
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    os.unlink(path)
+    argv = [sys.executable, os.path.abspath(__file__), "--dataset", label, "--out", path,
+            "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+            "--warmup", str(args.warmup), "--password", args.password]
+    for part in args.endpoint or ():
+        argv += ["--endpoint", part]
+    if args.writes:
+        argv.append("--writes")
+    try:
+        code = subprocess.call(argv, env=_child_env(database))
+        if code:
+            sys.exit(code)
+        with open(path) as f:
+            return json.load(f)["datasets"][label]
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", action="append", default=[],
+                        help="LABEL (current database) or LABEL=DBNAME/DSN; repeat for several sizes")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="requests per endpoint before timing")
+    parser.add_argument("--endpoint", action="append", help="only endpoints whose label contains this")
+    parser.add_argument("--writes", action="store_true", help="also run the endpoints that write")
+    parser.add_argument("--password", default="password", help="password of the NGO user for auth login")
+    parser.add_argument("--out", help="merge the results into this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("RESULTS", "BASELINE"),
+                        help="only compare two result files")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change (0.15)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="latency changes smaller than this never count as regressions")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve)
+        return
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            results = json.load(f)
+        with open(args.compare[1]) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(results, baseline, args.tolerance, args.min_delta_ms) else 0)
+
+    missing = _uncovered_routes()
+    if missing:
+        print("routes without a scenario: " + ", ".join(missing))
+
+    datasets = args.dataset or ["default"]
+    results = {"datasets": {}}
+    for spec in datasets:
+        label, _, database = spec.partition("=")
+        if database:
+            # one child per database, so the pool and caches start cold on each
+            results["datasets"][label] = _run_child(args, label, database)
+        else:
+            print(f"== {label}")
+            results["datasets"][label] = benchmark(args)
+
+    if args.out:
+        for label, dataset in results["datasets"].items():
+            _merge(args.out, label, dataset)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(results, baseline, args.tolerance, args.min_delta_ms) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Serialization cost of a large donations list response.
+
+    python benchmarks/bench_json.py [--rows 50000] [--runs 5]
+
+Builds rows shaped like the donations list query returns them (Decimal
+amounts, datetime timestamps) and times jsonify for:
+
+    convert + flask     handler converts each field with float()/str(), Flask's default provider
+    rows + stdlib       rows passed through unchanged, json_provider.StdlibJSONProvider
+    rows + orjson       rows passed through unchanged, json_provider.OrjsonJSONProvider
+
+No database is needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_provider  # noqa: E402
+
+
+def _rows(n):
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1, 9, 30)
+    return [{
+        "donation_id": i,
+        "donor_name": f"Donor {rng.randint(1, 5000)}",
+        "donor_email": f"donor{i}@example.org",
+        "amount": Decimal(rng.randint(100, 100000)) / 100,
+        "purpose": rng.choice(["Education", "Health", "Food", None]),
+        "donated_at": start + timedelta(minutes=i),
+        "utilized": Decimal(rng.randint(0, 10000)) / 100,
+    } for i in range(n)]
+
+
+def _convert(rows):
+    return [{
+        "donation_id": d.get("donation_id"),
+        "donor_name": d.get("donor_name"),
+        "donor_email": d.get("donor_email"),
+        "amount": float(d.get("amount")) if d.get("amount") is not None else 0,
+        "purpose": d.get("purpose"),
+        "donated_at": str(d.get("donated_at")) if d.get("donated_at") else None,
+        "utilized": float(d.get("utilized")) if d.get("utilized") is not None else 0,
+    } for d in rows]
+
+
+def _time(app, provider, build, runs):
+    app.json = provider(app)
+    best, size = None, 0
+    with app.app_context():
+        for _ in range(runs):
+            started = time.perf_counter()
+            body = jsonify({"donations": build()}).get_data()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+            size = len(body)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    rows = _rows(args.rows)
+    cases = [
+        ("convert + flask", DefaultJSONProvider, lambda: _convert(rows)),
+        ("rows + stdlib", json_provider.StdlibJSONProvider, lambda: rows),
+    ]
+    if json_provider.orjson is not None:
+        cases.append(("rows + orjson", json_provider.OrjsonJSONProvider, lambda: rows))
+    else:
+        print("orjson not installed; skipping the orjson case")
+
+    baseline = None
+    for label, provider, build in cases:
+        best, size = _time(app, provider, build, args.runs)
+        baseline = baseline or best
+        print(f"{label:16s}: {best * 1000:8.1f} ms  ({size / 1e6:.1f} MB, {baseline / best:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Micro-benchmark: per-request cost of ``decode_jwt`` with and without the verified-token cache.
+
+    python benchmarks/bench_jwt.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt_utils  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    secret = "bench-secret"
+    token = jwt_utils.encode_jwt(
+        {"user_id": 42, "role": "ngo", "ngo_id": 7, "exp": int(time.time()) + 7 * 86400}, secret
+    )
+
+    uncached = timeit.timeit(lambda: jwt_utils._verify(token, secret), number=args.iterations)
+    jwt_utils.decode_jwt(token, secret)
+    cached = timeit.timeit(lambda: jwt_utils.decode_jwt(token, secret), number=args.iterations)
+
+    per_uncached = uncached / args.iterations * 1e6
+    per_cached = cached / args.iterations * 1e6
+    print(f"full verification : {per_uncached:8.2f} us/token")
+    print(f"cached decode     : {per_cached:8.2f} us/token")
+    print(f"speedup           : {per_uncached / per_cached:8.1f}x")
+    print(f"cache stats       : {jwt_utils.decode_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Latency of GET /api/ngo/dashboard for one NGO with many donations.
+
+    python benchmarks/bench_ngo_dashboard.py --seed 100000 --runs 50
+    python benchmarks/bench_ngo_dashboard.py --runs 50      # reuse existing data
+
+--seed puts every seeded donation on a single NGO.  Without --ngo-id the NGO
+with the most donations is measured.  Uses the DATABASE_URL / DB_* settings
+from db.py; point them at a scratch database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import db_connection  # noqa: E402
+from jwt_utils import encode_jwt  # noqa: E402
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _seed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, help="donations to insert for one NGO before measuring")
+    parser.add_argument("--ngo-id", type=int, help="NGO to measure (default: the one with most donations)")
+    parser.add_argument("--since-days", type=int, default=30,
+                        help="prev_login age, drives the 'since last login' figures")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context(), db_connection() as conn:
+        if args.seed:
+            started = time.perf_counter()
+            _seed.seed(conn, args.seed, ngos=1, donors=5000)
+            print(f"seeded {args.seed} donations in {time.perf_counter() - started:.1f}s")
+        ngo_id = args.ngo_id
+        if ngo_id is None:
+            cur = conn.cursor()
+            cur.execute("SELECT ngo_id, COUNT(*) FROM donations GROUP BY ngo_id ORDER BY 2 DESC LIMIT 1")
+            ngo_id, donations = cur.fetchone()
+            cur.close()
+            print(f"measuring ngo_id={ngo_id} ({donations} donations)")
+
+    # prev_login is read from the token, so sign one the way /api/auth/login does
+    now = int(time.time())
+    token = encode_jwt(
+        {"user_id": 0, "role": "NGO", "ngo_id": ngo_id, "prev_login": now - args.since_days * 86400,
+         "exp": now + 3600},
+        app.config["SECRET_KEY"],
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client = app.test_client()
+    client.get("/api/ngo/dashboard", headers=headers)  # warm caches and the pool
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        response = client.get("/api/ngo/dashboard", headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    timings.sort()
+    print(f"/api/ngo/dashboard over {args.runs} runs: "
+          f"p50={statistics.median(timings):.1f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.1f}ms "
+          f"max={timings[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
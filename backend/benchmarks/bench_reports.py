@@ -0,0 +1,51 @@
+"""Latency of GET /api/reports/overall against a seeded database.
+
+    python benchmarks/bench_reports.py --seed 1000000 --runs 20
+    python benchmarks/bench_reports.py --runs 20          # reuse existing data
+
+Uses the DATABASE_URL / DB_* settings from db.py; point them at a scratch database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import db_connection  # noqa: E402
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _seed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, help="donations to insert before measuring")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.seed:
+        with app.app_context(), db_connection() as conn:
+            started = time.perf_counter()
+            _seed.seed(conn, args.seed)
+            print(f"seeded {args.seed} donations in {time.perf_counter() - started:.1f}s")
+
+    client = app.test_client()
+    client.get("/api/reports/overall")  # warm caches and the pool
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        response = client.get("/api/reports/overall")
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    timings.sort()
+    print(f"/api/reports/overall over {args.runs} runs: "
+          f"p50={statistics.median(timings):.1f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.1f}ms "
+          f"max={timings[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Python memory for building a large donations list: RealDictCursor vs tuple rows.
+
+    python benchmarks/bench_row_memory.py [--rows 50000]
+
+    dict rows     RealDictCursor.fetchall(), then a second dict per row with float()/str()
+    tuple rows    plain cursor + db.rows_as_dicts over a SELECT that returns the output columns
+
+Peak and retained sizes come from tracemalloc (Python allocations only; libpq's
+copy of the result is the same for both).  Needs donations in the database
+(e.g. from bench_reports.py --seed).
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2.extras import RealDictCursor  # noqa: E402
+
+from db import db_connection, rows_as_dicts  # noqa: E402
+
+_DICT_QUERY = """
+    SELECT d.donation_id, COALESCE(dn.name, 'Anonymous') as donor_name, d.amount, d.donated_at,
+           d.purpose, d.amount_utilized, COALESCE(n.name, 'Unknown NGO') as ngo_name
+    FROM donations d
+    LEFT JOIN donors dn ON d.donor_id = dn.donor_id
+    LEFT JOIN ngos n ON d.ngo_id = n.ngo_id
+    ORDER BY d.donated_at DESC, d.donation_id DESC
+    LIMIT %s
+"""
+
+_TUPLE_QUERY = """
+    SELECT d.donation_id,
+           CASE WHEN dn.name = '' THEN 'Unknown' ELSE COALESCE(dn.name, 'Anonymous') END as donor_name,
+           COALESCE(d.amount, 0) as amount, d.amount_utilized,
+           COALESCE(NULLIF(d.purpose, ''), 'General') as purpose, d.donated_at,
+           'Received' as status,
+           COALESCE(NULLIF(n.name, ''), 'Unknown NGO') as ngo_name
+    FROM donations d
+    LEFT JOIN donors dn ON d.donor_id = dn.donor_id
+    LEFT JOIN ngos n ON d.ngo_id = n.ngo_id
+    ORDER BY d.donated_at DESC, d.donation_id DESC
+    LIMIT %s
+"""
+
+
+def _dict_rows(conn, rows):
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(_DICT_QUERY, (rows,))
+    result = []
+    for d in cur.fetchall():
+        result.append({
+            "donation_id": d.get("donation_id"),
+            "donor_name": d.get("donor_name") or "Unknown",
+            "amount": float(d.get("amount")) if d.get("amount") is not None else 0,
+            "amount_utilized": float(d.get("amount_utilized")) if d.get("amount_utilized") is not None else 0,
+            "purpose": d.get("purpose") or "General",
+            "donated_at": str(d.get("donated_at")) if d.get("donated_at") else None,
+            "status": "Received",
+            "ngo_name": d.get("ngo_name") or "Unknown NGO",
+        })
+    cur.close()
+    return result
+
+
+def _tuple_rows(conn, rows):
+    cur = conn.cursor()
+    cur.execute(_TUPLE_QUERY, (rows,))
+    result = rows_as_dicts(cur)
+    cur.close()
+    return result
+
+
+def _measure(fn, conn, rows):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(conn, rows)
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), elapsed, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        _tuple_rows(conn, args.rows)  # warm the buffer cache
+        results = [
+            ("dict rows", _measure(_dict_rows, conn, args.rows)),
+            ("tuple rows", _measure(_tuple_rows, conn, args.rows)),
+        ]
+        conn.rollback()
+
+    base_peak = results[0][1][3]
+    for label, (count, elapsed, retained, peak) in results:
+        print(f"{label:10s}: {count} rows  peak {peak / 1e6:7.1f} MB  retained {retained / 1e6:7.1f} MB  "
+              f"{elapsed * 1000:7.1f} ms  ({peak / base_peak:.2f}x peak)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Assert via EXPLAIN that the hot queries can use the access-path indexes.
+
+    python benchmarks/check_plans.py
+
+The statements checked are the ones the routes actually run: each hot
+endpoint is requested through Flask's test client, its statements are
+captured with their parameters bound (``query_stats.captured_statements``),
+and the ones matching the entry's SQL fragment are EXPLAINed.  Sequential
+scans are disabled for the session, so on a small database the planner still
+has to show whether each predicate can be answered from an index.  An entry
+fails when the endpoint no longer runs a matching statement, when the plan
+does not use each expected index, or when a scan on that index keeps part of
+the WHERE clause as a row-by-row ``Filter`` instead of an index condition --
+which is what a non-sargable predicate such as
+``EXTRACT(YEAR FROM donated_at) = ...`` turns into.  Exits non-zero on
+failure.
+
+Uses the DATABASE_URL / DB_* settings from db.py; needs a migrated database
+with at least one NGO and one donor with donations (as check_statement_budgets.py).
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from check_statement_budgets import _principals  # noqa: E402
+from db import db_connection  # noqa: E402
+from identity import _identity_cache  # noqa: E402
+from jwt_utils import decode_jwt, encode_jwt  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+from query_stats import captured_statements  # noqa: E402
+
+_PAGE = encode_cursor(datetime(2026, 1, 1), 10**9)
+
+# (label, path, principal, SQL fragment of the statement, expected indexes);
+# "-by-user" principals carry no ngo_id/donor_id claim, so the identity
+# lookup runs
+HOT_PATHS = [
+    (
+        "donation records page",
+        f"/api/donations/records?date_from=2020-01-01&date_to=2030-12-31&cursor={_PAGE}",
+        "ngo", "ORDER BY d.donated_at", ["donations_ngo_donated_at"],
+    ),
+    (
+        "all donation records page",
+        f"/api/donations/records?limit=100&cursor={_PAGE}",
+        None, "ORDER BY d.donated_at", ["donations_donated_at"],
+    ),
+    (
+        "dashboard donations and latest utilization",
+        "/api/ngo/dashboard", "ngo", "FROM ngos",
+        ["donations_ngo_donated_at", "utilizations_ngo_utilized_at"],
+    ),
+    (
+        "donor history",
+        "/api/donations/donor/history", "donor", "FROM donations d",
+        ["donations_donor_donated_at"],
+    ),
+    (
+        "utilization records page",
+        f"/api/utilization/records?cursor={_PAGE}", "ngo", "ORDER BY u.utilized_at",
+        ["utilizations_ngo_utilized_at"],
+    ),
+    (
+        "ngo identity lookup",
+        "/api/utilization/donations", "ngo-by-user", "FROM ngos WHERE user_id",
+        ["ngos_user_id"],
+    ),
+    (
+        "donor identity lookup",
+        "/api/donations/donor/history", "donor-by-user", "FROM donors WHERE user_id",
+        ["donors_user_id"],
+    ),
+    (
+        "ngo analytics",
+        "/api/ngo-analytics/reports", "ngo", "FROM donation_monthly_rollup r",
+        ["donation_monthly_rollup_ngo"],
+    ),
+    (
+        "donor analytics",
+        "/api/donor-analytics/reports", "donor", "FROM donation_monthly_rollup r",
+        ["donation_monthly_rollup_donor"],
+    ),
+]
+
+
+def _by_user(headers):
+    """The same principal's token without the ngo_id/donor_id claim."""
+    secret = app.config["SECRET_KEY"]
+    payload = decode_jwt(headers["Authorization"].split(" ", 1)[1], secret)
+    payload.pop("ngo_id", None)
+    payload.pop("donor_id", None)
+    return {"Authorization": "Bearer " + encode_jwt(payload, secret)}
+
+
+def capture(headers, donor_id):
+    """{label: [bound statements matching the entry's fragment]} from one request each."""
+    headers = dict(headers, **{f"{role}-by-user": _by_user(headers[role]) for role in ("ngo", "donor")})
+    client = app.test_client()
+    captured = {}
+    for label, path, principal, fragment, _ in HOT_PATHS:
+        _identity_cache.clear()
+        with captured_statements() as statements:
+            response = client.get(path.format(donor_id=donor_id), headers=headers[principal])
+        if response.status_code != 200:
+            raise RuntimeError(f"{label}: GET {path} returned {response.status_code}")
+        captured[label] = [sql for sql in statements if fragment in sql]
+    return captured
+
+
+def _index_scans(node, parent=None):
+    """(index name, scan node, parent node) for every index scan in a JSON plan."""
+    if "Index Name" in node:
+        yield node["Index Name"], node, parent
+    for child in node.get("Plans", ()):
+        yield from _index_scans(child, node)
+
+
+def _filtered(node, parent):
+    # a bitmap index scan's rows are rechecked and filtered by its heap scan
+    if node["Node Type"] == "Bitmap Index Scan" and parent is not None:
+        return "Filter" in parent
+    return "Filter" in node
+
+
+def check(conn, captured):
+    """Return a list of (label, problem, plan text) for failing entries."""
+    failures = []
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for label, path, _, fragment, indexes in HOT_PATHS:
+            statements = captured.get(label)
+            if not statements:
+                failures.append((label, f"GET {path} ran no statement matching {fragment!r}", ""))
+                continue
+            for sql in statements:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+                scans = list(_index_scans(cur.fetchone()[0][0]["Plan"]))
+                problems = [
+                    f"expected {index}" if not any(name == index for name, _, _ in scans)
+                    else f"{index} scan keeps a Filter"
+                    for index in indexes
+                    if not any(name == index and not _filtered(node, parent) for name, node, parent in scans)
+                ]
+                if problems:
+                    cur.execute("EXPLAIN " + sql)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                    failures.append((label, ", ".join(problems), plan))
+    finally:
+        conn.rollback()
+        cur.close()
+    return failures
+
+
+if __name__ == "__main__":
+    captured = capture(*_principals())
+    with db_connection() as conn:
+        failures = check(conn, captured)
+    for label, problem, plan in failures:
+        print(f"FAIL  {label}: {problem}\n{plan}\n")
+    print(f"{len(HOT_PATHS) - len({f[0] for f in failures})}/{len(HOT_PATHS)} hot queries use their index")
+    sys.exit(1 if failures else 0)
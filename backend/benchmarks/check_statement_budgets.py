@@ -0,0 +1,97 @@
+"""Assert that the hot read endpoints stay within their statement budgets.
+
+    python benchmarks/check_statement_budgets.py
+
+Each endpoint is requested once through Flask's test client with the app in
+testing mode, so a statement shape repeated more than N_PLUS_ONE_THRESHOLD
+times raises NPlusOneError out of the request, and the whole request must
+fit in the budget below.  Budgets count every statement the request runs,
+identity lookups included; the pool's idle-connection check is not counted.
+Exits non-zero on failure.
+
+Uses the DATABASE_URL / DB_* settings from db.py; needs at least one NGO and
+one donor with donations (e.g. from bench_reports.py --seed).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from db import db_cursor  # noqa: E402
+from jwt_utils import encode_jwt  # noqa: E402
+from query_stats import NPlusOneError, statement_budget  # noqa: E402
+
+# (label, path, principal, max statements)
+BUDGETS = [
+    ("ngo list", "/api/ngo/list", None, 1),
+    ("ngo dashboard", "/api/ngo/dashboard", "ngo", 1),
+    ("ngo profile", "/api/profile/ngo", "ngo", 3),
+    ("donation records", "/api/donations/records", "ngo", 2),
+    ("donor donation history", "/api/donations/donor/history", "donor", 1),
+    ("ngo projects", "/api/utilization/projects", "ngo", 1),
+    ("ngo donations for utilization", "/api/utilization/donations", "ngo", 1),
+    ("utilization records", "/api/utilization/records", "ngo", 2),
+    ("donor list", "/api/donors/list", "ngo", 1),
+    ("donor history", "/api/donors/{donor_id}/history", "ngo", 2),
+    ("ngo reports", "/api/ngo-analytics/reports", "ngo", 8),
+    ("donor reports", "/api/donor-analytics/reports", "donor", 5),
+    ("admin dashboard", "/api/admin/dashboard", None, 4),
+    ("overall report", "/api/reports/overall", None, 2),
+]
+
+
+def _principals():
+    with db_cursor() as cur:
+        cur.execute("SELECT ngo_id, user_id FROM ngos WHERE user_id IS NOT NULL ORDER BY ngo_id LIMIT 1")
+        ngo = cur.fetchone()
+        cur.execute("""
+            SELECT dn.donor_id, dn.user_id FROM donors dn
+            WHERE dn.user_id IS NOT NULL
+              AND EXISTS (SELECT 1 FROM donations d WHERE d.donor_id = dn.donor_id AND d.ngo_id = %s)
+            ORDER BY dn.donor_id LIMIT 1
+        """, (ngo["ngo_id"] if ngo else None,))
+        donor = cur.fetchone()
+    if not ngo or not donor:
+        sys.exit("needs an NGO and a donor with donations; seed the database first")
+    exp = int(time.time()) + 3600
+    secret = app.config["SECRET_KEY"]
+    headers = {
+        "ngo": {"Authorization": "Bearer " + encode_jwt(
+            {"user_id": ngo["user_id"], "role": "ngo", "ngo_id": ngo["ngo_id"], "exp": exp}, secret)},
+        "donor": {"Authorization": "Bearer " + encode_jwt(
+            {"user_id": donor["user_id"], "role": "donor", "donor_id": donor["donor_id"], "exp": exp}, secret)},
+        None: {},
+    }
+    return headers, donor["donor_id"]
+
+
+def check():
+    """Return a list of (label, message) for endpoints over budget or failing."""
+    app.testing = True
+    headers, donor_id = _principals()
+    client = app.test_client()
+    failures = []
+    for label, path, principal, budget in BUDGETS:
+        path = path.format(donor_id=donor_id)
+        try:
+            with statement_budget(budget, label) as stats:
+                response = client.get(path, headers=headers[principal])
+        except (AssertionError, NPlusOneError) as e:
+            failures.append((label, f"{type(e).__name__}: {e}"))
+            continue
+        if response.status_code >= 400:
+            failures.append((label, f"{path} returned {response.status_code}: "
+                                    f"{response.get_data(as_text=True)[:500]}"))
+            continue
+        print(f"ok    {label}: {stats.statements}/{budget} statements")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check()
+    for label, message in failures:
+        print(f"FAIL  {label}: {message}\n")
+    print(f"{len(BUDGETS) - len(failures)}/{len(BUDGETS)} endpoints within budget")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,404 @@
+"""Bulk ingestion of donations and utilizations from CSV or NDJSON.
+
+The input is streamed into a temporary staging table with COPY, identifiers
+are resolved and every row is validated with set-based SQL, and the valid rows
+are inserted together with their ledger and rollup updates in the same
+transaction.
+
+Donation columns (CSV header or NDJSON keys), all optional except ``amount``:
+
+    donor_id | donor_email    the donor; both empty means an anonymous donation
+    ngo_id | ngo_name         the NGO (implied when the import is scoped to one)
+    amount, purpose
+    donated_at                defaults to the time of the import
+
+Utilization columns, ``donation_id`` and ``amount_utilized`` required:
+
+    donation_id               must belong to the NGO the import is scoped to
+    project_id                optional, must belong to the same NGO
+    amount_utilized, purpose, beneficiaries, location
+    utilized_at               defaults to the time of the import
+
+Utilization rows are checked against their donation's remaining balance
+cumulatively, in file order, with the donations locked for the duration; a
+row rejected for any reason does not count against the balance.
+
+By default nothing is written when any row is invalid; ``partial`` inserts the
+valid rows and reports the rest, ``dry_run`` only validates.
+
+    python bulk_import.py donations|utilizations FILE [--format csv|ndjson] [--ngo-id N]
+                          [--partial] [--dry-run]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+import psycopg2
+
+from ledger import lock_donations, apply_utilizations
+from rollups import record_donations, record_utilizations
+
+MAX_REPORTED_ERRORS = int(os.environ.get("BULK_MAX_REPORTED_ERRORS", 1000))
+
+FORMATS = ("csv", "ndjson")
+
+DONATION_COLUMNS = ("donor_id", "donor_email", "ngo_id", "ngo_name", "amount", "purpose", "donated_at")
+
+UTILIZATION_COLUMNS = ("donation_id", "project_id", "amount_utilized", "purpose", "beneficiaries",
+                       "location", "utilized_at")
+
+_INT = r"'^\s*[0-9]{1,9}\s*$'"
+_NUMBER = r"'^\s*[+-]?([0-9]+(\.[0-9]*)?|\.[0-9]+)\s*$'"
+
+
+def _blank(column):
+    return f"NULLIF(trim({column}), '') IS NULL"
+
+
+def _name_key(column):
+    # ngo_directory.normalize_name in SQL: case-folded, whitespace collapsed
+    return f"lower(regexp_replace(trim({column}), '\\s+', ' ', 'g'))"
+
+
+def _copy_into(cur, table, columns, stream, fmt):
+    """COPY CSV or NDJSON rows from a binary or text stream into ``table``.
+
+    Each staged row gets ``row_no``: the 1-based data row for CSV, the line
+    number for NDJSON.  Raises ValueError for input that cannot be loaded.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+    if fmt == "csv":
+        header = stream.readline()
+        if isinstance(header, bytes):
+            header = header.decode("utf-8-sig")
+        names = [name.strip().lower() for name in next(csv.reader([header]), [])]
+        if not any(names):
+            raise ValueError("Empty input: a CSV header row is required")
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicate column in CSV header")
+        copy_sql = f"COPY {table} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)"
+        source = stream
+    else:
+        source = io.StringIO()
+        writer = csv.writer(source)
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {line_no}")
+            if not isinstance(obj, dict):
+                raise ValueError(f"Line {line_no} is not a JSON object")
+            unknown = [key for key in obj if key not in columns]
+            if unknown:
+                raise ValueError(f"Unknown field(s) on line {line_no}: {', '.join(unknown)}")
+            writer.writerow([line_no] + [obj.get(name) for name in columns])
+        source.seek(0)
+        copy_sql = f"COPY {table} (row_no, {', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    try:
+        cur.copy_expert(copy_sql, source)
+    except psycopg2.DataError as e:
+        detail = e.diag.message_primary or str(e)
+        if e.diag.context:
+            detail += f" ({e.diag.context.strip()})"
+        raise ValueError(f"Malformed input: {detail}")
+
+
+def _report(cur, table, rows, inserted):
+    cur.execute(f"SELECT COUNT(*) FROM {table} WHERE error IS NOT NULL")
+    error_count = cur.fetchone()[0]
+    cur.execute(
+        f"SELECT row_no, error FROM {table} WHERE error IS NOT NULL ORDER BY row_no LIMIT %s",
+        (MAX_REPORTED_ERRORS,)
+    )
+    return {
+        "rows": rows,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": [{"row": row_no, "error": error} for row_no, error in cur.fetchall()],
+    }
+
+
+def import_donations(conn, stream, fmt="csv", ngo_id=None, partial=False, dry_run=False):
+    """Load donations from ``stream`` and return the import report.
+
+    ``ngo_id`` scopes the import to one NGO: rows may omit the NGO, and rows
+    naming another NGO are rejected.  Commits on success, rolls back otherwise.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TEMP TABLE donation_staging (
+                row_no       serial,
+                donor_id     text,
+                donor_email  text,
+                ngo_id       text,
+                ngo_name     text,
+                amount       text,
+                purpose      text,
+                donated_at   text
+            ) ON COMMIT DROP
+        """)
+        _copy_into(cur, "donation_staging", DONATION_COLUMNS, stream, fmt)
+        rows = cur.rowcount
+
+        # Resolve and validate every row in one pass.  NGOs are matched by id, else by
+        # name on ngo_directory's normalized key; donors by id, else by case-insensitive email.  Names and emails
+        # are not unique, so more than one match is reported as ambiguous.
+        cur.execute(f"""
+            CREATE TEMP TABLE donation_resolved ON COMMIT DROP AS
+            SELECT s.row_no, v.donor_ref, v.ngo_ref, v.amount_value, v.donated_at_value,
+                   NULLIF(trim(s.purpose), '') as purpose,
+                   CASE
+                       WHEN {_blank('s.amount')} THEN 'Missing amount'
+                       WHEN v.amount_value IS NULL THEN 'Invalid amount'
+                       WHEN v.amount_value <= 0 THEN 'Amount must be positive'
+                       WHEN NOT {_blank('s.donated_at')} AND v.donated_at_value IS NULL
+                           THEN 'Invalid donated_at'
+                       WHEN {_blank('s.ngo_id')} AND n_name.matches > 1 THEN 'Ambiguous NGO name'
+                       WHEN v.ngo_ref IS NULL AND {_blank('s.ngo_id')} AND {_blank('s.ngo_name')}
+                           THEN 'Missing NGO'
+                       WHEN v.ngo_ref IS NULL THEN 'Unknown NGO'
+                       WHEN %(scope)s::int IS NOT NULL AND v.ngo_ref <> %(scope)s::int
+                           THEN 'NGO outside this import'
+                       WHEN {_blank('s.donor_id')} AND d_email.matches > 1 THEN 'Ambiguous donor email'
+                       WHEN v.donor_ref IS NULL AND NOT ({_blank('s.donor_id')} AND {_blank('s.donor_email')})
+                           THEN 'Unknown donor'
+                   END as error
+            FROM donation_staging s
+            LEFT JOIN ngos n_id
+                ON n_id.ngo_id = CASE WHEN s.ngo_id ~ {_INT} THEN trim(s.ngo_id)::int END
+            LEFT JOIN (
+                SELECT {_name_key('name')} as name_key, MIN(ngo_id) as ngo_id, COUNT(*) as matches
+                FROM ngos
+                WHERE {_name_key('name')} IN (SELECT {_name_key('ngo_name')} FROM donation_staging)
+                GROUP BY {_name_key('name')}
+            ) n_name ON n_name.name_key = {_name_key('s.ngo_name')}
+            LEFT JOIN donors d_id
+                ON d_id.donor_id = CASE WHEN s.donor_id ~ {_INT} THEN trim(s.donor_id)::int END
+            LEFT JOIN (
+                SELECT lower(email) as email, MIN(donor_id) as donor_id, COUNT(*) as matches
+                FROM donors
+                WHERE lower(email) IN (SELECT lower(trim(donor_email)) FROM donation_staging)
+                GROUP BY lower(email)
+            ) d_email ON d_email.email = lower(trim(s.donor_email))
+            CROSS JOIN LATERAL (
+                SELECT
+                    CASE WHEN s.amount ~ {_NUMBER} THEN trim(s.amount)::numeric END as amount_value,
+                    CASE WHEN NOT {_blank('s.donated_at')}
+                         THEN bulk_try_timestamp(trim(s.donated_at)) END as donated_at_value,
+                    CASE WHEN NOT {_blank('s.ngo_id')} THEN n_id.ngo_id
+                         WHEN n_name.matches = 1 THEN n_name.ngo_id
+                         WHEN {_blank('s.ngo_name')} THEN %(scope)s::int END as ngo_ref,
+                    CASE WHEN NOT {_blank('s.donor_id')} THEN d_id.donor_id
+                         WHEN d_email.matches = 1 THEN d_email.donor_id END as donor_ref
+            ) v
+        """, {"scope": ngo_id})
+
+        report = _report(cur, "donation_resolved", rows, 0)
+        if dry_run or (report["error_count"] and not partial):
+            conn.rollback()
+            return report
+
+        cur.execute("""
+            INSERT INTO donations (donor_id, ngo_id, amount, purpose, donated_at)
+            SELECT donor_ref, ngo_ref, amount_value, purpose,
+                   COALESCE(donated_at_value, CURRENT_TIMESTAMP)
+            FROM donation_resolved
+            WHERE error IS NULL
+            ORDER BY row_no
+            RETURNING donation_id
+        """)
+        donation_ids = [row[0] for row in cur.fetchall()]
+        record_donations(cur, donation_ids)
+        conn.commit()
+        report["inserted"] = len(donation_ids)
+        return report
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def allocate_in_order(rows):
+    """Greedy allocation of ``(row_no, donation_id, amount, remaining_balance)``
+    rows in row order; returns the row numbers that do not fit in what is left
+    of their donation after the rows accepted before them."""
+    spent = {}
+    rejected = []
+    for row_no, donation_id, amount, balance in rows:
+        total = spent.get(donation_id, 0) + amount
+        if total > balance:
+            rejected.append(row_no)
+        else:
+            spent[donation_id] = total
+    return rejected
+
+
+def import_utilizations(conn, stream, fmt="csv", ngo_id=None, partial=False, dry_run=False):
+    """Load utilizations from ``stream`` and return the import report.
+
+    With ``ngo_id`` every donation (and project) must belong to that NGO;
+    without it each row is booked to its donation's NGO.  Commits on success,
+    rolls back otherwise.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TEMP TABLE utilization_staging (
+                row_no           serial,
+                donation_id      text,
+                project_id       text,
+                amount_utilized  text,
+                purpose          text,
+                beneficiaries    text,
+                location         text,
+                utilized_at      text
+            ) ON COMMIT DROP
+        """)
+        _copy_into(cur, "utilization_staging", UTILIZATION_COLUMNS, stream, fmt)
+        rows = cur.rowcount
+
+        # Lock the referenced donations before reading their balances, as
+        # add_utilization does, so concurrent writers cannot over-allocate them;
+        # an NGO-scoped import never locks another NGO's donations
+        cur.execute(f"""
+            SELECT DISTINCT trim(donation_id)::int FROM utilization_staging
+            WHERE donation_id ~ {_INT}
+        """)
+        lock_donations(cur, [row[0] for row in cur.fetchall()], ngo_id=ngo_id)
+
+        cur.execute(f"""
+            CREATE TEMP TABLE utilization_resolved ON COMMIT DROP AS
+            SELECT s.row_no, d.donation_id, d.ngo_id, p.project_id, v.amount_value,
+                   v.beneficiaries_value, v.utilized_at_value,
+                   NULLIF(trim(s.purpose), '') as purpose,
+                   NULLIF(trim(s.location), '') as location,
+                   COALESCE(d.remaining_balance, 0) as remaining_balance,
+                   CASE
+                       WHEN {_blank('s.donation_id')} THEN 'Missing donation_id'
+                       WHEN d.donation_id IS NULL THEN 'Unknown donation'
+                       WHEN %(scope)s::int IS NOT NULL AND d.ngo_id IS DISTINCT FROM %(scope)s::int
+                           THEN 'Donation belongs to another NGO'
+                       WHEN {_blank('s.amount_utilized')} THEN 'Missing amount_utilized'
+                       WHEN v.amount_value IS NULL THEN 'Invalid amount_utilized'
+                       WHEN v.amount_value <= 0 THEN 'amount_utilized must be positive'
+                       WHEN NOT {_blank('s.project_id')} AND p.project_id IS NULL THEN 'Unknown project'
+                       WHEN p.ngo_id IS DISTINCT FROM d.ngo_id AND p.project_id IS NOT NULL
+                           THEN 'Project belongs to another NGO'
+                       WHEN NOT {_blank('s.beneficiaries')} AND v.beneficiaries_value IS NULL
+                           THEN 'Invalid beneficiaries'
+                       WHEN NOT {_blank('s.utilized_at')} AND v.utilized_at_value IS NULL
+                           THEN 'Invalid utilized_at'
+                   END as error
+            FROM utilization_staging s
+            LEFT JOIN donations d
+                ON d.donation_id = CASE WHEN s.donation_id ~ {_INT} THEN trim(s.donation_id)::int END
+            LEFT JOIN projects p
+                ON p.project_id = CASE WHEN s.project_id ~ {_INT} THEN trim(s.project_id)::int END
+            CROSS JOIN LATERAL (
+                SELECT
+                    CASE WHEN s.amount_utilized ~ {_NUMBER}
+                         THEN trim(s.amount_utilized)::numeric END as amount_value,
+                    CASE WHEN s.beneficiaries ~ {_INT}
+                         THEN trim(s.beneficiaries)::int END as beneficiaries_value,
+                    CASE WHEN NOT {_blank('s.utilized_at')}
+                         THEN bulk_try_timestamp(trim(s.utilized_at)) END as utilized_at_value
+            ) v
+        """, {"scope": ngo_id})
+
+        # Balance check over the whole batch: each donation's rows are taken in
+        # file order and a row that no longer fits is rejected without using
+        # up any of the balance.  Only donations whose valid rows overrun
+        # their balance need walking.
+        cur.execute("""
+            SELECT row_no, donation_id, amount_value, remaining_balance
+            FROM utilization_resolved
+            WHERE error IS NULL AND donation_id IN (
+                SELECT donation_id FROM utilization_resolved
+                WHERE error IS NULL
+                GROUP BY donation_id, remaining_balance
+                HAVING SUM(amount_value) > remaining_balance
+            )
+            ORDER BY row_no
+        """)
+        rejected = allocate_in_order(cur.fetchall())
+        if rejected:
+            cur.execute(
+                "UPDATE utilization_resolved SET error = 'Exceeds the donation''s remaining balance' "
+                "WHERE row_no = ANY(%s)",
+                (rejected,)
+            )
+
+        report = _report(cur, "utilization_resolved", rows, 0)
+        if dry_run or (report["error_count"] and not partial):
+            conn.rollback()
+            return report
+
+        cur.execute("""
+            INSERT INTO utilizations (ngo_id, donation_id, project_id, amount_utilized, purpose,
+                                      beneficiaries, location, utilized_at)
+            SELECT ngo_id, donation_id, project_id, amount_value, purpose,
+                   beneficiaries_value, location, COALESCE(utilized_at_value, CURRENT_TIMESTAMP)
+            FROM utilization_resolved
+            WHERE error IS NULL
+            ORDER BY row_no
+            RETURNING utilization_id
+        """)
+        utilization_ids = [row[0] for row in cur.fetchall()]
+        apply_utilizations(cur, utilization_ids)
+        record_utilizations(cur, utilization_ids)
+        conn.commit()
+        report["inserted"] = len(utilization_ids)
+        return report
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+_IMPORTERS = {
+    "donations": import_donations,
+    "utilizations": import_utilizations,
+}
+
+
+if __name__ == "__main__":
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description="Bulk-load donations or utilizations from CSV or NDJSON")
+    parser.add_argument("kind", choices=sorted(_IMPORTERS))
+    parser.add_argument("file", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+    parser.add_argument("--ngo-id", type=int, help="scope the import to one NGO")
+    parser.add_argument("--partial", action="store_true", help="insert valid rows even if some are invalid")
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    try:
+        with db_connection() as conn:
+            report = _IMPORTERS[args.kind](conn, source, fmt, ngo_id=args.ngo_id,
+                                           partial=args.partial, dry_run=args.dry_run)
+    except ValueError as e:
+        sys.exit(f"error: {e}")
+    finally:
+        source.close()
+
+    for err in report["errors"]:
+        print(f"row {err['row']}: {err['error']}")
+    print(f"{report['rows']} rows, {report['inserted']} inserted, {report['error_count']} invalid")
+    sys.exit(1 if report["error_count"] and not (args.partial or args.dry_run) else 0)
@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL (seconds)."""
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class StaleWhileRevalidate:
+    """One cached value that is recomputed at most once per refresh.
+
+    A value younger than ``ttl`` seconds is served as is.  Once it is stale
+    (``ttl`` elapsed or ``invalidate()`` called) it is still served for up to
+    ``stale_ttl`` more seconds while a single background thread recomputes it.
+    With no usable value the first caller computes synchronously and concurrent
+    callers wait for that result instead of starting their own.
+
+    ``invalidate()`` never makes a value stale earlier than ``min_interval``
+    seconds after it was computed, so a burst of writes costs one refresh.
+    """
+
+    def __init__(self, ttl=30.0, stale_ttl=300.0, min_interval=5.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.min_interval = min_interval
+        self._value = _MISSING
+        self._computed_at = 0.0
+        self._fresh_until = 0.0
+        self._stale_until = 0.0
+        self._generation = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.invalidations = 0
+
+    def get(self, compute):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not _MISSING:
+                if now < self._fresh_until:
+                    self.hits += 1
+                    return self._value
+                if now < self._stale_until:
+                    self.stale_hits += 1
+                    if not self._refreshing:
+                        self._refreshing = True
+                        threading.Thread(target=self._refresh, args=(compute,), daemon=True).start()
+                    return self._value
+
+        with self._compute_lock:
+            with self._lock:
+                # another caller may have filled it while we waited
+                if self._value is not _MISSING and time.monotonic() < self._fresh_until:
+                    self.hits += 1
+                    return self._value
+                self.misses += 1
+            return self._compute(compute)
+
+    def _compute(self, compute):
+        # caller holds _compute_lock
+        with self._lock:
+            generation = self._generation
+        started = time.monotonic()
+        value = compute()
+        with self._lock:
+            self._value = value
+            self._computed_at = started
+            if generation == self._generation:
+                self._fresh_until = started + self.ttl
+            else:
+                # invalidated while computing: the value may predate the write
+                self._fresh_until = started + min(self.ttl, self.min_interval)
+            self._stale_until = started + self.ttl + self.stale_ttl
+            self.refreshes += 1
+        return value
+
+    def _refresh(self, compute):
+        try:
+            with self._compute_lock:
+                self._compute(compute)
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            print(f"Error refreshing cached value: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._fresh_until = min(self._fresh_until, self._computed_at + self.min_interval)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._value = _MISSING
+            self._fresh_until = self._stale_until = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": self._value is not _MISSING,
+                "refreshing": self._refreshing,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "invalidations": self.invalidations,
+            }
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait and receive the same result (or the same exception).  Nothing
+    is cached once the call returns.  Treat shared results as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+            }
@@ -1,11 +1,361 @@
-import psycopg2
+"""Pooled PostgreSQL connections shared by every blueprint.
+
+Connection settings and pool sizing come from the environment:
+
+    DATABASE_URL            full libpq DSN (overrides the DB_* settings below)
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+    DB_POOL_MIN_SIZE        connections opened when the pool is first used (1)
+    DB_POOL_MAX_SIZE        hard cap on open connections (10)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (5)
+    DB_POOL_MAX_AGE         seconds before a connection is recycled (1800)
+    DB_POOL_CHECK_IDLE      idle seconds after which a checkout runs SELECT 1 (30)
+
+``get_db()`` keeps its old signature: callers still do ``conn.close()``, which
+now hands the connection back to the pool instead of tearing it down.  Prefer
+``db_connection()`` / ``db_cursor()`` in new code.  Connections a handler
+forgets to close are returned by ``release_request_connections`` at the end
+of the request.
+"""
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+from flask import g, has_app_context
+
+from query_stats import InstrumentedConnection
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _connect_kwargs():
+    # every cursor reports its statements to the request (see query_stats.py)
+    dsn = os.environ.get("DATABASE_URL")
+    if dsn:
+        return {"dsn": dsn, "connection_factory": InstrumentedConnection}
+    return {
+        "host": os.environ.get("DB_HOST", "localhost"),
+        "database": os.environ.get("DB_NAME", "donation"),
+        "user": os.environ.get("DB_USER", "postgres"),
+        "password": os.environ.get("DB_PASSWORD", "1234"),
+        "port": _env_int("DB_PORT", 5432),
+        "connection_factory": InstrumentedConnection,
+    }
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of psycopg2 connections."""
+
+    def __init__(self, min_size=1, max_size=10, timeout=5.0, max_age=1800.0,
+                 check_idle=30.0, connect_kwargs=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self.connect_kwargs = connect_kwargs or {}
+
+        self._cond = threading.Condition()
+        self._idle = deque()       # (conn, created_at, last_used)
+        self._created = {}         # id(conn) -> created_at, for checked-out connections
+        self._size = 0
+        self._waiting = 0
+        self._prefilled = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._opened = 0
+        self._discarded = 0
+
+    def _open(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._opened += 1
+        return conn
+
+    def _prefill(self):
+        self._prefilled = True
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+                self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _usable(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_age and now - created_at > self.max_age:
+            return False
+        if self.check_idle is not None and now - last_used >= self.check_idle:
+            try:
+                # a plain cursor, so the check stays out of the request's statement stats
+                with extensions.cursor(conn) as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds for one."""
+        if not self._prefilled:
+            self._prefill()
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            "Timed out after %.1fs waiting for a database connection" % self.timeout
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                else:
+                    conn = None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+            elif not self._usable(conn, created_at, last_used):
+                self._discard(conn)
+                continue
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self._created[id(conn)] = created_at
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time += wait
+                self._max_wait_time = max(self._max_wait_time, wait)
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection, rolling back any transaction left open."""
+        with self._cond:
+            created_at = self._created.pop(id(conn), None)
+        if created_at is None:
+            raise PoolError("Connection was not checked out from this pool")
+
+        if conn.closed or (self.max_age and time.monotonic() - created_at > self.max_age):
+            self._discard(conn)
+            return
+        try:
+            status = conn.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            in_use = self._size - len(self._idle)
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "waiting": self._waiting,
+                "saturation": round(in_use / self.max_size, 3),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_time_total_ms": round(self._wait_time * 1000, 3),
+                "wait_time_max_ms": round(self._max_wait_time * 1000, 3),
+                "connections_opened": self._opened,
+                "connections_discarded": self._discarded,
+            }
+
+
+class PooledConnection:
+    """Proxy around a pooled connection whose ``close()`` returns it to the pool.
+
+    Attribute reads and writes (``conn.autocommit = True``) and ``with conn:``
+    transaction blocks go to the underlying connection.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    @property
+    def raw(self):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return self._conn
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.putconn(conn)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.raw, name, value)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.raw.__exit__(exc_type, exc_value, traceback)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use (and after fork)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                min_size=_env_int("DB_POOL_MIN_SIZE", 1),
+                max_size=_env_int("DB_POOL_MAX_SIZE", 10),
+                timeout=_env_float("DB_POOL_TIMEOUT", 5.0),
+                max_age=_env_float("DB_POOL_MAX_AGE", 1800.0),
+                check_idle=_env_float("DB_POOL_CHECK_IDLE", 30.0),
+                connect_kwargs=_connect_kwargs(),
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
 
 def get_db():
-    return psycopg2.connect(
-        host="localhost",
-        database="donation",
-        user="postgres",
-        password="1234",
-        port=5432
-    )
+    pool = get_pool()
+    conn = PooledConnection(pool, pool.getconn())
+    if has_app_context():
+        g.setdefault("_db_connections", []).append(conn)
+    return conn
+
+
+def release_request_connections(exc=None):
+    """Teardown hook: return any connection the request did not close."""
+    for conn in g.pop("_db_connections", ()):
+        conn.close()
+
+
+@contextmanager
+def db_connection():
+    conn = get_db()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def rows_as_dicts(cur):
+    """Rows of a plain (tuple) cursor as dicts keyed by column name.
+
+    One dict per row, built straight from the tuples as they are read -- no
+    RealDictRow in between -- so list endpoints select exactly the keys they
+    return and hand the result to jsonify as is.
+    """
+    columns = [col.name for col in cur.description]
+    return [dict(zip(columns, row)) for row in cur]
+
+
+@contextmanager
+def db_cursor(cursor_factory=RealDictCursor):
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cur
+        finally:
+            cur.close()
@@ -1,135 +1,227 @@
-from flask import Blueprint, request, jsonify, current_app
+import os
+
+from flask import Blueprint, request, jsonify, g
 from psycopg2.extras import RealDictCursor
-from db import get_db
-from jwt_utils import decode_jwt
+from db import get_db, rows_as_dicts
+from pagination import keyset_params, keyset_after, encode_cursor
+from export_utils import stream_query
+from rollups import record_donations
+from admin_routes import invalidate_admin_dashboard
+from bulk_import import import_donations
+from idempotency import IdempotentRequest
+from ngo_directory import resolve_ngo_id, ngo_exists, ngo_name
+from cache_utils import TTLCache
+from datetime import datetime, timedelta
 
 donation_bp = Blueprint("donation", __name__, url_prefix="/api/donations")
 
+# Summary of /records without filters (all donations, or one NGO's), which
+# would otherwise aggregate the whole scope on every first page.  Donation and
+# utilization writes call invalidate_donation_summary().
+_summary_cache = TTLCache(
+    maxsize=int(os.environ.get("DONATION_SUMMARY_CACHE_SIZE", 1000)),
+    ttl=float(os.environ.get("DONATION_SUMMARY_CACHE_TTL", 30)),
+)
 
-@donation_bp.route("/records", methods=["GET"])
-def get_donation_records():
-    """Fetch donation records - all donations if no auth, or NGO-specific if authenticated"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
+# filters that make a summary specific to one request, so it is not cached
+_SUMMARY_FILTERS = ("date_from", "date_to", "purpose", "min_amount", "max_amount")
 
-    # Try to get NGO ID from token
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            # Get ngo_id from user_id
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            pass  # Continue without NGO filter
 
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def invalidate_donation_summary():
+    """Drop the cached /records summaries after a donation or utilization write."""
+    _summary_cache.clear()
+
+
+def donation_summary_cache_stats():
+    return _summary_cache.stats()
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Invalid {name}: expected YYYY-MM-DD")
+
+
+def _parse_number(value, name, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value}")
+
+
+def _donation_filters(ngo_id):
+    """WHERE clauses and params for the donation list filters in the query string."""
+    args = request.args
+    where = []
+    params = []
 
-    # Fetch donations (all if no NGO, filtered if NGO)
     if ngo_id:
-        query = """
-            SELECT d.donation_id, COALESCE(dn.name, 'Anonymous') as donor_name, d.amount, d.donated_at, d.purpose,
-                   COALESCE(SUM(u.amount_utilized), 0) as amount_utilized,
-                   n.name as ngo_name
-            FROM donations d
-            LEFT JOIN donors dn ON d.donor_id = dn.donor_id
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            LEFT JOIN ngos n ON d.ngo_id = n.ngo_id
-            WHERE d.ngo_id = %s
-            GROUP BY d.donation_id, dn.name, d.amount, d.donated_at, d.purpose, n.name
-            ORDER BY d.donated_at DESC
-        """
-        cur.execute(query, (ngo_id,))
-    else:
-        # Get all donations across all NGOs
-        query = """
-            SELECT d.donation_id, COALESCE(dn.name, 'Anonymous') as donor_name, d.amount, d.donated_at, d.purpose,
-                   COALESCE(SUM(u.amount_utilized), 0) as amount_utilized,
-                   COALESCE(n.name, 'Unknown NGO') as ngo_name
-            FROM donations d
-            LEFT JOIN donors dn ON d.donor_id = dn.donor_id
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            LEFT JOIN ngos n ON d.ngo_id = n.ngo_id
-            GROUP BY d.donation_id, dn.name, d.amount, d.donated_at, d.purpose, n.name
-            ORDER BY d.donated_at DESC
-        """
-        cur.execute(query)
+        where.append("d.ngo_id = %s")
+        params.append(ngo_id)
+    elif args.get("ngo_id"):
+        where.append("d.ngo_id = %s")
+        params.append(_parse_number(args["ngo_id"], "ngo_id", int))
+
+    if args.get("date_from"):
+        where.append("d.donated_at >= %s")
+        params.append(_parse_date(args["date_from"], "date_from"))
+    if args.get("date_to"):
+        # inclusive of the whole date_to day
+        where.append("d.donated_at < %s")
+        params.append(_parse_date(args["date_to"], "date_to") + timedelta(days=1))
+    if args.get("purpose"):
+        where.append("d.purpose = %s")
+        params.append(args["purpose"])
+    if args.get("min_amount"):
+        where.append("d.amount >= %s")
+        params.append(_parse_number(args["min_amount"], "min_amount"))
+    if args.get("max_amount"):
+        where.append("d.amount <= %s")
+        params.append(_parse_number(args["max_amount"], "max_amount"))
+
+    return where, params
 
-    donations = cur.fetchall()
 
-    # Calculate totals
-    total_donations = 0
-    total_utilized = 0
-    
-    donation_list = []
-    for d in donations:
-        amount = float(d.get("amount")) if d.get("amount") is not None else 0
-        utilized = float(d.get("amount_utilized")) if d.get("amount_utilized") is not None else 0
-        
-        total_donations += amount
-        total_utilized += utilized
-        
-        donation_list.append({
-            "donation_id": d.get("donation_id"),
-            "donor_name": d.get("donor_name") or "Unknown",
-            "amount": amount,
-            "amount_utilized": utilized,
-            "purpose": d.get("purpose") or "General",
-            "donated_at": str(d.get("donated_at")) if d.get("donated_at") else None,
-            "status": "Received",
-            "ngo_name": d.get("ngo_name") or "Unknown NGO"
-        })
+@donation_bp.route("/records", methods=["GET"])
+def get_donation_records():
+    """Fetch a page of donation records - all donations if no auth, or NGO-specific if authenticated
+
+    Query args: limit, cursor, date_from, date_to, purpose, ngo_id, min_amount, max_amount.
+    Without limit or cursor every matching donation is returned; follow
+    ``pagination.next_cursor`` to page.
+    """
+    # NGO filter comes from the token, if any; invalid tokens just drop the filter
+    ngo_id = g.ngo_id
+
+    try:
+        limit, cursor = keyset_params()
+        where, params = _donation_filters(ngo_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    # Summary totals for the whole filtered set, computed once on the first page;
+    # without filters it is cached per NGO scope
+    summary = None
+    summary_key = None
+    if cursor is None and not any(request.args.get(name) for name in _SUMMARY_FILTERS):
+        summary_key = ("ngo", params[0]) if where else ("all",)
+        summary = _summary_cache.get(summary_key)
+    if cursor is None and summary is None:
+        cur.execute(
+            "WITH filtered AS ("
+            "    SELECT d.amount, d.amount_utilized FROM donations d "
+            + ("WHERE " + " AND ".join(where) if where else "")
+            + ") "
+            "SELECT COALESCE(SUM(amount), 0) as total_donations, "
+            "       COUNT(*) as total_count, "
+            "       COALESCE(SUM(amount_utilized), 0) as total_utilized "
+            "FROM filtered",
+            params
+        )
+        row = cur.fetchone()
+        summary = {
+            "total_donations": float(row["total_donations"]),
+            "total_utilized": float(row["total_utilized"]),
+            "total_count": row["total_count"]
+        }
+        if summary_key is not None:
+            _summary_cache.set(summary_key, summary)
+
+    # Keyset page over (donated_at, donation_id), newest first (undated rows first)
+    page_where = list(where)
+    page_args = list(params)
+    if cursor is not None:
+        condition, condition_args = keyset_after("d.donated_at", "d.donation_id", cursor)
+        page_where.append(condition)
+        page_args.extend(condition_args)
+    cur.close()
+    cur = conn.cursor()
+    # Output rows straight from SQL: defaults are applied here and the JSON
+    # provider renders the numeric/timestamp columns
+    cur.execute(
+        "SELECT d.donation_id, "
+        "       CASE WHEN dn.name = '' THEN 'Unknown' ELSE COALESCE(dn.name, 'Anonymous') END as donor_name, "
+        "       COALESCE(d.amount, 0) as amount, d.amount_utilized, "
+        "       COALESCE(NULLIF(d.purpose, ''), 'General') as purpose, d.donated_at, "
+        "       'Received' as status, "
+        "       COALESCE(NULLIF(n.name, ''), 'Unknown NGO') as ngo_name "
+        "FROM donations d "
+        "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
+        "LEFT JOIN ngos n ON d.ngo_id = n.ngo_id "
+        + ("WHERE " + " AND ".join(page_where) + " " if page_where else "")
+        + "ORDER BY d.donated_at DESC NULLS FIRST, d.donation_id DESC "
+        "LIMIT %s",
+        page_args + [None if limit is None else limit + 1]
+    )
+    donation_list = rows_as_dicts(cur)
     cur.close()
     conn.close()
 
-    return jsonify({
+    next_cursor = None
+    if limit is not None and len(donation_list) > limit:
+        donation_list = donation_list[:limit]
+        last = donation_list[-1]
+        next_cursor = encode_cursor(last["donated_at"], last["donation_id"])
+
+    response = {
         "donations": donation_list,
-        "summary": {
-            "total_donations": total_donations,
-            "total_utilized": total_utilized,
-            "total_count": len(donation_list)
+        "pagination": {
+            "limit": limit,
+            "next_cursor": next_cursor
         }
-    })
+    }
+    if summary is not None:
+        response["summary"] = summary
+    return jsonify(response)
+
+
+@donation_bp.route("/export", methods=["GET"])
+def export_donation_records():
+    """Stream donation records as NDJSON (default) or CSV (?format=csv)
+
+    Accepts the same filters as /records and is scoped the same way.
+    """
+    try:
+        where, params = _donation_filters(g.ngo_id)
+        return stream_query(
+            "SELECT d.donation_id, COALESCE(dn.name, 'Anonymous') as donor_name, "
+            "       COALESCE(n.name, 'Unknown NGO') as ngo_name, d.amount, d.amount_utilized, "
+            "       d.purpose, d.donated_at "
+            "FROM donations d "
+            "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
+            "LEFT JOIN ngos n ON d.ngo_id = n.ngo_id "
+            + ("WHERE " + " AND ".join(where) + " " if where else "")
+            + "ORDER BY d.donated_at DESC, d.donation_id DESC",
+            params,
+            request.args.get("format", "ndjson"),
+            "donations"
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @donation_bp.route("/donor/history", methods=["GET"])
 def get_donor_donation_history():
     """Fetch all donations made by a specific donor"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
+    if g.token is None:
         return jsonify({"error": "Authorization header missing or invalid"}), 401
+    if g.auth_error:
+        return jsonify({"error": f"Invalid token: {g.auth_error}"}), 401
+    if not g.user_id:
+        return jsonify({"error": "User ID not found in token"}), 401
 
-    token = auth_header.split(" ", 1)[1]
-    try:
-        payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-        user_id = payload.get("user_id")
-        if not user_id:
-            return jsonify({"error": "User ID not found in token"}), 401
-    except ValueError as e:
-        return jsonify({"error": f"Invalid token: {str(e)}"}), 401
+    donor_id = g.donor_id
+    if not donor_id:
+        return jsonify({"error": "Donor not found"}), 404
 
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        # Get donor_id from user_id
-        cur.execute("SELECT donor_id FROM donors WHERE user_id = %s", (user_id,))
-        donor = cur.fetchone()
-        if not donor:
-            return jsonify({"error": "Donor not found"}), 404
-        
-        donor_id = donor["donor_id"]
-
         # Fetch all donations with NGO details and utilization info
         cur.execute("""
             SELECT 
@@ -138,12 +230,10 @@ def get_donor_donation_history():
                 d.amount, 
                 d.donated_at, 
                 d.purpose,
-                COALESCE(SUM(u.amount_utilized), 0) as amount_utilized
+                d.amount_utilized
             FROM donations d
             JOIN ngos n ON d.ngo_id = n.ngo_id
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
             WHERE d.donor_id = %s
-            GROUP BY d.donation_id, n.name, d.amount, d.donated_at, d.purpose
             ORDER BY d.donated_at DESC
         """, (donor_id,))
         
@@ -208,46 +298,53 @@ def get_donor_donation_history():
 @donation_bp.route("/create", methods=["POST"])
 def create_donation():
     """Create a new donation"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
+    if g.token is None:
         return jsonify({"error": "Authorization header missing or invalid"}), 401
-
-    token = auth_header.split(" ", 1)[1]
-    try:
-        payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-        user_id = payload.get("user_id")
-        if not user_id:
-            return jsonify({"error": "User ID not found in token"}), 401
-    except ValueError as e:
-        return jsonify({"error": f"Invalid token: {str(e)}"}), 401
+    if g.auth_error:
+        return jsonify({"error": f"Invalid token: {g.auth_error}"}), 401
+    if not g.user_id:
+        return jsonify({"error": "User ID not found in token"}), 401
 
     data = request.get_json()
     
-    # Validate required fields
+    # Validate required fields (the NGO may be given by ngo_id instead of ngo_name)
     required_fields = ["ngo_name", "amount", "purpose"]
     for field in required_fields:
-        if field not in data:
+        if field not in data and not (field == "ngo_name" and "ngo_id" in data):
             return jsonify({"error": f"Missing required field: {field}"}), 400
 
+    donor_id = g.donor_id
+    if not donor_id:
+        return jsonify({"error": "Donor not found"}), 404
+
+    # Resolve the NGO from the in-process name map; an explicit ngo_id skips that
+    if data.get("ngo_id") is not None:
+        try:
+            ngo_id = int(data["ngo_id"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid ngo_id"}), 400
+        if not ngo_exists(ngo_id):
+            return jsonify({"error": "NGO not found"}), 404
+    else:
+        ngo_id = resolve_ngo_id(data.get("ngo_name"))
+        if ngo_id is None:
+            return jsonify({"error": "NGO not found"}), 404
+
+    # Retries carrying the same Idempotency-Key get the first response back
+    try:
+        idem = IdempotentRequest.from_request(f"donation:{g.user_id}", data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if idem and idem.replay():
+        return idem.respond()
+
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        # Get donor_id from user_id
-        cur.execute("SELECT donor_id FROM donors WHERE user_id = %s", (user_id,))
-        donor = cur.fetchone()
-        if not donor:
-            return jsonify({"error": "Donor not found"}), 404
-        
-        donor_id = donor["donor_id"]
-
-        # Get ngo_id from ngo_name
-        cur.execute("SELECT ngo_id FROM ngos WHERE name = %s", (data["ngo_name"],))
-        ngo = cur.fetchone()
-        if not ngo:
-            return jsonify({"error": "NGO not found"}), 404
-        
-        ngo_id = ngo["ngo_id"]
+        if idem and idem.claim(cur):
+            conn.rollback()
+            return idem.respond()
 
         # Insert donation (no transaction_id column in table)
         cur.execute("""
@@ -258,7 +355,7 @@ def create_donation():
         """, (donor_id, ngo_id, data["amount"], data["purpose"]))
         
         result = cur.fetchone()
-        conn.commit()
+        record_donations(cur, [result["donation_id"]])
 
         # Generate a transaction reference for the response (not stored in DB)
         donation_id = result.get("donation_id")
@@ -267,18 +364,27 @@ def create_donation():
         except (TypeError, ValueError):
             txn_ref = f"TXN{donation_id}" if donation_id is not None else "TXN-UNKNOWN"
 
-        return jsonify({
+        response = {
             "success": True,
             "message": "Donation created successfully",
             "donation": {
                 "donation_id": result["donation_id"],
                 "transaction_id": txn_ref,
                 "amount": data["amount"],
-                "ngo": data["ngo_name"],
+                "ngo": data.get("ngo_name") or ngo_name(ngo_id),
                 "purpose": data["purpose"],
                 "donated_at": str(result["donated_at"])
             }
-        }), 201
+        }
+        if idem:
+            idem.store(cur, response, 201)
+        conn.commit()
+        if idem:
+            idem.committed()
+        invalidate_admin_dashboard()
+        invalidate_donation_summary()
+
+        return jsonify(response), 201
 
     except Exception as e:
         conn.rollback()
@@ -287,3 +393,40 @@ def create_donation():
     finally:
         cur.close()
         conn.close()
+
+
+@donation_bp.route("/bulk", methods=["POST"])
+def bulk_import_donations():
+    """Bulk-load donations for the caller's NGO from a CSV or NDJSON body
+
+    ?format=csv|ndjson (default from Content-Type, else csv); ?partial=1 inserts
+    the valid rows even when others fail; ?dry_run=1 only validates.
+    """
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
+    if not ngo_id:
+        return jsonify({"error": "NGO not found"}), 404
+
+    fmt = request.args.get("format") or ("ndjson" if "json" in request.mimetype else "csv")
+    partial = request.args.get("partial") in ("1", "true")
+    dry_run = request.args.get("dry_run") in ("1", "true")
+
+    conn = get_db()
+    try:
+        report = import_donations(conn, request.stream, fmt, ngo_id=ngo_id,
+                                  partial=partial, dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error importing donations: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    if report["inserted"]:
+        invalidate_admin_dashboard()
+        invalidate_donation_summary()
+    if report["error_count"] and not (partial or dry_run):
+        return jsonify(report), 422
+    return jsonify(report), 201 if report["inserted"] else 200
@@ -1,56 +1,43 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, g
 from db import get_db
-from jwt_utils import decode_jwt
+from identity import accepts_raw_token
 from psycopg2.extras import RealDictCursor
 
 donor_analytics_bp = Blueprint('donor_analytics', __name__, url_prefix='/api/donor-analytics')
 
 @donor_analytics_bp.route('/reports', methods=['GET'])
+@accepts_raw_token
 def get_donor_reports():
     """Get comprehensive analytics and reports for a donor"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
+    if g.token is None:
         return jsonify({'error': 'Authorization header missing'}), 401
-    
-    token = auth_header.replace('Bearer ', '')
-    try:
-        payload = decode_jwt(token, current_app.config.get('SECRET_KEY'))
-    except ValueError as ve:
-        print(f"JWT decode error: {str(ve)}")
-        print(f"Token received: {token[:50]}...")  # Log first 50 chars for debugging
-        return jsonify({'error': f'Invalid token: {str(ve)}'}), 401
-    
-    if not payload:
-        return jsonify({'error': 'Invalid token'}), 401
-    
-    user_id = payload.get('user_id')
-    if not user_id:
-        print(f"User ID not found in token payload: {payload}")
+    if g.auth_error:
+        print(f"JWT decode error: {g.auth_error}")
+        print(f"Token received: {g.token[:50]}...")  # Log first 50 chars for debugging
+        return jsonify({'error': f'Invalid token: {g.auth_error}'}), 401
+
+    if not g.user_id:
+        print(f"User ID not found in token payload: {g.token_payload}")
         return jsonify({'error': 'User ID not found in token'}), 401
 
+    donor_id = g.donor_id
+    if not donor_id:
+        return jsonify({'error': 'Donor not found'}), 404
+
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        # Get Donor ID from user_id
-        cur.execute("SELECT donor_id FROM donors WHERE user_id = %s", (user_id,))
-        donor = cur.fetchone()
-        if not donor:
-            return jsonify({'error': 'Donor not found'}), 404
-        
-        donor_id = donor['donor_id']
-
-        # Get monthly donations for last 6 months
+        # Get monthly donations for the last 6 months (from the monthly rollup)
         cur.execute("""
             SELECT 
-                TO_CHAR(donated_at, 'Mon') as month,
-                EXTRACT(MONTH FROM donated_at) as month_num,
-                COALESCE(SUM(amount), 0) as amount
-            FROM donations
-            WHERE donor_id = %s 
-                AND donated_at >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY month_num, TO_CHAR(donated_at, 'Mon')
-            ORDER BY month_num
+                TO_CHAR(r.month, 'Mon') as month,
+                COALESCE(SUM(r.total_amount), 0) as amount
+            FROM donation_monthly_rollup r
+            WHERE r.donor_id = %s 
+                AND r.month >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '5 months'
+            GROUP BY r.month
+            ORDER BY r.month
         """, (donor_id,))
         monthly_donations = cur.fetchall()
 
@@ -58,10 +45,10 @@ def get_donor_reports():
         cur.execute("""
             SELECT 
                 n.name as ngo,
-                COALESCE(SUM(d.amount), 0) as amount
-            FROM donations d
-            JOIN ngos n ON d.ngo_id = n.ngo_id
-            WHERE d.donor_id = %s
+                COALESCE(SUM(r.total_amount), 0) as amount
+            FROM donation_monthly_rollup r
+            JOIN ngos n ON r.ngo_id = n.ngo_id
+            WHERE r.donor_id = %s
             GROUP BY n.name
             ORDER BY amount DESC
             LIMIT 5
@@ -84,17 +71,27 @@ def get_donor_reports():
 
         # Get utilization by category (based on purpose)
         cur.execute("""
+            WITH donated AS (
+                SELECT purpose, SUM(total_amount) as amount
+                FROM donation_monthly_rollup
+                WHERE donor_id = %s
+                GROUP BY purpose
+            ),
+            utilized AS (
+                SELECT purpose, SUM(total_utilized) as utilized
+                FROM utilization_monthly_rollup
+                WHERE donor_id = %s
+                GROUP BY purpose
+            )
             SELECT 
-                d.purpose as category,
-                COALESCE(SUM(d.amount), 0) as amount,
-                COALESCE(SUM(u.amount_utilized), 0) as utilized
-            FROM donations d
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            WHERE d.donor_id = %s
-            GROUP BY d.purpose
+                donated.purpose as category,
+                COALESCE(donated.amount, 0) as amount,
+                COALESCE(utilized.utilized, 0) as utilized
+            FROM donated
+            LEFT JOIN utilized ON utilized.purpose IS NOT DISTINCT FROM donated.purpose
             ORDER BY amount DESC
             LIMIT 5
-        """, (donor_id,))
+        """, (donor_id, donor_id))
         category_data = cur.fetchall()
 
         # Calculate percentages for categories
@@ -110,57 +107,38 @@ def get_donor_reports():
                 'percentage': round(percentage, 0)
             })
 
-        # Get summary statistics
+        # Get summary statistics, the last 6 months and the 6 months before them
         cur.execute("""
             SELECT 
-                COALESCE(SUM(amount), 0) as total_donations,
-                COUNT(*) as donation_count,
-                COUNT(DISTINCT ngo_id) as ngos_supported
-            FROM donations
+                COALESCE(SUM(total_amount), 0) as total_donations,
+                COALESCE(SUM(donation_count), 0)::bigint as donation_count,
+                COUNT(DISTINCT ngo_id) as ngos_supported,
+                COALESCE(SUM(total_amount) FILTER (
+                    WHERE month >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '5 months'), 0) as last_6_months,
+                COALESCE(SUM(donation_count) FILTER (
+                    WHERE month >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '5 months'), 0) as last_6_months_count,
+                COALESCE(SUM(total_amount) FILTER (
+                    WHERE month >= DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '11 months'
+                      AND month < DATE_TRUNC('month', CURRENT_DATE) - INTERVAL '5 months'), 0) as prev_total
+            FROM donation_monthly_rollup
             WHERE donor_id = %s
         """, (donor_id,))
         summary = cur.fetchone()
 
         cur.execute("""
-            SELECT COALESCE(SUM(u.amount_utilized), 0) as total_utilized
-            FROM donations d
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            WHERE d.donor_id = %s
-        """, (donor_id,))
-        util_summary = cur.fetchone()
-
-        # Calculate last 6 months average
-        cur.execute("""
-            SELECT COALESCE(AVG(amount), 0) as avg_monthly
-            FROM donations
+            SELECT COALESCE(SUM(total_utilized), 0) as total_utilized
+            FROM utilization_monthly_rollup
             WHERE donor_id = %s
-                AND donated_at >= CURRENT_DATE - INTERVAL '6 months'
         """, (donor_id,))
-        avg_data = cur.fetchone()
-
-        # Get previous period for comparison
-        cur.execute("""
-            SELECT COALESCE(SUM(amount), 0) as prev_total
-            FROM donations
-            WHERE donor_id = %s
-                AND donated_at >= CURRENT_DATE - INTERVAL '12 months'
-                AND donated_at < CURRENT_DATE - INTERVAL '6 months'
-        """, (donor_id,))
-        prev_period = cur.fetchone()
+        util_summary = cur.fetchone()
 
         total_donations = float(summary['total_donations'])
         total_utilized = float(util_summary['total_utilized'])
-        avg_monthly = float(avg_data['avg_monthly'])
-        prev_total = float(prev_period['prev_total'])
-        
-        # Calculate growth (last 6 months vs previous 6 months)
-        cur.execute("""
-            SELECT COALESCE(SUM(amount), 0) as last_6_months
-            FROM donations
-            WHERE donor_id = %s
-                AND donated_at >= CURRENT_DATE - INTERVAL '6 months'
-        """, (donor_id,))
-        last_6_months = float(cur.fetchone()['last_6_months'])
+        prev_total = float(summary['prev_total'])
+        last_6_months = float(summary['last_6_months'])
+        # average donation amount over the last 6 months
+        last_6_months_count = int(summary['last_6_months_count'])
+        avg_monthly = last_6_months / last_6_months_count if last_6_months_count else 0
         
         growth_percent = ((last_6_months - prev_total) / prev_total * 100) if prev_total > 0 else 0
 
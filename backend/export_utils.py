@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response
+from db import db_connection
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 2000))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_batch(columns, rows):
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+def _csv_batch(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(map(_plain, row))
+    return buf.getvalue()
+
+
+def stream_query(query, params, fmt, filename, batch_size=EXPORT_BATCH_SIZE):
+    """Stream a query's rows as NDJSON or CSV straight from a server-side cursor.
+
+    Rows are pulled ``batch_size`` at a time, so memory stays flat no matter how
+    many rows the query returns, and the first batch is sent as soon as the
+    database produces it.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+    def generate():
+        with db_connection() as conn:
+            cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            cur.itersize = batch_size
+            try:
+                cur.execute(query, params)
+                rows = cur.fetchmany(batch_size)
+                columns = [col.name for col in cur.description]
+                if fmt == "csv":
+                    yield _csv_batch([columns])
+                while rows:
+                    if fmt == "csv":
+                        yield _csv_batch(rows)
+                    else:
+                        yield _ndjson_batch(columns, rows)
+                    rows = cur.fetchmany(batch_size)
+            finally:
+                cur.close()
+
+    return Response(
+        generate(),
+        mimetype=FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{fmt}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
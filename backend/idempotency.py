@@ -0,0 +1,216 @@
+"""Idempotency-Key support for the create endpoints (migrations/005_idempotency_keys.sql).
+
+A client that sends ``Idempotency-Key: <key>`` may retry the request as often
+as it likes: the first attempt runs, later ones get the stored response back
+without touching the guarded tables.  Keys are scoped per endpoint and user and
+are bound to a hash of the request body, so reusing a key for a different
+request is rejected instead of silently replayed.
+
+    idem = IdempotentRequest.from_request(f"donation:{g.user_id}", data)
+    if idem and idem.replay():                # hot cache, no database
+        return idem.respond()
+    ...
+    if idem and idem.claim(cur):              # stored response (or wait for
+        conn.rollback()                       # the attempt still in flight)
+        return idem.respond()
+    ... insert ...
+    idem.store(cur, body, 201)                # same transaction as the insert
+    conn.commit()
+    idem.committed()                          # publish to the hot cache
+
+Responses are only stored by a transaction that commits, so a failed attempt
+leaves nothing behind and the retry runs again.
+
+    python idempotency.py --purge   # delete every expired key
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import request, jsonify
+from psycopg2.extras import Json
+
+from cache_utils import TTLCache
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+KEY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+PURGE_INTERVAL = float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", 300))
+PURGE_BATCH = 1000
+
+# (scope, key) -> (request_hash, status_code, response) for recently completed requests
+_responses = TTLCache(
+    maxsize=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("IDEMPOTENCY_CACHE_TTL", 600)),
+)
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+# Inserts the key, or takes over an expired one; returns a row only when this
+# transaction now owns the key.  A concurrent attempt with the same key blocks
+# here until the first one commits or rolls back.
+_CLAIM = """
+    INSERT INTO idempotency_keys AS k (scope, key, request_hash, expires_at)
+    VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 hour')
+    ON CONFLICT (scope, key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response = NULL,
+            created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+        WHERE k.expires_at <= CURRENT_TIMESTAMP
+    RETURNING 1
+"""
+
+_PURGE = """
+    DELETE FROM idempotency_keys
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM idempotency_keys
+        WHERE expires_at <= CURRENT_TIMESTAMP
+        LIMIT %s
+    ))
+"""
+
+_KEY_REUSED = {"error": "Idempotency-Key was already used for a different request"}
+_IN_PROGRESS = {"error": "A request with this Idempotency-Key is still being processed"}
+
+
+def request_hash(payload):
+    """Stable hash of a JSON request body."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotentRequest:
+    """One keyed request; see the module docstring for the calling sequence."""
+
+    def __init__(self, scope, key, payload):
+        self.scope = scope
+        self.key = key
+        self.request_hash = request_hash(payload)
+        self.status = None
+        self.response = None
+        self.replayed = False
+
+    @classmethod
+    def from_request(cls, scope, payload):
+        """The keyed request for the current Flask request, or None without a key.
+
+        Raises ValueError for an empty or oversized key.
+        """
+        key = request.headers.get(HEADER)
+        if key is None:
+            return None
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValueError(f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+        return cls(scope, key, payload)
+
+    def _found(self, stored_hash, status, response):
+        if stored_hash != self.request_hash:
+            self.status, self.response = 422, _KEY_REUSED
+        elif status is None:
+            self.status, self.response = 409, _IN_PROGRESS
+        else:
+            self.status, self.response = status, response
+            self.replayed = True
+        return True
+
+    def replay(self):
+        """True when a completed response for this key is in the hot cache."""
+        entry = _responses.get((self.scope, self.key))
+        if entry is None:
+            return False
+        return self._found(*entry)
+
+    def claim(self, cur):
+        """Claim the key inside the caller's transaction.
+
+        Returns False when this attempt owns the key and should go ahead, True
+        when an earlier attempt already answered it (see ``respond``).
+        """
+        _maybe_purge(cur)
+        claim_cur = cur.connection.cursor()
+        try:
+            claim_cur.execute(_CLAIM, (self.scope, self.key, self.request_hash, KEY_TTL_HOURS))
+            if claim_cur.fetchone():
+                return False
+            claim_cur.execute(
+                "SELECT request_hash, status_code, response FROM idempotency_keys "
+                "WHERE scope = %s AND key = %s",
+                (self.scope, self.key)
+            )
+            stored = claim_cur.fetchone()
+        finally:
+            claim_cur.close()
+        if stored[1] is not None:
+            _responses.set((self.scope, self.key), stored)
+        return self._found(*stored)
+
+    def store(self, cur, response, status):
+        """Record the response for this key; the caller commits."""
+        self.status, self.response = status, response
+        store_cur = cur.connection.cursor()
+        store_cur.execute(
+            "UPDATE idempotency_keys SET status_code = %s, response = %s "
+            "WHERE scope = %s AND key = %s",
+            (status, Json(response), self.scope, self.key)
+        )
+        store_cur.close()
+
+    def committed(self):
+        """Publish the stored response to the hot cache once the write has committed."""
+        _responses.set((self.scope, self.key), (self.request_hash, self.status, self.response))
+
+    def respond(self):
+        """Flask response for a replayed (or rejected) request."""
+        resp = jsonify(self.response)
+        resp.status_code = self.status
+        if self.replayed:
+            resp.headers["Idempotent-Replayed"] = "true"
+        return resp
+
+
+def _maybe_purge(cur):
+    """Delete a batch of expired keys, at most once per PURGE_INTERVAL per process."""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _last_purge = now
+        purge_cur = cur.connection.cursor()
+        purge_cur.execute(_PURGE, (PURGE_BATCH,))
+        purge_cur.close()
+    finally:
+        _purge_lock.release()
+
+
+def purge_expired(conn):
+    """Delete every expired key and return how many were removed."""
+    cur = conn.cursor()
+    removed = 0
+    while True:
+        cur.execute(_PURGE, (PURGE_BATCH,))
+        conn.commit()
+        removed += cur.rowcount
+        if cur.rowcount < PURGE_BATCH:
+            break
+    cur.close()
+    return removed
+
+
+def idempotency_cache_stats():
+    return _responses.stats()
+
+
+if __name__ == "__main__":
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description="Maintain the Idempotency-Key store")
+    parser.add_argument("--purge", action="store_true", required=True, help="delete expired keys")
+    parser.parse_args()
+
+    with db_connection() as conn:
+        print(f"{purge_expired(conn)} expired key(s) purged")
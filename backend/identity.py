@@ -0,0 +1,116 @@
+"""Request-scoped identity shared by every blueprint.
+
+``load_identity`` runs before each request, decodes the bearer token once and
+publishes the result on ``flask.g``:
+
+    g.token          raw bearer token, or None when the request carries none
+    g.auth_error     ValueError message when the token failed to decode
+    g.token_payload  decoded claims
+    g.user_id, g.role
+    g.ngo_id         for NGO principals
+    g.donor_id       for donor principals
+
+Only ``Authorization: Bearer <token>`` headers carry a token.  Views decorated
+with ``accepts_raw_token`` (the analytics reports, which always did) also take
+a bare token without the ``Bearer`` prefix.
+
+Tokens issued by ``/api/auth/login`` carry ``ngo_id``/``donor_id`` claims, so
+they resolve without touching the database.  Older tokens fall back to a
+bounded LRU+TTL cache in front of a single lookup query.
+"""
+import os
+
+from flask import g, request, current_app
+from cache_utils import TTLCache
+from db import db_cursor
+from jwt_utils import decode_jwt
+
+_identity_cache = TTLCache(
+    maxsize=int(os.environ.get("IDENTITY_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("IDENTITY_CACHE_TTL", 300)),
+)
+
+_LOOKUPS = {
+    "ngo": ("ngo_id", "SELECT ngo_id FROM ngos WHERE user_id = %s"),
+    "donor": ("donor_id", "SELECT donor_id FROM donors WHERE user_id = %s"),
+}
+
+
+def accepts_raw_token(view):
+    """Mark a view as also accepting a bare token in the Authorization header."""
+    view.accepts_raw_token = True
+    return view
+
+
+def _bearer_token():
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return None
+    if auth_header.startswith("Bearer "):
+        return auth_header.split(" ", 1)[1]
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, "accepts_raw_token", False):
+        return auth_header.strip() or None
+    return None
+
+
+def _resolve(role, user_id, payload):
+    """Return the ngo_id/donor_id for the principal, or None."""
+    claim, query = _LOOKUPS[role]
+    if payload.get(claim) is not None:
+        return payload[claim]
+
+    key = (role, user_id)
+    principal_id = _identity_cache.get(key)
+    if principal_id is not None:
+        return principal_id
+
+    with db_cursor() as cur:
+        cur.execute(query, (user_id,))
+        row = cur.fetchone()
+    if row:
+        principal_id = row[claim]
+        _identity_cache.set(key, principal_id)
+    return principal_id
+
+
+def load_identity():
+    g.token = _bearer_token()
+    g.auth_error = None
+    g.token_payload = None
+    g.user_id = None
+    g.role = None
+    g.ngo_id = None
+    g.donor_id = None
+
+    if g.token is None:
+        return
+    try:
+        payload = decode_jwt(g.token, current_app.config.get("SECRET_KEY"))
+    except ValueError as ve:
+        g.auth_error = str(ve)
+        return
+
+    g.token_payload = payload
+    g.user_id = payload.get("user_id")
+    g.role = (payload.get("role") or "").lower() or None
+    if g.user_id is None:
+        return
+    if g.role == "ngo":
+        g.ngo_id = _resolve("ngo", g.user_id, payload)
+    elif g.role == "donor":
+        g.donor_id = _resolve("donor", g.user_id, payload)
+
+
+def invalidate_identity(user_id):
+    """Forget cached ngo_id/donor_id mappings after signup or a profile change."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        pass
+    for role in _LOOKUPS:
+        _identity_cache.invalidate((role, user_id))
+
+
+def identity_cache_stats():
+    return _identity_cache.stats()
@@ -0,0 +1,91 @@
+"""JSON provider for ``jsonify`` that understands database rows as they come back.
+
+Handlers used to convert every ``Decimal`` with ``float(...)`` and every
+timestamp with ``str(...)`` before calling ``jsonify``.  With this provider
+installed they can hand psycopg2 values over unchanged and get the same
+output:
+
+    Decimal            -> number (as float(...) did)
+    datetime / date    -> str(value), e.g. "2026-01-31 10:15:00" / "2026-01-31"
+    time               -> str(value)
+    UUID               -> str(value)
+
+Only values that reach the encoder raw are affected.  Flask's default
+provider rendered a raw ``Decimal`` as a string ("123.45") and a raw
+``datetime`` as an HTTP date; no response relies on that any more, and a
+field that has to keep such a shape converts it explicitly (``str(...)``,
+``werkzeug.http.http_date``) before ``jsonify``.
+
+orjson is used when it is installed (and JSON_PROVIDER is not "stdlib"); it
+writes non-ASCII characters as UTF-8 rather than \\u escapes.  Otherwise the
+stdlib ``json`` module does the encoding with the same conversions.  Keys are
+sorted either way, as with Flask's default provider.
+
+    app.json = make_json_provider(app)
+"""
+import os
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (datetime, date, time, uuid.UUID)):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's provider with the row-friendly conversions above."""
+
+    default = staticmethod(_default)
+
+
+class OrjsonJSONProvider(StdlibJSONProvider):
+    """Encodes with orjson; falls back to the stdlib for options orjson lacks."""
+
+    def _options(self, indent=None):
+        # datetimes are passed to _default so they keep the str() format
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dump_bytes(self, obj, indent=None):
+        return orjson.dumps(obj, default=_default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {"indent", "separators"} or kwargs.get("indent") not in (None, 2):
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj, kwargs.get("indent")).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(
+            self._dump_bytes(obj, indent) + b"\n", mimetype=self.mimetype
+        )
+
+
+def make_json_provider(app):
+    """The provider selected by JSON_PROVIDER (orjson|stdlib, default: orjson if installed)."""
+    choice = os.environ.get("JSON_PROVIDER", "orjson" if orjson else "stdlib").lower()
+    if choice == "orjson" and orjson is not None:
+        return OrjsonJSONProvider(app)
+    return StdlibJSONProvider(app)
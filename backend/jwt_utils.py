@@ -2,8 +2,19 @@ import json
 import base64
 import hmac
 import hashlib
+import os
 import time
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+
+from cache_utils import TTLCache
+
+# Verified payloads keyed by (secret, sha256(token)), kept until the token's exp
+# (JWT_CACHE_TTL only bounds tokens issued without an exp claim)
+_verified_cache = TTLCache(
+    maxsize=int(os.environ.get("JWT_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("JWT_CACHE_TTL", 3600)),
+)
 
 
 def _b64url_encode(data: bytes) -> str:
@@ -15,24 +26,58 @@ def _b64url_decode(input_str: str) -> bytes:
     return base64.urlsafe_b64decode(input_str + padding)
 
 
+@lru_cache(maxsize=8)
+def _hmac_template(secret: str) -> "hmac.HMAC":
+    """HMAC-SHA256 object with the key already absorbed; callers ``copy()`` it."""
+    return hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+
+
+def _sign(signing_input: bytes, secret: str) -> bytes:
+    mac = _hmac_template(secret).copy()
+    mac.update(signing_input)
+    return mac.digest()
+
+
 def encode_jwt(payload: Dict[str, Any], secret: str) -> str:
     header = {"alg": "HS256", "typ": "JWT"}
     header_b = _b64url_encode(json.dumps(header, separators=(',', ':')).encode('utf-8'))
     payload_b = _b64url_encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
     signing_input = f"{header_b}.{payload_b}".encode('utf-8')
-    sig = hmac.new(secret.encode('utf-8'), signing_input, hashlib.sha256).digest()
+    sig = _sign(signing_input, secret)
     sig_b = _b64url_encode(sig)
     return f"{header_b}.{payload_b}.{sig_b}"
 
 
 def decode_jwt(token: str, secret: str) -> Dict[str, Any]:
+    key = (secret, hashlib.sha256(token.encode('utf-8')).digest())
+    cached = _verified_cache.get(key)
+    if cached is not None:
+        payload, exp = cached
+        if exp is not None and int(time.time()) > exp:
+            _verified_cache.invalidate(key)
+            raise ValueError('Token expired')
+        return dict(payload)
+
+    payload, exp = _verify(token, secret)
+    if exp is None:
+        _verified_cache.set(key, (payload, exp))
+    else:
+        _verified_cache.set(key, (payload, exp), ttl=exp + 1 - time.time())
+    return dict(payload)
+
+
+def decode_cache_stats() -> Dict[str, int]:
+    return _verified_cache.stats()
+
+
+def _verify(token: str, secret: str) -> Tuple[Dict[str, Any], Any]:
     try:
         header_b, payload_b, sig_b = token.split('.')
     except ValueError:
         raise ValueError('Invalid token format')
 
     signing_input = f"{header_b}.{payload_b}".encode('utf-8')
-    expected_sig = hmac.new(secret.encode('utf-8'), signing_input, hashlib.sha256).digest()
+    expected_sig = _sign(signing_input, secret)
     try:
         sig = _b64url_decode(sig_b)
     except Exception:
@@ -50,8 +95,9 @@ def decode_jwt(token: str, secret: str) -> Dict[str, Any]:
     # Optional expiry check
     exp = payload.get('exp')
     if exp is not None:
+        exp = int(exp)
         now = int(time.time())
-        if now > int(exp):
+        if now > exp:
             raise ValueError('Token expired')
 
-    return payload
+    return payload, exp
@@ -0,0 +1,99 @@
+"""Per-donation utilization ledger (migrations/003_donation_ledger.sql).
+
+donations.amount_utilized holds SUM(utilizations.amount_utilized) for the
+donation and donations.remaining_balance is derived from it, so read paths no
+longer join and group utilizations per donation.  Writers lock the donation rows
+with ``lock_donations`` before checking the balance, insert their utilizations
+and call ``apply_utilizations`` on the same cursor before committing.
+
+    python ledger.py --check   # report donations whose ledger disagrees with utilizations
+    python ledger.py --fix     # ... and rewrite them from the raw rows
+"""
+import argparse
+import sys
+
+_APPLY = """
+    UPDATE donations d
+    SET amount_utilized = d.amount_utilized + s.total
+    FROM (
+        SELECT donation_id, SUM(amount_utilized) as total
+        FROM utilizations
+        WHERE utilization_id = ANY(%s) AND donation_id IS NOT NULL AND amount_utilized IS NOT NULL
+        GROUP BY donation_id
+    ) s
+    WHERE d.donation_id = s.donation_id
+"""
+
+_DRIFT = """
+    SELECT d.donation_id, d.amount_utilized as ledger, COALESCE(s.total, 0) as actual
+    FROM donations d
+    LEFT JOIN (
+        SELECT donation_id, SUM(amount_utilized) as total
+        FROM utilizations
+        WHERE donation_id IS NOT NULL AND amount_utilized IS NOT NULL
+        GROUP BY donation_id
+    ) s ON s.donation_id = d.donation_id
+    WHERE d.amount_utilized <> COALESCE(s.total, 0)
+    ORDER BY d.donation_id
+"""
+
+
+def lock_donations(cur, donation_ids, ngo_id=None):
+    """Lock the donation rows (in id order, so concurrent writers cannot deadlock)
+    and return {donation_id: remaining_balance}; unknown ids -- and, with
+    ``ngo_id``, donations of other NGOs -- are left out."""
+    lock_cur = cur.connection.cursor()
+    lock_cur.execute(
+        "SELECT donation_id, COALESCE(remaining_balance, 0) "
+        "FROM donations WHERE donation_id = ANY(%s) AND (%s::int IS NULL OR ngo_id = %s::int) "
+        "ORDER BY donation_id FOR UPDATE",
+        (list(donation_ids), ngo_id, ngo_id)
+    )
+    balances = dict(lock_cur.fetchall())
+    lock_cur.close()
+    return balances
+
+
+def apply_utilizations(cur, utilization_ids):
+    """Add freshly inserted utilizations to their donations' ledger (caller commits)."""
+    if utilization_ids:
+        cur.execute(_APPLY, (list(utilization_ids),))
+
+
+def reconcile(conn, fix=False):
+    """Return [(donation_id, ledger, actual)] for every drifted donation; with
+    ``fix`` the drifted rows are rewritten from the raw utilizations."""
+    cur = conn.cursor()
+    if fix:
+        # writers take FOR UPDATE row locks on donations first, so this waits for
+        # in-flight utilizations and holds new ones off until the repair commits
+        cur.execute("LOCK TABLE donations IN EXCLUSIVE MODE")
+    cur.execute(_DRIFT)
+    drift = cur.fetchall()
+    if fix and drift:
+        cur.execute(
+            "UPDATE donations d SET amount_utilized = v.actual "
+            "FROM unnest(%s::int[], %s::numeric[]) as v(donation_id, actual) "
+            "WHERE d.donation_id = v.donation_id",
+            ([row[0] for row in drift], [row[2] for row in drift])
+        )
+    conn.commit()
+    cur.close()
+    return drift
+
+
+if __name__ == "__main__":
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description="Verify the donation utilization ledger")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--check", action="store_true", help="report drifted donations")
+    mode.add_argument("--fix", action="store_true", help="report and repair drifted donations")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        drift = reconcile(conn, fix=args.fix)
+    for donation_id, ledger, actual in drift:
+        print(f"donation {donation_id}: ledger={ledger} utilizations={actual}")
+    print(f"{len(drift)} drifted donation(s){' repaired' if args.fix and drift else ''}")
+    sys.exit(1 if drift and not args.fix else 0)
@@ -0,0 +1,218 @@
+"""In-process request metrics with a Prometheus text endpoint.
+
+``init_app`` times every request and serves ``GET /metrics`` in the text
+exposition format (version 0.0.4):
+
+    trustbridge_http_requests_total{blueprint,route,method,status}      counter
+    trustbridge_http_request_duration_seconds{blueprint,route,method}   histogram
+    trustbridge_http_request_errors_total{blueprint,route,method}       counter (5xx and unhandled)
+    trustbridge_http_requests_in_flight{blueprint}                      gauge
+    trustbridge_db_statements_total / trustbridge_db_time_seconds_total per route (query_stats.py)
+
+``route`` is the URL rule (``/api/donors/<donor_id>/history``), so label
+cardinality stays bounded; requests that match no rule share
+``route="<unmatched>"``.  p50/p95/p99 come from the histogram buckets with
+``histogram_quantile`` on the Prometheus side.
+
+Pool and cache statistics are exported as gauges from collectors added with
+``register_collector(name, fn)``; ``fn`` returns a flat dict of numbers and is
+only called when /metrics is scraped.
+
+Counters live in the process, so with several workers each one is scraped
+(or aggregated) separately.  Recording costs one dict lookup, one bisect and
+one uncontended lock per request (benchmarks/bench_metrics.py).
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+from query_stats import current_query_stats
+
+PREFIX = "trustbridge"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = "<unmatched>"
+
+
+class RouteSeries:
+    """Counters for one (blueprint, route, method)."""
+
+    __slots__ = ("lock", "buckets", "total", "count", "statuses", "errors",
+                 "db_statements", "db_time")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [0] * (len(BUCKETS) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.statuses = {}
+        self.errors = 0
+        self.db_statements = 0
+        self.db_time = 0.0
+
+    def observe(self, seconds, status, error, db_statements=0, db_time=0.0):
+        index = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.buckets[index] += 1
+            self.total += seconds
+            self.count += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if error:
+                self.errors += 1
+            self.db_statements += db_statements
+            self.db_time += db_time
+
+    def snapshot(self):
+        with self.lock:
+            return (list(self.buckets), self.total, self.count, dict(self.statuses),
+                    self.errors, self.db_statements, self.db_time)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}       # (blueprint, route, method) -> RouteSeries
+        self._in_flight = {}    # blueprint -> requests currently running
+        self._collectors = {}   # name -> callable returning {stat: number}
+        self.started = time.time()
+
+    def series(self, blueprint, route, method):
+        key = (blueprint, route, method)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, RouteSeries())
+        return series
+
+    def enter(self, blueprint):
+        with self._lock:
+            self._in_flight[blueprint] = self._in_flight.get(blueprint, 0) + 1
+
+    def leave(self, blueprint):
+        with self._lock:
+            self._in_flight[blueprint] = self._in_flight.get(blueprint, 0) - 1
+
+    def register_collector(self, name, fn):
+        self._collectors[name] = fn
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            in_flight = sorted(self._in_flight.items())
+        snapshots = [(key, s.snapshot()) for key, s in series]
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {PREFIX}_{name} {text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        header("http_requests_total", "counter", "Requests handled, by route and status code.")
+        for key, (_, _, _, statuses, _, _, _) in snapshots:
+            for status, count in sorted(statuses.items()):
+                lines.append(f"{PREFIX}_http_requests_total{_labels(key, status=status)} {count}")
+
+        header("http_request_duration_seconds", "histogram", "Request latency in seconds.")
+        for key, (buckets, total, count, _, _, _, _) in snapshots:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += n
+                lines.append(f"{PREFIX}_http_request_duration_seconds_bucket"
+                             f"{_labels(key, le=bound)} {cumulative}")
+            lines.append(f"{PREFIX}_http_request_duration_seconds_sum{_labels(key)} {total:.6f}")
+            lines.append(f"{PREFIX}_http_request_duration_seconds_count{_labels(key)} {count}")
+
+        header("http_request_errors_total", "counter", "Requests that failed with a 5xx or an exception.")
+        for key, (_, _, _, _, errors, _, _) in snapshots:
+            lines.append(f"{PREFIX}_http_request_errors_total{_labels(key)} {errors}")
+
+        header("http_requests_in_flight", "gauge", "Requests currently being handled.")
+        for blueprint, count in in_flight:
+            lines.append(f"{PREFIX}_http_requests_in_flight{_format_labels(blueprint=blueprint)} {count}")
+
+        header("db_statements_total", "counter", "Database statements run by requests, by route.")
+        for key, (_, _, _, _, _, statements, _) in snapshots:
+            lines.append(f"{PREFIX}_db_statements_total{_labels(key)} {statements}")
+
+        header("db_time_seconds_total", "counter", "Database time spent by requests, by route.")
+        for key, (_, _, _, _, _, _, db_time) in snapshots:
+            lines.append(f"{PREFIX}_db_time_seconds_total{_labels(key)} {db_time:.6f}")
+
+        for name, fn in sorted(self._collectors.items()):
+            try:
+                stats = fn()
+            except Exception as e:
+                print(f"Error collecting {name} metrics: {str(e)}")
+                continue
+            for stat, value in sorted(stats.items()):
+                if isinstance(value, (bool, int, float)):
+                    metric = f"{name}_{stat}"
+                    header(metric, "gauge", f"{name} {stat.replace('_', ' ')}.")
+                    lines.append(f"{PREFIX}_{metric} {int(value) if isinstance(value, bool) else value}")
+
+        header("process_uptime_seconds", "gauge", "Seconds since the metrics registry was created.")
+        lines.append(f"{PREFIX}_process_uptime_seconds {time.time() - self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _labels(key, **extra):
+    blueprint, route, method = key
+    return _format_labels(blueprint=blueprint, route=route, method=method, **extra)
+
+
+registry = MetricsRegistry()
+
+
+def register_collector(name, fn):
+    registry.register_collector(name, fn)
+
+
+def _start():
+    blueprint = request.blueprint or "app"
+    g._metrics = (time.perf_counter(), blueprint)
+    registry.enter(blueprint)
+
+
+def _status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _finish(exc=None):
+    started = g.pop("_metrics", None)
+    if started is None:
+        return
+    started, blueprint = started
+    registry.leave(blueprint)
+    status = 500 if exc is not None else g.pop("_metrics_status", 500)
+    rule = request.url_rule
+    stats = current_query_stats()
+    registry.series(blueprint, rule.rule if rule is not None else UNMATCHED, request.method).observe(
+        time.perf_counter() - started, status, status >= 500,
+        stats.statements if stats else 0, stats.db_time if stats else 0.0,
+    )
+
+
+def metrics_endpoint():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """Time every request and serve GET /metrics (which is not itself recorded)."""
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
+
+    def start():
+        if request.endpoint != "metrics":
+            _start()
+
+    app.before_request(start)
+    app.after_request(_status)
+    app.teardown_request(_finish)
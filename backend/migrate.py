@@ -0,0 +1,63 @@
+"""Apply the versioned SQL files in migrations/ that have not run yet.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending versions
+
+Each file runs in its own transaction and is recorded in schema_migrations.
+"""
+import argparse
+import os
+import sys
+
+from db import db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def _available():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+
+
+def _applied(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     text PRIMARY KEY,
+            applied_at  timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate(status_only=False):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        applied = _applied(cur)
+        conn.commit()
+
+        pending = [f for f in _available() if f not in applied]
+        if status_only:
+            for name in _available():
+                print(f"{'applied' if name in applied else 'pending'}  {name}")
+            return pending
+
+        for name in pending:
+            with open(os.path.join(MIGRATIONS_DIR, name)) as fh:
+                sql = fh.read()
+            try:
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (name,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"failed   {name}", file=sys.stderr)
+                raise
+            print(f"applied  {name}")
+        cur.close()
+        return pending
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--status", action="store_true", help="only list migration status")
+    migrate(status_only=parser.parse_args().status)
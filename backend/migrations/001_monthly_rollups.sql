@@ -0,0 +1,51 @@
+-- Monthly rollups of donations and utilizations, keyed by (month, ngo_id, donor_id, purpose).
+-- Kept current by rollups.py inside the same transaction as each insert.
+-- donor_id and purpose may be NULL, so uniqueness is enforced on COALESCEd expressions.
+
+CREATE TABLE IF NOT EXISTS donation_monthly_rollup (
+    month           date           NOT NULL,
+    ngo_id          integer,
+    donor_id        integer,
+    purpose         text,
+    total_amount    numeric        NOT NULL DEFAULT 0,
+    donation_count  bigint         NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS donation_monthly_rollup_key
+    ON donation_monthly_rollup (month, COALESCE(ngo_id, 0), COALESCE(donor_id, 0), COALESCE(purpose, ''));
+CREATE INDEX IF NOT EXISTS donation_monthly_rollup_ngo ON donation_monthly_rollup (ngo_id, month);
+CREATE INDEX IF NOT EXISTS donation_monthly_rollup_donor ON donation_monthly_rollup (donor_id, month);
+
+-- month is the utilization month; donor_id and purpose come from the utilized donation
+CREATE TABLE IF NOT EXISTS utilization_monthly_rollup (
+    month              date       NOT NULL,
+    ngo_id             integer,
+    donor_id           integer,
+    purpose            text,
+    total_utilized     numeric    NOT NULL DEFAULT 0,
+    utilization_count  bigint     NOT NULL DEFAULT 0,
+    beneficiaries      bigint     NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS utilization_monthly_rollup_key
+    ON utilization_monthly_rollup (month, COALESCE(ngo_id, 0), COALESCE(donor_id, 0), COALESCE(purpose, ''));
+CREATE INDEX IF NOT EXISTS utilization_monthly_rollup_ngo ON utilization_monthly_rollup (ngo_id, month);
+CREATE INDEX IF NOT EXISTS utilization_monthly_rollup_donor ON utilization_monthly_rollup (donor_id, month);
+
+-- Backfill from existing rows
+TRUNCATE donation_monthly_rollup, utilization_monthly_rollup;
+
+INSERT INTO donation_monthly_rollup (month, ngo_id, donor_id, purpose, total_amount, donation_count)
+SELECT DATE_TRUNC('month', donated_at)::date, ngo_id, donor_id, purpose,
+       COALESCE(SUM(amount), 0), COUNT(*)
+FROM donations
+WHERE donated_at IS NOT NULL
+GROUP BY 1, ngo_id, donor_id, purpose;
+
+INSERT INTO utilization_monthly_rollup (month, ngo_id, donor_id, purpose, total_utilized, utilization_count, beneficiaries)
+SELECT DATE_TRUNC('month', u.utilized_at)::date, u.ngo_id, d.donor_id, d.purpose,
+       COALESCE(SUM(u.amount_utilized), 0), COUNT(*), COALESCE(SUM(u.beneficiaries), 0)
+FROM utilizations u
+LEFT JOIN donations d ON d.donation_id = u.donation_id
+WHERE u.utilized_at IS NOT NULL
+GROUP BY 1, u.ngo_id, d.donor_id, d.purpose;
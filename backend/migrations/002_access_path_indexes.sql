@@ -0,0 +1,25 @@
+-- Indexes for the access paths the routes actually use.  Every time filter on
+-- the raw tables is a half-open range on the bare column, so the trailing
+-- timestamp column serves both the range and the newest-first ordering; the
+-- primary key is appended where keyset pagination orders by (ts, id).
+
+-- /api/donations/records, /export, /api/ngo/dashboard: WHERE ngo_id = ? [AND donated_at range]
+CREATE INDEX IF NOT EXISTS donations_ngo_donated_at
+    ON donations (ngo_id, donated_at, donation_id);
+
+-- donor history and donor analytics: WHERE donor_id = ? [AND donated_at range]
+CREATE INDEX IF NOT EXISTS donations_donor_donated_at
+    ON donations (donor_id, donated_at);
+
+-- per-donation utilization sums (LATERAL / LEFT JOIN on donation_id)
+CREATE INDEX IF NOT EXISTS utilizations_donation_id
+    ON utilizations (donation_id);
+
+-- /api/utilization/records, /export, /api/ngo/dashboard: WHERE ngo_id = ? ORDER BY utilized_at DESC
+CREATE INDEX IF NOT EXISTS utilizations_ngo_utilized_at
+    ON utilizations (ngo_id, utilized_at, utilization_id);
+
+-- identity resolution (user_id -> ngo_id / donor_id) and create_donation's ngo_name lookup
+CREATE INDEX IF NOT EXISTS ngos_user_id ON ngos (user_id);
+CREATE INDEX IF NOT EXISTS donors_user_id ON donors (user_id);
+CREATE INDEX IF NOT EXISTS ngos_name ON ngos (name);
@@ -0,0 +1,23 @@
+-- Per-donation utilization ledger.  amount_utilized is kept equal to
+-- SUM(utilizations.amount_utilized) for the donation by ledger.py, inside the
+-- same transaction as each utilization insert; remaining_balance follows it.
+-- Verify or repair with: python ledger.py --check / --fix
+
+ALTER TABLE donations
+    ADD COLUMN IF NOT EXISTS amount_utilized numeric NOT NULL DEFAULT 0;
+
+ALTER TABLE donations
+    ADD COLUMN IF NOT EXISTS remaining_balance numeric
+        GENERATED ALWAYS AS (amount - amount_utilized) STORED;
+
+UPDATE donations d
+SET amount_utilized = s.total
+FROM (
+    SELECT donation_id, SUM(amount_utilized) as total
+    FROM utilizations
+    WHERE donation_id IS NOT NULL AND amount_utilized IS NOT NULL
+    GROUP BY donation_id
+) s
+WHERE d.donation_id = s.donation_id;
+
+ANALYZE donations;
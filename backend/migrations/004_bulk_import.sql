@@ -0,0 +1,27 @@
+-- Helpers for bulk_import.py: staged values arrive as text and are validated
+-- set-wise, so a malformed timestamp must yield NULL rather than abort the load.
+-- PostgreSQL 16+ can test input without an exception block per row.
+
+DO $do$
+BEGIN
+    IF current_setting('server_version_num')::int >= 160000 THEN
+        EXECUTE $f$
+            CREATE OR REPLACE FUNCTION bulk_try_timestamp(value text) RETURNS timestamp
+            LANGUAGE sql STABLE AS $$
+                SELECT CASE WHEN pg_input_is_valid(value, 'timestamp') THEN value::timestamp END
+            $$
+        $f$;
+    ELSE
+        EXECUTE $f$
+            CREATE OR REPLACE FUNCTION bulk_try_timestamp(value text) RETURNS timestamp
+            LANGUAGE plpgsql STABLE AS $$
+            BEGIN
+                RETURN value::timestamp;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END
+            $$
+        $f$;
+    END IF;
+END
+$do$;
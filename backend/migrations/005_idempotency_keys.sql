@@ -0,0 +1,19 @@
+-- Idempotency-Key store for the create endpoints (idempotency.py).  A key is
+-- claimed in the same transaction as the write it guards and the response is
+-- stored before that transaction commits, so a retry either replays the stored
+-- response or waits on the key's primary-key entry for the first attempt.
+-- Expired rows are purged in small batches by the writers themselves, or with
+--     python idempotency.py --purge
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope         text      NOT NULL,
+    key           text      NOT NULL,
+    request_hash  text      NOT NULL,
+    status_code   integer,
+    response      jsonb,
+    created_at    timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at    timestamp NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at ON idempotency_keys (expires_at);
@@ -0,0 +1,5 @@
+-- /api/donations/records without an NGO scope: newest first over every donation.
+-- A backward scan gives ORDER BY donated_at DESC NULLS FIRST, donation_id DESC,
+-- and the (donated_at, donation_id) keyset condition becomes an index bound.
+CREATE INDEX IF NOT EXISTS donations_donated_at
+    ON donations (donated_at, donation_id);
@@ -0,0 +1,35 @@
+-- Donations and utilizations without a date go into a NULL-month row of the
+-- rollups, so all-time totals (dashboard, admin, analytics, overall report)
+-- still include them; month-window filters leave them out as before.  The
+-- NULL month is keyed through COALESCE like the other nullable key columns.
+
+ALTER TABLE donation_monthly_rollup ALTER COLUMN month DROP NOT NULL;
+ALTER TABLE utilization_monthly_rollup ALTER COLUMN month DROP NOT NULL;
+
+DROP INDEX IF EXISTS donation_monthly_rollup_key;
+CREATE UNIQUE INDEX donation_monthly_rollup_key
+    ON donation_monthly_rollup (COALESCE(month, '-infinity'::date), COALESCE(ngo_id, 0),
+                                COALESCE(donor_id, 0), COALESCE(purpose, ''));
+DROP INDEX IF EXISTS utilization_monthly_rollup_key;
+CREATE UNIQUE INDEX utilization_monthly_rollup_key
+    ON utilization_monthly_rollup (COALESCE(month, '-infinity'::date), COALESCE(ngo_id, 0),
+                                   COALESCE(donor_id, 0), COALESCE(purpose, ''));
+
+-- month-window scans across every NGO (admin dashboard, overall report) used the old key
+CREATE INDEX IF NOT EXISTS donation_monthly_rollup_month ON donation_monthly_rollup (month);
+CREATE INDEX IF NOT EXISTS utilization_monthly_rollup_month ON utilization_monthly_rollup (month);
+
+-- Backfill the undated rows the earlier backfill and upserts skipped
+INSERT INTO donation_monthly_rollup (month, ngo_id, donor_id, purpose, total_amount, donation_count)
+SELECT NULL, ngo_id, donor_id, purpose, COALESCE(SUM(amount), 0), COUNT(*)
+FROM donations
+WHERE donated_at IS NULL
+GROUP BY ngo_id, donor_id, purpose;
+
+INSERT INTO utilization_monthly_rollup (month, ngo_id, donor_id, purpose, total_utilized, utilization_count, beneficiaries)
+SELECT NULL, u.ngo_id, d.donor_id, d.purpose,
+       COALESCE(SUM(u.amount_utilized), 0), COUNT(*), COALESCE(SUM(u.beneficiaries), 0)
+FROM utilizations u
+LEFT JOIN donations d ON d.donation_id = u.donation_id
+WHERE u.utilized_at IS NULL
+GROUP BY u.ngo_id, d.donor_id, d.purpose;
@@ -0,0 +1,24 @@
+-- Utilization against each donation rollup row, keyed by the donation's month,
+-- ngo, donor and purpose: the overall report follows utilization through the
+-- donations made in its window, as it did when it joined the raw tables.
+-- Kept current by rollups.record_utilizations.
+
+ALTER TABLE donation_monthly_rollup
+    ADD COLUMN IF NOT EXISTS total_utilized     numeric  NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS utilization_count  bigint   NOT NULL DEFAULT 0;
+
+-- Backfill from existing rows
+UPDATE donation_monthly_rollup AS r
+SET total_utilized = s.utilized,
+    utilization_count = s.utilizations
+FROM (
+    SELECT DATE_TRUNC('month', d.donated_at)::date AS month, d.ngo_id, d.donor_id, d.purpose,
+           COALESCE(SUM(u.amount_utilized), 0) AS utilized, COUNT(*) AS utilizations
+    FROM utilizations u
+    JOIN donations d ON d.donation_id = u.donation_id
+    GROUP BY 1, d.ngo_id, d.donor_id, d.purpose
+) s
+WHERE COALESCE(r.month, '-infinity'::date) = COALESCE(s.month, '-infinity'::date)
+  AND COALESCE(r.ngo_id, 0) = COALESCE(s.ngo_id, 0)
+  AND COALESCE(r.donor_id, 0) = COALESCE(s.donor_id, 0)
+  AND COALESCE(r.purpose, '') = COALESCE(s.purpose, '');
@@ -1,66 +1,73 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, g
 from db import get_db
-from jwt_utils import decode_jwt
+from identity import accepts_raw_token
+from cache_utils import SingleFlight
 from psycopg2.extras import RealDictCursor
 
 ngo_analytics_bp = Blueprint('ngo_analytics', __name__, url_prefix='/api/ngo-analytics')
 
+# Concurrent report requests for the same NGO share one computation
+_reports_flight = SingleFlight()
+
+
+def reports_flight_stats():
+    return _reports_flight.stats()
+
+
 @ngo_analytics_bp.route('/reports', methods=['GET'])
+@accepts_raw_token
 def get_ngo_reports():
     """Get comprehensive analytics and reports for an NGO"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
+    if g.token is None:
         return jsonify({'error': 'Authorization header missing'}), 401
-    
-    token = auth_header.replace('Bearer ', '')
-    try:
-        payload = decode_jwt(token, current_app.config.get('SECRET_KEY'))
-    except ValueError as ve:
-        return jsonify({'error': str(ve)}), 401
-    
-    if not payload:
-        return jsonify({'error': 'Invalid token'}), 401
-    
-    user_id = payload.get('user_id')
-    if not user_id:
+    if g.auth_error:
+        return jsonify({'error': g.auth_error}), 401
+
+    if not g.user_id:
         return jsonify({'error': 'User ID not found in token'}), 401
 
+    ngo_id = g.ngo_id
+    if not ngo_id:
+        return jsonify({'error': 'NGO not found'}), 404
+
+    try:
+        reports = _reports_flight.do(ngo_id, lambda: _build_reports(ngo_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(reports)
+
+
+def _build_reports(ngo_id):
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        # Get NGO ID from user_id
-        cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-        ngo = cur.fetchone()
-        if not ngo:
-            return jsonify({'error': 'NGO not found'}), 404
-        
-        ngo_id = ngo['ngo_id']
-
-        # Get monthly donations and utilizations for current year
+        # Get monthly donations and utilizations for current year (from the monthly rollups)
         cur.execute("""
             SELECT 
-                TO_CHAR(donated_at, 'Mon') as month,
-                EXTRACT(MONTH FROM donated_at) as month_num,
-                COALESCE(SUM(amount), 0) as donations
-            FROM donations
-            WHERE ngo_id = %s 
-                AND EXTRACT(YEAR FROM donated_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-            GROUP BY month_num, TO_CHAR(donated_at, 'Mon')
-            ORDER BY month_num
+                TO_CHAR(r.month, 'Mon') as month,
+                EXTRACT(MONTH FROM r.month) as month_num,
+                COALESCE(SUM(r.total_amount), 0) as donations
+            FROM donation_monthly_rollup r
+            WHERE r.ngo_id = %s 
+                AND r.month >= DATE_TRUNC('year', CURRENT_DATE)
+                AND r.month < DATE_TRUNC('year', CURRENT_DATE) + INTERVAL '1 year'
+            GROUP BY r.month
+            ORDER BY r.month
         """, (ngo_id,))
         monthly_donations_raw = cur.fetchall()
 
         # Get monthly utilizations
         cur.execute("""
             SELECT 
-                EXTRACT(MONTH FROM u.utilized_at) as month_num,
-                COALESCE(SUM(u.amount_utilized), 0) as utilized
-            FROM utilizations u
-            WHERE u.ngo_id = %s 
-                AND EXTRACT(YEAR FROM u.utilized_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-            GROUP BY month_num
-            ORDER BY month_num
+                EXTRACT(MONTH FROM r.month) as month_num,
+                COALESCE(SUM(r.total_utilized), 0) as utilized
+            FROM utilization_monthly_rollup r
+            WHERE r.ngo_id = %s 
+                AND r.month >= DATE_TRUNC('year', CURRENT_DATE)
+                AND r.month < DATE_TRUNC('year', CURRENT_DATE) + INTERVAL '1 year'
+            GROUP BY r.month
+            ORDER BY r.month
         """, (ngo_id,))
         monthly_utilized_raw = cur.fetchall()
 
@@ -79,10 +86,10 @@ def get_ngo_reports():
         cur.execute("""
             SELECT 
                 d.name as donor,
-                COALESCE(SUM(dn.amount), 0) as amount
-            FROM donations dn
-            JOIN donors d ON dn.donor_id = d.donor_id
-            WHERE dn.ngo_id = %s
+                COALESCE(SUM(r.total_amount), 0) as amount
+            FROM donation_monthly_rollup r
+            JOIN donors d ON r.donor_id = d.donor_id
+            WHERE r.ngo_id = %s
             GROUP BY d.name
             ORDER BY amount DESC
             LIMIT 6
@@ -101,19 +108,29 @@ def get_ngo_reports():
                 'percentage': round(percentage, 0)
             })
 
-        # Get category-wise data (based on purpose)
+        # Get category-wise data (based on donation purpose)
         cur.execute("""
+            WITH donated AS (
+                SELECT purpose, SUM(total_amount) as amount
+                FROM donation_monthly_rollup
+                WHERE ngo_id = %s
+                GROUP BY purpose
+            ),
+            utilized AS (
+                SELECT purpose, SUM(total_utilized) as utilized
+                FROM utilization_monthly_rollup
+                WHERE ngo_id = %s
+                GROUP BY purpose
+            )
             SELECT 
-                d.purpose as category,
-                COALESCE(SUM(d.amount), 0) as amount,
-                COALESCE(SUM(u.amount_utilized), 0) as utilized
-            FROM donations d
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            WHERE d.ngo_id = %s
-            GROUP BY d.purpose
+                donated.purpose as category,
+                COALESCE(donated.amount, 0) as amount,
+                COALESCE(utilized.utilized, 0) as utilized
+            FROM donated
+            LEFT JOIN utilized ON utilized.purpose IS NOT DISTINCT FROM donated.purpose
             ORDER BY amount DESC
             LIMIT 5
-        """, (ngo_id,))
+        """, (ngo_id, ngo_id))
         category_data = cur.fetchall()
 
         # Calculate percentages for categories
@@ -133,12 +150,12 @@ def get_ngo_reports():
         # Get yearly comparison (last 3 years)
         cur.execute("""
             SELECT 
-                EXTRACT(YEAR FROM donated_at)::text as year,
-                COALESCE(SUM(amount), 0) as total_donations,
+                EXTRACT(YEAR FROM month)::text as year,
+                COALESCE(SUM(total_amount), 0) as total_donations,
                 COUNT(DISTINCT donor_id) as donors
-            FROM donations
+            FROM donation_monthly_rollup
             WHERE ngo_id = %s
-                AND donated_at >= CURRENT_DATE - INTERVAL '3 years'
+                AND month >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '3 years')
             GROUP BY year
             ORDER BY year
         """, (ngo_id,))
@@ -147,11 +164,11 @@ def get_ngo_reports():
         # Get yearly utilization
         cur.execute("""
             SELECT 
-                EXTRACT(YEAR FROM utilized_at)::text as year,
-                COALESCE(SUM(amount_utilized), 0) as utilized
-            FROM utilizations
+                EXTRACT(YEAR FROM month)::text as year,
+                COALESCE(SUM(total_utilized), 0) as utilized
+            FROM utilization_monthly_rollup
             WHERE ngo_id = %s
-                AND utilized_at >= CURRENT_DATE - INTERVAL '3 years'
+                AND month >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '3 years')
             GROUP BY year
             ORDER BY year
         """, (ngo_id,))
@@ -171,35 +188,34 @@ def get_ngo_reports():
                 'donors': row['donors']
             })
 
-        # Get summary statistics
+        # Get summary statistics for the current year, with the previous year for comparison
         cur.execute("""
             SELECT 
-                COALESCE(SUM(amount), 0) as total_donations,
-                COUNT(DISTINCT donor_id) as active_donors,
-                COUNT(*) as donation_count
-            FROM donations
+                COALESCE(SUM(total_amount) FILTER (
+                    WHERE month >= DATE_TRUNC('year', CURRENT_DATE)), 0) as total_donations,
+                COUNT(DISTINCT donor_id) FILTER (
+                    WHERE month >= DATE_TRUNC('year', CURRENT_DATE)) as active_donors,
+                COALESCE(SUM(donation_count) FILTER (
+                    WHERE month >= DATE_TRUNC('year', CURRENT_DATE)), 0)::bigint as donation_count,
+                COALESCE(SUM(total_amount) FILTER (
+                    WHERE month < DATE_TRUNC('year', CURRENT_DATE)), 0) as prev_total
+            FROM donation_monthly_rollup
             WHERE ngo_id = %s
-                AND EXTRACT(YEAR FROM donated_at) = EXTRACT(YEAR FROM CURRENT_DATE)
+                AND month >= DATE_TRUNC('year', CURRENT_DATE) - INTERVAL '1 year'
+                AND month < DATE_TRUNC('year', CURRENT_DATE) + INTERVAL '1 year'
         """, (ngo_id,))
         summary = cur.fetchone()
+        prev_year = summary
 
         cur.execute("""
-            SELECT COALESCE(SUM(amount_utilized), 0) as total_utilized
-            FROM utilizations
+            SELECT COALESCE(SUM(total_utilized), 0) as total_utilized
+            FROM utilization_monthly_rollup
             WHERE ngo_id = %s
-                AND EXTRACT(YEAR FROM utilized_at) = EXTRACT(YEAR FROM CURRENT_DATE)
+                AND month >= DATE_TRUNC('year', CURRENT_DATE)
+                AND month < DATE_TRUNC('year', CURRENT_DATE) + INTERVAL '1 year'
         """, (ngo_id,))
         util_summary = cur.fetchone()
 
-        # Calculate previous year for comparison
-        cur.execute("""
-            SELECT COALESCE(SUM(amount), 0) as prev_total
-            FROM donations
-            WHERE ngo_id = %s
-                AND EXTRACT(YEAR FROM donated_at) = EXTRACT(YEAR FROM CURRENT_DATE) - 1
-        """, (ngo_id,))
-        prev_year = cur.fetchone()
-
         total_donations = float(summary['total_donations'])
         total_utilized = float(util_summary['total_utilized'])
         prev_total = float(prev_year['prev_total'])
@@ -217,16 +233,14 @@ def get_ngo_reports():
             'utilization_percent': round(utilization_percent, 0)
         }
 
-        return jsonify({
+        return {
             'monthly_data': monthly_data,
             'donor_wise_data': donor_wise_data,
             'category_wise_data': category_wise_data,
             'yearly_comparison': yearly_comparison,
             'stats': stats
-        })
+        }
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
     finally:
         cur.close()
         conn.close()
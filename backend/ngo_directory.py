@@ -0,0 +1,94 @@
+"""In-process NGO name -> ngo_id map for the donation write path.
+
+Donors pick an NGO by name, so ``create_donation`` used to run
+``SELECT ngo_id FROM ngos WHERE name = %s`` on every donation.  The map is
+loaded lazily with one query over ``ngos`` and matched on a normalized key
+(case-folded, whitespace collapsed), so "Helping  hands " finds "Helping Hands".
+
+Writers that add or rename NGOs call ``refresh_ngo_names()``; the next lookup
+reloads.  Other processes pick the change up after NGO_NAME_CACHE_TTL seconds,
+or sooner on a miss: an unknown name or id triggers a reload, at most once per
+NGO_NAME_RELOAD_INTERVAL seconds so bogus names cannot hammer the database.
+"""
+import os
+import threading
+import time
+
+from db import db_cursor
+
+NAME_CACHE_TTL = float(os.environ.get("NGO_NAME_CACHE_TTL", 300))
+RELOAD_INTERVAL = float(os.environ.get("NGO_NAME_RELOAD_INTERVAL", 5))
+
+_lock = threading.Lock()
+_by_name = {}   # normalized name -> ngo_id
+_by_id = {}     # ngo_id -> name
+_loaded_at = None
+_stats = {"hits": 0, "misses": 0, "loads": 0}
+
+
+def normalize_name(name):
+    return " ".join(str(name).split()).casefold()
+
+
+def _load():
+    global _by_name, _by_id, _loaded_at
+    with db_cursor() as cur:
+        # lowest id wins when two NGOs normalize to the same name
+        cur.execute("SELECT ngo_id, name FROM ngos ORDER BY ngo_id")
+        rows = cur.fetchall()
+    by_name, by_id = {}, {}
+    for row in rows:
+        if row["name"] is not None:
+            by_name.setdefault(normalize_name(row["name"]), row["ngo_id"])
+        by_id[row["ngo_id"]] = row["name"]
+    _by_name, _by_id = by_name, by_id
+    _loaded_at = time.monotonic()
+    _stats["loads"] += 1
+
+
+def _ensure_loaded(on_miss=False):
+    """Reload when never loaded, expired, or (on a miss) not reloaded recently."""
+    with _lock:
+        age = None if _loaded_at is None else time.monotonic() - _loaded_at
+        if age is None or age >= NAME_CACHE_TTL or (on_miss and age >= RELOAD_INTERVAL):
+            _load()
+            return True
+    return False
+
+
+def _lookup(table, key, contains=False):
+    _ensure_loaded()
+    found = key in table()
+    if not found and _ensure_loaded(on_miss=True):
+        found = key in table()
+    _stats["hits" if found else "misses"] += 1
+    if contains:
+        return found
+    return table().get(key)
+
+
+def resolve_ngo_id(name):
+    """ngo_id for an NGO name (case/whitespace-insensitive), or None."""
+    if not name or not str(name).strip():
+        return None
+    return _lookup(lambda: _by_name, normalize_name(name))
+
+
+def ngo_exists(ngo_id):
+    return _lookup(lambda: _by_id, ngo_id, contains=True)
+
+
+def ngo_name(ngo_id):
+    """Registered name of a known NGO (None when unknown or unnamed)."""
+    return _by_id.get(ngo_id) if ngo_exists(ngo_id) else None
+
+
+def refresh_ngo_names():
+    """Drop the map after an NGO is created or renamed; the next lookup reloads."""
+    global _loaded_at
+    with _lock:
+        _loaded_at = None
+
+
+def ngo_name_cache_stats():
+    return {"size": len(_by_name), **_stats}
@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, g
 from psycopg2.extras import RealDictCursor
 from db import get_db
-from jwt_utils import decode_jwt
+from cache_utils import SingleFlight
 
 ngo_bp = Blueprint("ngo", __name__, url_prefix="/api/ngo")
 
+# Concurrent dashboard requests for the same (ngo_id, prev_login) share one computation
+_dashboard_flight = SingleFlight()
+
+
+def dashboard_flight_stats():
+    return _dashboard_flight.stats()
+
 
 @ngo_bp.route("/list", methods=["GET"])
 def get_ngo_list():
@@ -67,177 +74,170 @@ def get_ngo_list():
 def get_ngo_dashboard():
     ngo_id = request.args.get("ngo_id")
     prev_login = None
-    auth_user_id = None
 
-    # Decode token (if present) to get user_id and prev_login
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            auth_user_id = payload.get("user_id")
-            prev_login = payload.get("prev_login")
-            print(f"Resolved user_id from token: {auth_user_id}; prev_login: {prev_login}")
-        except ValueError as ve:
-            msg = str(ve)
-            if 'expired' in msg.lower():
-                return jsonify({"error": "Token expired"}), 401
-            return jsonify({"error": "Invalid token"}), 401
+    # Token (if present) supplies the caller's ngo_id and prev_login
+    if g.auth_error:
+        if 'expired' in g.auth_error.lower():
+            return jsonify({"error": "Token expired"}), 401
+        return jsonify({"error": "Invalid token"}), 401
+    if g.token_payload:
+        prev_login = g.token_payload.get("prev_login")
+        print(f"Resolved user_id from token: {g.user_id}; prev_login: {prev_login}")
 
-    # If no ngo_id provided, try to infer from auth_user_id
-    if not ngo_id and auth_user_id:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT ngo_id, user_id, name FROM ngos WHERE user_id = %s", (auth_user_id,))
-        ngo = cur.fetchone()
-        cur.close()
-        conn.close()
-        if ngo:
-            ngo_id = ngo["ngo_id"]
+    # If no ngo_id provided, use the one resolved from the token
+    if not ngo_id:
+        ngo_id = g.ngo_id
 
     print(f"Fetching dashboard for NGO ID: {ngo_id}")
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    dashboard, status = _dashboard_flight.do(
+        (ngo_id, prev_login), lambda: _build_dashboard(ngo_id, prev_login)
+    )
+    return jsonify(dashboard), status
 
-    # If ngo_id not provided (or couldn't be resolved via token), pick the first NGO
-    if not ngo_id:
-        cur.execute("SELECT ngo_id, user_id, name FROM ngos ORDER BY created_at LIMIT 1")
-        ngo = cur.fetchone()
-        if not ngo:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "No NGOs found"}), 404
-        ngo_id = ngo["ngo_id"]
-    else:
-        cur.execute("SELECT ngo_id, user_id, name FROM ngos WHERE ngo_id = %s", (ngo_id,))
-        ngo = cur.fetchone()
-        if not ngo:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "NGO not found"}), 404
 
-    # Summary metrics
-    cur.execute(
-        "SELECT COALESCE(SUM(amount),0) as total_donations FROM donations WHERE ngo_id = %s",
-        (ngo_id,)
+# The whole dashboard in one round-trip.  Totals come from the monthly rollups;
+# "since last login" and the latest utilization are index range scans on
+# donations(ngo_id, donated_at) / utilizations(ngo_id, utilized_at); each list
+# section comes back as a JSON array.
+_DASHBOARD_QUERY = """
+    WITH n AS (
+        SELECT ngo_id, user_id, name FROM ngos {ngo_filter}
     )
-    total_donations = cur.fetchone()["total_donations"]
+    SELECT
+        n.ngo_id, n.user_id, n.name,
+        don.total_donations, donors.active_donors,
+        util.utilized_funds,
+        proj.active_projects,
+        since.additional_donations, since.new_donors,
+        latest.latest_count, latest.latest_utilized,
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'donation_id', r.donation_id, 'donor', r.donor, 'amount', r.amount::text,
+                    'date', r.donated_at::text, 'purpose', r.purpose, 'project_id', r.project_id
+                ) ORDER BY r.donated_at DESC), '[]')
+         FROM (
+            SELECT d.donation_id, dn.name as donor, d.amount, d.donated_at, d.purpose, pd.project_id
+            FROM donations d
+            LEFT JOIN donors dn ON d.donor_id = dn.donor_id
+            LEFT JOIN project_donations pd ON d.donation_id = pd.donation_id
+            WHERE d.ngo_id = n.ngo_id
+            ORDER BY d.donated_at DESC
+            LIMIT 10
+         ) r) as recent_donations,
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'notification_id', r.notification_id, 'type', r.type, 'message', r.message,
+                    'created_at', r.created_at::text, 'is_read', r.is_read
+                ) ORDER BY r.created_at DESC), '[]')
+         FROM (
+            SELECT notification_id, type, message, created_at, is_read
+            FROM notifications
+            WHERE user_id = n.user_id
+            ORDER BY created_at DESC
+            LIMIT 5
+         ) r) as notifications,
+        (SELECT COALESCE(json_agg(json_build_object(
+                    'project_id', r.project_id, 'name', r.name, 'budget', r.budget,
+                    'amount_utilized', r.amount_utilized, 'donors_count', r.donors_count
+                )), '[]')
+         FROM (
+            SELECT p.project_id, p.name, p.budget, COALESCE(SUM(d.amount_utilized),0) as amount_utilized,
+                   COUNT(DISTINCT pd.donation_id) as donors_count
+            FROM projects p
+            LEFT JOIN project_donations pd ON p.project_id = pd.project_id
+            LEFT JOIN donations d ON pd.donation_id = d.donation_id
+            WHERE p.ngo_id = n.ngo_id AND p.status = 'ACTIVE'
+            GROUP BY p.project_id, p.name, p.budget
+         ) r) as projects
+    FROM n
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(SUM(total_amount), 0) as total_donations
+        FROM donation_monthly_rollup WHERE ngo_id = n.ngo_id
+    ) don
+    CROSS JOIN LATERAL (
+        -- DISTINCT as a subquery lets the planner hash instead of sorting every row
+        SELECT COUNT(*) as active_donors
+        FROM (SELECT DISTINCT donor_id FROM donation_monthly_rollup
+              WHERE ngo_id = n.ngo_id AND donor_id IS NOT NULL) x
+    ) donors
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(SUM(total_utilized), 0) as utilized_funds
+        FROM utilization_monthly_rollup WHERE ngo_id = n.ngo_id
+    ) util
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) as active_projects
+        FROM projects WHERE ngo_id = n.ngo_id AND status = 'ACTIVE'
+    ) proj
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) as additional_donations, COUNT(DISTINCT donor_id) as new_donors
+        FROM donations WHERE ngo_id = n.ngo_id AND donated_at > to_timestamp(%(prev_login)s)
+    ) since
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) as latest_count, COALESCE(SUM(amount_utilized), 0) as latest_utilized
+        FROM utilizations
+        WHERE ngo_id = n.ngo_id
+          AND utilized_at = (SELECT MAX(utilized_at) FROM utilizations WHERE ngo_id = n.ngo_id)
+    ) latest
+"""
 
-    cur.execute(
-        "SELECT COALESCE(SUM(amount_utilized),0) as utilized_funds FROM utilizations WHERE ngo_id = %s",
-        (ngo_id,)
-    )
-    utilized_funds = cur.fetchone()["utilized_funds"]
 
-    cur.execute(
-        "SELECT COUNT(DISTINCT donor_id) as active_donors FROM donations WHERE ngo_id = %s",
-        (ngo_id,)
-    )
-    active_donors = cur.fetchone()["active_donors"]
+def _format_notification(notif):
+    notification_type = (notif.get("type") or "").lower()
+    message = notif.get("message", "")
 
-    cur.execute(
-        "SELECT COUNT(*) as active_projects FROM projects WHERE ngo_id = %s AND status = 'ACTIVE'",
-        (ngo_id,)
-    )
-    active_projects = cur.fetchone()["active_projects"]
+    # Create formatted message based on notification type
+    if notification_type == "donation":
+        formatted_message = f"🎁 {message}"
+    elif notification_type == "project_creation":
+        formatted_message = f"📋 {message}"
+    elif notification_type == "fund_utilization":
+        formatted_message = f"💰 {message}"
+    else:
+        formatted_message = f"📢 {message}"
 
-    # Additional metrics since previous login
-    additional_donations = 0
-    new_donors = 0
-    utilization_change_percent = None
+    return {
+        "notification_id": notif.get("notification_id"),
+        "type": notification_type,
+        "message": formatted_message,
+        "created_at": notif.get("created_at"),
+        "is_read": notif.get("is_read")
+    }
 
-    if prev_login:
-        cur.execute(
-            "SELECT COUNT(*) as cnt FROM donations WHERE ngo_id = %s AND donated_at > to_timestamp(%s)",
-            (ngo_id, prev_login)
-        )
-        additional_donations = cur.fetchone()["cnt"] or 0
 
-        cur.execute(
-            "SELECT COUNT(DISTINCT donor_id) as cnt FROM donations WHERE ngo_id = %s AND donated_at > to_timestamp(%s)",
-            (ngo_id, prev_login)
-        )
-        new_donors = cur.fetchone()["cnt"] or 0
+def _build_dashboard(ngo_id, prev_login):
+    """Dashboard payload and HTTP status for one NGO."""
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    # utilization change: compare total utilized_funds now vs before the latest utilization entry
-    try:
-        cur.execute(
-            "SELECT utilized_at FROM utilizations WHERE ngo_id = %s ORDER BY utilized_at DESC LIMIT 1",
-            (ngo_id,)
-        )
-        latest_util = cur.fetchone()
-        if latest_util and latest_util.get("utilized_at"):
-            latest_ts = latest_util.get("utilized_at")
-            cur.execute(
-                "SELECT COALESCE(SUM(amount_utilized),0) as total_before FROM utilizations WHERE ngo_id = %s AND utilized_at < %s",
-                (ngo_id, latest_ts)
-            )
-            total_before = cur.fetchone()["total_before"] or 0
-            if total_before and float(total_before) > 0:
-                utilization_change_percent = round(((float(utilized_funds) - float(total_before)) / float(total_before)) * 100, 1)
-    except Exception as e:
-        # If created_at column does not exist or any error, rollback and skip utilization change calculation
-        conn.rollback()
-        print(f"Notice: skipping utilization change calc due to error: {e}")
+    # If ngo_id not provided (or couldn't be resolved via token), pick the first NGO
+    if ngo_id:
+        ngo_filter, params = "WHERE ngo_id = %(ngo_id)s", {"ngo_id": ngo_id}
+    else:
+        ngo_filter, params = "ORDER BY created_at LIMIT 1", {}
+    params["prev_login"] = prev_login
+    cur.execute(_DASHBOARD_QUERY.format(ngo_filter=ngo_filter), params)
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
 
-    # Recent donations
-    cur.execute(
-        "SELECT d.donation_id, dn.name as donor, d.amount, d.donated_at::text as date, d.purpose, pd.project_id "
-        "FROM donations d LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
-        "LEFT JOIN project_donations pd ON d.donation_id = pd.donation_id "
-        "WHERE d.ngo_id = %s ORDER BY d.donated_at DESC LIMIT 10",
-        (ngo_id,)
-    )
-    recent_donations = cur.fetchall()
+    if not row:
+        return {"error": "NGO not found" if ngo_id else "No NGOs found"}, 404
+    if not ngo_id:
+        ngo_id = row["ngo_id"]
 
-    # Notifications for the NGO user with formatted messages
-    user_id = ngo["user_id"]
-    cur.execute(
-        "SELECT notification_id, type, message, created_at::text as created_at, is_read FROM notifications WHERE user_id = %s ORDER BY created_at DESC LIMIT 5",
-        (user_id,)
-    )
-    raw_notifications = cur.fetchall()
-    
-    # Format notifications with sentence structures based on type
-    notifications = []
-    for notif in raw_notifications:
-        notification_type = notif.get("type", "").lower()
-        message = notif.get("message", "")
-        
-        # Create formatted message based on notification type
-        if notification_type == "donation":
-            formatted_message = f"🎁 {message}"
-        elif notification_type == "project_creation":
-            formatted_message = f"📋 {message}"
-        elif notification_type == "fund_utilization":
-            formatted_message = f"💰 {message}"
-        else:
-            formatted_message = f"📢 {message}"
-        
-        notifications.append({
-            "notification_id": notif.get("notification_id"),
-            "type": notification_type,
-            "message": formatted_message,
-            "created_at": notif.get("created_at"),
-            "is_read": notif.get("is_read")
-        })
+    # Additional metrics since previous login (zero when the token has none)
+    additional_donations = row["additional_donations"] if prev_login else 0
+    new_donors = row["new_donors"] if prev_login else 0
 
-    # Active projects and utilization percent
-    cur.execute(
-        "SELECT p.project_id, p.name, p.budget, COALESCE(SUM(u.amount_utilized),0) as amount_utilized, "
-        "COUNT(DISTINCT pd.donation_id) as donors_count "
-        "FROM projects p "
-        "LEFT JOIN project_donations pd ON p.project_id = pd.project_id "
-        "LEFT JOIN utilizations u ON pd.donation_id = u.donation_id "
-        "WHERE p.ngo_id = %s AND p.status = 'ACTIVE' "
-        "GROUP BY p.project_id, p.name, p.budget",
-        (ngo_id,)
-    )
-    projects = cur.fetchall()
+    # utilization change: compare total utilized_funds now vs before the latest utilization entry
+    utilized_funds = row["utilized_funds"]
+    utilization_change_percent = None
+    if row["latest_count"]:
+        total_before = float(utilized_funds) - float(row["latest_utilized"])
+        if total_before > 0:
+            utilization_change_percent = round(((float(utilized_funds) - total_before) / total_before) * 100, 1)
 
     # compute utilized percent safely
     active_projects_list = []
-    for p in projects:
+    for p in row["projects"]:
         budget = p.get("budget") or 0
         utilized = 0
         if budget and float(budget) > 0:
@@ -250,22 +250,19 @@ def get_ngo_dashboard():
             "donors": p.get("donors_count")
         })
 
-    cur.close()
-    conn.close()
-
-    return jsonify({
+    return {
         "ngo_id": ngo_id,
-        "ngo_name": ngo.get("name"),
+        "ngo_name": row["name"],
         "summary": {
-            "totalDonationsReceived": float(total_donations),
+            "totalDonationsReceived": float(row["total_donations"]),
             "utilizedFunds": float(utilized_funds),
-            "activeDonors": active_donors,
-            "activeProjects": active_projects,
+            "activeDonors": row["active_donors"],
+            "activeProjects": row["active_projects"],
             "additionalDonationsSinceLastLogin": int(additional_donations),
             "utilizationChangePercent": utilization_change_percent,
             "newDonorsSinceLastLogin": int(new_donors)
         },
-        "recentDonations": recent_donations,
-        "notifications": notifications,
+        "recentDonations": row["recent_donations"],
+        "notifications": [_format_notification(n) for n in row["notifications"]],
         "activeProjects": active_projects_list
-    })
+    }, 200
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import request
+
+
+def page_params(default_limit=None, max_limit=1000):
+    """Read ``limit``/``offset`` query args, clamped to sane bounds.
+
+    Without a ``limit`` arg the limit is ``default_limit``; None means every
+    row (``LIMIT NULL``), which is what callers that predate paging expect.
+    """
+    limit = default_limit
+    if request.args.get("limit"):
+        try:
+            limit = int(request.args["limit"])
+        except ValueError:
+            pass
+    try:
+        offset = int(request.args.get("offset", 0))
+    except (TypeError, ValueError):
+        offset = 0
+    if limit is not None:
+        limit = max(1, min(limit, max_limit))
+    return limit, max(0, offset)
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor for the last row of a page (datetimes as ISO strings)."""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values],
+                     separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor, size):
+    """Inverse of ``encode_cursor``; raises ValueError for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_params(default_limit=100, max_limit=1000):
+    """Read ``limit``/``cursor`` query args for a (timestamp, id) keyset.
+
+    The cursor comes back as ``(datetime or None, int)``, None for the first
+    page; a cursor of the wrong shape or types raises ValueError.  With
+    neither arg the limit is None: the whole list, as before paging.
+    """
+    cursor = request.args.get("cursor")
+    limit, _ = page_params(default_limit if cursor else None, max_limit)
+    if not cursor:
+        return limit, None
+    stamp, row_id = decode_cursor(cursor, 2)
+    if stamp is not None:
+        if not isinstance(stamp, str):
+            raise ValueError("Invalid cursor")
+        try:
+            stamp = datetime.fromisoformat(stamp)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Invalid cursor")
+    return limit, (stamp, row_id)
+
+
+def keyset_after(stamp_column, id_column, cursor):
+    """SQL condition and args for the rows after ``cursor`` in
+    ``ORDER BY stamp_column DESC NULLS FIRST, id_column DESC``.
+
+    The timestamp may be NULL: those rows sort first, so a cursor on a NULL
+    row continues through the remaining NULLs and then every dated row.  The
+    dated case stays a row comparison, which the (..., stamp, id) indexes serve.
+    """
+    stamp, row_id = cursor
+    if stamp is None:
+        return (f"(({stamp_column} IS NULL AND {id_column} < %s) OR {stamp_column} IS NOT NULL)",
+                [row_id])
+    return f"({stamp_column}, {id_column}) < (%s, %s)", [stamp, row_id]
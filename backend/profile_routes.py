@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, g
 from db import get_db
-from jwt_utils import decode_jwt
+from identity import invalidate_identity
+from ngo_directory import refresh_ngo_names
 from psycopg2.extras import RealDictCursor
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/api/profile")
@@ -8,16 +9,11 @@ profile_bp = Blueprint("profile", __name__, url_prefix="/api/profile")
 @profile_bp.route("/ngo", methods=["GET"])
 def get_ngo_profile():
     """Fetch NGO profile data"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
+    if g.token is None:
         return jsonify({"error": "Missing authorization token"}), 401
-    
-    token = auth_header.split(" ", 1)[1]
-    try:
-        payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-        user_id = payload.get("user_id")
-    except ValueError as ve:
-        return jsonify({"error": str(ve)}), 401
+    if g.auth_error:
+        return jsonify({"error": g.auth_error}), 401
+    user_id = g.user_id
     
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -150,6 +146,7 @@ def create_or_update_donor():
     conn.commit()
     cur.close()
     conn.close()
+    invalidate_identity(data["user_id"])
 
     return jsonify({"message": "Donor profile updated"})
 
@@ -189,5 +186,7 @@ def create_or_update_ngo():
     conn.commit()
     cur.close()
     conn.close()
+    invalidate_identity(data["user_id"])
+    refresh_ngo_names()
 
     return jsonify({"message": "NGO profile updated"})
@@ -0,0 +1,400 @@
+"""Per-request database instrumentation.
+
+Every connection the pool opens is an ``InstrumentedConnection``, so each
+cursor -- whatever its ``cursor_factory`` and whether it came from ``get_db()``
+or ``cur.connection`` -- times its statements.  Within a request the totals
+collect on ``flask.g``; ``init_app`` adds them to every response:
+
+    Server-Timing: db;dur=12.4;desc="7 statements, 342 rows", db-slowest;dur=6.1, app;dur=30.2
+
+and writes one JSON line per request to the ``trustbridge.requests`` logger
+(method, path, status, duration and the db_* figures).  Streamed responses
+(exports) run their statements after the headers are sent, so only the
+statements made before streaming starts are counted for them.  A named
+(server-side) cursor's fetches add their time and rows to the statement that
+declared the cursor rather than counting as statements.  Statements slower
+than DB_SLOW_QUERY_MS (default 500, 0 to disable) are logged to
+``trustbridge.db`` as they finish, with the SQL text only -- parameters are
+reduced to their count.
+
+    DB_SLOW_QUERY_MS    threshold for slow-statement log lines (500)
+    DB_REQUEST_LOG      set to 0 to turn off the per-request log lines
+
+N+1 detection.  In debug and testing apps every statement is also reduced to
+a fingerprint (literals and placeholders replaced, ``IN (...)`` lists
+collapsed); once the same fingerprint runs more than N_PLUS_ONE_THRESHOLD
+times in one request the app logs an ``n_plus_one`` warning (debug) or raises
+``NPlusOneError`` (testing):
+
+    N_PLUS_ONE              off | warn | raise  (default: raise when testing,
+                            warn in debug, otherwise off)
+    N_PLUS_ONE_THRESHOLD    repeats allowed per request (5)
+
+``statement_budget(n)`` asserts that a block -- typically one test-client
+request -- runs at most ``n`` statements.  tests/conftest.py provides it as the
+``statement_budget`` fixture:
+
+    def test_records(client, statement_budget):
+        with statement_budget(2):
+            client.get("/api/donations/records")
+
+tests/test_statement_budgets.py (and benchmarks/check_statement_budgets.py,
+outside pytest) apply it to the hot endpoints.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from psycopg2 import extensions
+
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 500))
+REQUEST_LOG = os.environ.get("DB_REQUEST_LOG", "1").lower() not in ("0", "false", "no")
+MAX_SQL_LENGTH = 500
+N_PLUS_ONE = os.environ.get("N_PLUS_ONE", "").lower() or None
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 5))
+
+request_logger = logging.getLogger("trustbridge.requests")
+statement_logger = logging.getLogger("trustbridge.db")
+
+
+class NPlusOneError(RuntimeError):
+    """The same statement shape ran more than N_PLUS_ONE_THRESHOLD times in one request."""
+
+
+class RequestQueryStats:
+    """Statement totals for one request (or one ``statement_budget`` block).
+
+    With ``track_shapes`` the statements are also counted per fingerprint.
+    """
+
+    __slots__ = ("statements", "db_time", "rows", "slowest_time", "slowest_sql",
+                 "shapes", "n_plus_one")
+
+    def __init__(self, track_shapes=False, n_plus_one="off"):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.shapes = {} if track_shapes or n_plus_one != "off" else None
+        self.n_plus_one = n_plus_one
+
+    def record(self, sql, elapsed, rows):
+        """Add one statement; returns how often its shape has run (0 when untracked)."""
+        self.statements += 1
+        self.db_time += elapsed
+        self.rows += rows
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = sql
+        if self.shapes is None:
+            return 0
+        shape = fingerprint(sql)
+        count = self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        return count
+
+    def record_fetch(self, sql, elapsed, rows, statement_time):
+        """Add a named cursor's fetch to the statement that declared it.
+
+        ``statement_time`` is that statement's time so far, fetches included.
+        """
+        self.db_time += elapsed
+        self.rows += rows
+        if statement_time > self.slowest_time:
+            self.slowest_time = statement_time
+            self.slowest_sql = sql
+
+    def repeated(self, minimum=2):
+        """[(fingerprint, count)] for shapes run at least ``minimum`` times, most first."""
+        return sorted(((shape, count) for shape, count in (self.shapes or {}).items()
+                       if count >= minimum), key=lambda item: -item[1])
+
+    def as_dict(self):
+        return {
+            "db_statements": self.statements,
+            "db_time_ms": round(self.db_time * 1000, 3),
+            "db_rows": self.rows,
+            "db_slowest_ms": round(self.slowest_time * 1000, 3),
+            "db_slowest": _sql_text(self.slowest_sql) if self.slowest_sql is not None else None,
+        }
+
+
+def current_query_stats():
+    """Totals for the current request (None outside a request)."""
+    if not has_app_context():
+        return None
+    stats = g.get("_query_stats")
+    if stats is None:
+        stats = g._query_stats = RequestQueryStats()
+    return stats
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\([^)]*\)s|%s")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+@lru_cache(maxsize=2048)
+def _fingerprint_text(text):
+    text = _STRING.sub("?", " ".join(text.split()).lower())
+    text = _NUMBER.sub("?", _PLACEHOLDER.sub("?", text))
+    return _IN_LIST.sub("in (?)", text)
+
+
+def fingerprint(sql):
+    """Statement shape: whitespace, literals, placeholders and IN lists normalized."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    return _fingerprint_text(str(sql))
+
+
+def _sql_text(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    text = " ".join(str(sql).split())
+    return text if len(text) <= MAX_SQL_LENGTH else text[:MAX_SQL_LENGTH] + "..."
+
+
+def _param_count(params):
+    if params is None:
+        return 0
+    try:
+        return len(params)
+    except TypeError:
+        return 1
+
+
+_local = threading.local()
+
+
+def _observe(cur, sql, params, started, rows, guard=False):
+    elapsed = time.perf_counter() - started
+    if not isinstance(sql, (str, bytes)):
+        # psycopg2.sql.Composed and friends
+        sql = sql.as_string(cur.connection)
+    for watcher in getattr(_local, "watchers", ()):
+        watcher.record(sql, elapsed, rows)
+    stats = current_query_stats()
+    if stats is not None:
+        repeats = stats.record(sql, elapsed, rows)
+        if guard and repeats == N_PLUS_ONE_THRESHOLD + 1:
+            _n_plus_one(stats, sql, repeats)
+    if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        statement_logger.warning(json.dumps({
+            "event": "slow_statement",
+            "duration_ms": round(elapsed * 1000, 3),
+            "rows": rows,
+            "sql": _sql_text(sql),
+            "params": f"<{_param_count(params)} redacted>",
+            "path": request.path if has_request_context() else None,
+        }))
+
+
+def _observe_fetch(cur, started, rows):
+    elapsed = time.perf_counter() - started
+    cur._stat_time += elapsed
+    sql = cur._stat_query
+    if not isinstance(sql, (str, bytes)):
+        sql = sql.as_string(cur.connection)
+    for watcher in getattr(_local, "watchers", ()):
+        watcher.record_fetch(sql, elapsed, rows, cur._stat_time)
+    stats = current_query_stats()
+    if stats is not None:
+        stats.record_fetch(sql, elapsed, rows, cur._stat_time)
+
+
+def _n_plus_one(stats, sql, repeats):
+    message = {
+        "event": "n_plus_one",
+        "count": repeats,
+        "threshold": N_PLUS_ONE_THRESHOLD,
+        "fingerprint": _sql_text(fingerprint(sql)),
+        "path": request.path if has_request_context() else None,
+    }
+    if stats.n_plus_one == "raise":
+        raise NPlusOneError(json.dumps(message))
+    statement_logger.warning(json.dumps(message))
+
+
+@contextmanager
+def statement_budget(max_statements, label="block"):
+    """Fail with AssertionError when the block runs more than ``max_statements``.
+
+    Yields the block's RequestQueryStats.  Counts statements of the calling
+    thread, which is where Flask's test client runs the request.
+    """
+    stats = RequestQueryStats(track_shapes=True)
+    watchers = _local.__dict__.setdefault("watchers", [])
+    watchers.append(stats)
+    try:
+        yield stats
+    finally:
+        watchers.remove(stats)
+    if stats.statements > max_statements:
+        shapes = "\n".join(f"  {count}x {_sql_text(shape)}" for shape, count in stats.repeated(1))
+        raise AssertionError(
+            f"{label} ran {stats.statements} statements (budget {max_statements}):\n{shapes}"
+        )
+
+
+@contextmanager
+def captured_statements():
+    """Collect the statements the calling thread executes, parameters bound.
+
+    Yields a list of SQL strings, as sent to the server, e.g. for EXPLAIN.
+    """
+    statements = []
+    captures = _local.__dict__.setdefault("captures", [])
+    captures.append(statements)
+    try:
+        yield statements
+    finally:
+        captures.remove(statements)
+
+
+def _result_rows(cur):
+    # client-side cursors hold the whole result after execute; named cursors
+    # count rows as they are fetched
+    if cur.name is None and cur.rowcount > 0:
+        return cur.rowcount
+    return 0
+
+
+_timed_classes = {}
+
+
+def _timed_cursor(base):
+    """Subclass of the cursor class ``base`` that reports every statement."""
+    cls = _timed_classes.get(base)
+    if cls is not None:
+        return cls
+
+    class TimedCursor(base):
+        def execute(self, query, vars=None):
+            # the unbound template: for named cursors ``self.query`` is the
+            # DECLARE with the parameters already interpolated
+            self._stat_query = query
+            for statements in getattr(_local, "captures", ()):
+                statements.append(self.mogrify(query, vars).decode("utf-8", "replace"))
+            started = time.perf_counter()
+            try:
+                result = super().execute(query, vars)
+            except BaseException:
+                _observe(self, query, vars, started, _result_rows(self))
+                raise
+            self._stat_time = time.perf_counter() - started
+            _observe(self, query, vars, started, _result_rows(self), guard=True)
+            return result
+
+        def executemany(self, query, vars_list):
+            started = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                _observe(self, query, None, started, _result_rows(self))
+
+        def copy_expert(self, sql, file, size=8192):
+            started = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                _observe(self, sql, None, started, max(self.rowcount, 0))
+
+        def _timed_fetch(self, fetch, *args):
+            # a named cursor's fetches belong to the statement that declared it:
+            # they add time and rows to it but are not statements of their own
+            started = time.perf_counter()
+            rows = fetch(*args)
+            count = (0 if rows is None else 1) if fetch.__name__ == "fetchone" else len(rows)
+            _observe_fetch(self, started, count)
+            return rows
+
+        def fetchone(self):
+            if self.name is None:
+                return super().fetchone()
+            return self._timed_fetch(super().fetchone)
+
+        def fetchmany(self, size=None):
+            if self.name is None:
+                return super().fetchmany(size) if size is not None else super().fetchmany()
+            return self._timed_fetch(super().fetchmany, *(() if size is None else (size,)))
+
+        def fetchall(self):
+            if self.name is None:
+                return super().fetchall()
+            return self._timed_fetch(super().fetchall)
+
+    TimedCursor.__name__ = f"Timed{base.__name__}"
+    _timed_classes[base] = TimedCursor
+    return TimedCursor
+
+
+class InstrumentedConnection(extensions.connection):
+    """psycopg2 connection whose cursors report to the request's statistics."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def _n_plus_one_mode():
+    if N_PLUS_ONE:
+        return N_PLUS_ONE
+    if current_app.testing:
+        return "raise"
+    return "warn" if current_app.debug else "off"
+
+
+def _start_request():
+    g._request_started = time.perf_counter()
+    g._query_stats = RequestQueryStats(n_plus_one=_n_plus_one_mode())
+
+
+def _finish_request(response):
+    started = g.get("_request_started")
+    stats = g.get("_query_stats")
+    if started is None or stats is None:
+        return response
+    total_ms = (time.perf_counter() - started) * 1000
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} statements, {stats.rows} rows", '
+        f"db-slowest;dur={stats.slowest_time * 1000:.1f}, app;dur={total_ms:.1f}"
+    )
+    if REQUEST_LOG:
+        request_logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 3),
+            **stats.as_dict(),
+        }))
+    return response
+
+
+def _ensure_handler(logger, level):
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def init_app(app):
+    """Register the timing hooks; call before any other before_request hook."""
+    _ensure_handler(request_logger, logging.INFO)
+    _ensure_handler(statement_logger, logging.WARNING)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
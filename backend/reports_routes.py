@@ -1,7 +1,7 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify
 from db import get_db
 from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
@@ -12,121 +12,108 @@ def get_overall_reports():
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    # Get last 6 months of data
-    today = datetime.now()
-    six_months_ago = today - timedelta(days=180)
+    # Last 6 calendar months, current month included
+    window_start = (date.today().replace(day=1) - timedelta(days=150)).replace(day=1)
 
-    # Monthly trends for donations vs utilization (last 6 months)
+    # Donation rollup: per month and per purpose inside the window, the window
+    # total, and the all-time totals, all from the monthly rollup table.
+    # Utilization follows the donations: each month shows what has been
+    # utilized out of that month's donations
     cur.execute("""
-        WITH monthly_data AS (
-            SELECT 
-                DATE_TRUNC('month', d.donated_at)::date as month,
-                COALESCE(SUM(d.amount), 0) as donations,
-                COALESCE(SUM(u.amount_utilized), 0) as utilization
-            FROM donations d
-            LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-            WHERE d.donated_at >= %s
-            GROUP BY DATE_TRUNC('month', d.donated_at)
-            ORDER BY month DESC
-            LIMIT 6
-        )
-        SELECT * FROM monthly_data ORDER BY month ASC
-    """, (six_months_ago,))
-    monthly_trends = cur.fetchall()
+        SELECT
+            GROUPING(month) as g_month,
+            GROUPING(purpose) as g_purpose,
+            month,
+            purpose,
+            COALESCE(SUM(total_amount), 0) as donations,
+            COALESCE(SUM(total_utilized), 0) as utilization,
+            COUNT(DISTINCT donor_id) as donors,
+            COALESCE(SUM(donation_count), 0)::bigint as donation_count,
+            COALESCE(SUM(utilization_count), 0)::bigint as utilization_count,
+            (SELECT COALESCE(SUM(total_amount), 0) FROM donation_monthly_rollup) as all_time_donations,
+            (SELECT COALESCE(SUM(total_utilized), 0) FROM donation_monthly_rollup) as all_time_utilized
+        FROM donation_monthly_rollup
+        WHERE month >= %s
+        GROUP BY GROUPING SETS ((month), (purpose), ())
+    """, (window_start,))
+    rollup = cur.fetchall()
+
+    months = []
+    categories = []
+    yearly_stats = {}
+    all_time_stats = {}
+    for row in rollup:
+        all_time_stats = row
+        if not row["g_month"]:
+            months.append(row)
+        elif not row["g_purpose"]:
+            categories.append(row)
+        else:
+            yearly_stats = row
+
+    # Monthly trends for donations vs utilization (last 6 months)
+    months.sort(key=lambda m: m["month"])
+    monthly_trends = months[-6:]
 
     # Category distribution (by purpose)
-    cur.execute("""
-        SELECT 
-            d.purpose as category,
-            COUNT(*) as count,
-            SUM(d.amount) as total_amount,
-            ROUND(100.0 * SUM(d.amount) / 
-                (SELECT SUM(amount) FROM donations WHERE donated_at >= %s), 2) as percentage
-        FROM donations d
-        WHERE d.donated_at >= %s
-        GROUP BY d.purpose
-        ORDER BY total_amount DESC
-        LIMIT 10
-    """, (six_months_ago, six_months_ago))
-    category_dist = cur.fetchall()
-
-    # Yearly summary stats
-    cur.execute("""
-        SELECT 
-            COALESCE(SUM(d.amount), 0) as total_donations,
-            COALESCE(SUM(u.amount_utilized), 0) as total_utilized,
-            COUNT(DISTINCT d.donor_id) as active_donors,
-            COUNT(DISTINCT d.donation_id) as total_donations_count,
-            COUNT(DISTINCT u.utilization_id) as total_utilizations
-        FROM donations d
-        LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-        WHERE d.donated_at >= %s
-    """, (six_months_ago,))
-    yearly_stats = cur.fetchone()
+    window_total = float(yearly_stats.get("donations") or 0)
+    categories.sort(key=lambda c: c["donations"], reverse=True)
+    category_dist = [
+        {
+            "category": c["purpose"],
+            "count": c["donation_count"],
+            "total_amount": c["donations"],
+            "percentage": round(100.0 * float(c["donations"]) / window_total, 2) if window_total else 0
+        }
+        for c in categories[:10]
+    ]
 
     # Growth rate calculation
-    cur.execute("""
-        SELECT 
-            DATE_TRUNC('month', d.donated_at)::date as month,
-            COALESCE(SUM(d.amount), 0) as monthly_total
-        FROM donations d
-        WHERE d.donated_at >= %s
-        GROUP BY DATE_TRUNC('month', d.donated_at)
-        ORDER BY month DESC
-        LIMIT 2
-    """, (six_months_ago,))
-    growth_data = cur.fetchall()
-
     growth_rate = 0
-    if len(growth_data) >= 2:
-        prev_month = growth_data[1].get('monthly_total', 0) or 0
+    if len(months) >= 2:
+        prev_month = months[-2]["donations"] or 0
         if prev_month > 0:
-            curr_month = growth_data[0].get('monthly_total', 0) or 0
-            growth_rate = round(((curr_month - prev_month) / prev_month) * 100, 1)
+            curr_month = months[-1]["donations"] or 0
+            # Decimal arithmetic, sent as a string ("12.5") as it always was
+            growth_rate = str(round(((curr_month - prev_month) / prev_month) * 100, 1))
 
-    # Top projects by fund utilization
+    # Scan 2: utilizations in the window, grouped per project for the top list
+    # with the grand total row carrying the impact metrics
     cur.execute("""
-        SELECT 
-            COALESCE(p.name, u.purpose, 'General Project') as project_name,
+        SELECT
+            GROUPING(u.project_id, u.purpose) as g_total,
+            COALESCE(MAX(p.name), u.purpose, 'General Project') as project_name,
             COALESCE(SUM(u.amount_utilized), 0) as amount_utilized,
             COALESCE(SUM(u.beneficiaries), 0) as beneficiaries,
-            COUNT(DISTINCT u.utilization_id) as utilization_count
-        FROM utilizations u
-        LEFT JOIN projects p ON u.project_id = p.project_id
-        WHERE u.utilized_at >= %s
-        GROUP BY p.project_id, u.purpose
-        ORDER BY amount_utilized DESC
-        LIMIT 5
-    """, (six_months_ago,))
-    top_projects = cur.fetchall()
-
-    # Impact metrics
-    cur.execute("""
-        SELECT 
-            COALESCE(SUM(u.beneficiaries), 0) as total_beneficiaries,
+            COUNT(*) as utilization_count,
             COUNT(DISTINCT u.project_id) as active_projects,
-            COUNT(DISTINCT CASE WHEN u.amount_utilized > 0 THEN u.utilization_id END) as completed_projects,
-            COUNT(DISTINCT n.ngo_id) as active_ngos
+            COUNT(*) FILTER (WHERE u.amount_utilized > 0) as completed_projects,
+            COUNT(DISTINCT u.ngo_id) as active_ngos
         FROM utilizations u
         LEFT JOIN projects p ON u.project_id = p.project_id
-        LEFT JOIN ngos n ON u.ngo_id = n.ngo_id
         WHERE u.utilized_at >= %s
-    """, (six_months_ago,))
-    impact = cur.fetchone()
-
-    # All-time stats for comparison
-    cur.execute("""
-        SELECT 
-            COALESCE(SUM(d.amount), 0) as total_donations_all_time,
-            COALESCE(SUM(u.amount_utilized), 0) as total_utilized_all_time
-        FROM donations d
-        LEFT JOIN utilizations u ON d.donation_id = u.donation_id
-    """)
-    all_time_stats = cur.fetchone()
+        GROUP BY GROUPING SETS ((u.project_id, u.purpose), ())
+    """, (window_start,))
+    utilization_rollup = cur.fetchall()
 
     cur.close()
     conn.close()
 
+    impact = {}
+    top_projects = []
+    for row in utilization_rollup:
+        if row["g_total"]:
+            impact = {
+                "total_beneficiaries": row["beneficiaries"],
+                "active_projects": row["active_projects"],
+                "completed_projects": row["completed_projects"],
+                "active_ngos": row["active_ngos"]
+            }
+        else:
+            top_projects.append(row)
+    top_projects.sort(key=lambda p: p["amount_utilized"], reverse=True)
+    top_projects = top_projects[:5]
+
     # Format response
     monthly_list = [
         {
@@ -161,11 +148,11 @@ def get_overall_reports():
         "monthly_trends": monthly_list,
         "category_distribution": category_list,
         "yearly_summary": {
-            "total_donations": float(yearly_stats.get("total_donations") or 0),
-            "total_utilized": float(yearly_stats.get("total_utilized") or 0),
-            "active_donors": yearly_stats.get("active_donors") or 0,
-            "total_donations_count": yearly_stats.get("total_donations_count") or 0,
-            "total_utilizations": yearly_stats.get("total_utilizations") or 0,
+            "total_donations": float(yearly_stats.get("donations") or 0),
+            "total_utilized": float(yearly_stats.get("utilization") or 0),
+            "active_donors": yearly_stats.get("donors") or 0,
+            "total_donations_count": yearly_stats.get("donation_count") or 0,
+            "total_utilizations": int(yearly_stats.get("utilization_count") or 0),
             "growth_rate": growth_rate
         },
         "top_projects": project_list,
@@ -176,7 +163,7 @@ def get_overall_reports():
             "active_ngos": impact.get("active_ngos") or 0
         },
         "all_time_stats": {
-            "total_donations": float(all_time_stats.get("total_donations_all_time") or 0),
-            "total_utilized": float(all_time_stats.get("total_utilized_all_time") or 0)
+            "total_donations": float(all_time_stats.get("all_time_donations") or 0),
+            "total_utilized": float(all_time_stats.get("all_time_utilized") or 0)
         }
     })
@@ -0,0 +1,105 @@
+"""Incremental maintenance of the monthly rollup tables (migrations/001_monthly_rollups.sql).
+
+The analytics blueprints read donation_monthly_rollup / utilization_monthly_rollup
+instead of re-aggregating raw rows.  Each donation rollup row also carries the
+utilization of its donations (migrations/008_rollup_donation_utilization.sql),
+for reports that follow utilization through the donation window.  Rows without a date are kept under a NULL
+month (migrations/007_rollup_undated_rows.sql), so unwindowed totals include
+them and month filters skip them, as they would on the raw tables.  Writers call ``record_donations`` /
+``record_utilizations`` with the ids they just inserted, on the same cursor and
+before committing, so a rollup never disagrees with the rows it summarizes.
+
+Rows written behind the API's back (manual SQL, restores) can be folded in with
+
+    python rollups.py --rebuild
+"""
+import argparse
+
+_DONATION_UPSERT = """
+    INSERT INTO donation_monthly_rollup AS r
+        (month, ngo_id, donor_id, purpose, total_amount, donation_count)
+    SELECT DATE_TRUNC('month', donated_at)::date, ngo_id, donor_id, purpose,
+           COALESCE(SUM(amount), 0), COUNT(*)
+    FROM donations
+    WHERE donation_id = ANY(%s)
+    GROUP BY 1, ngo_id, donor_id, purpose
+    ON CONFLICT (COALESCE(month, '-infinity'::date), COALESCE(ngo_id, 0), COALESCE(donor_id, 0), COALESCE(purpose, ''))
+    DO UPDATE SET total_amount = r.total_amount + EXCLUDED.total_amount,
+                  donation_count = r.donation_count + EXCLUDED.donation_count
+"""
+
+_UTILIZATION_UPSERT = """
+    INSERT INTO utilization_monthly_rollup AS r
+        (month, ngo_id, donor_id, purpose, total_utilized, utilization_count, beneficiaries)
+    SELECT DATE_TRUNC('month', u.utilized_at)::date, u.ngo_id, d.donor_id, d.purpose,
+           COALESCE(SUM(u.amount_utilized), 0), COUNT(*), COALESCE(SUM(u.beneficiaries), 0)
+    FROM utilizations u
+    LEFT JOIN donations d ON d.donation_id = u.donation_id
+    WHERE u.utilization_id = ANY(%s)
+    GROUP BY 1, u.ngo_id, d.donor_id, d.purpose
+    ON CONFLICT (COALESCE(month, '-infinity'::date), COALESCE(ngo_id, 0), COALESCE(donor_id, 0), COALESCE(purpose, ''))
+    DO UPDATE SET total_utilized = r.total_utilized + EXCLUDED.total_utilized,
+                  utilization_count = r.utilization_count + EXCLUDED.utilization_count,
+                  beneficiaries = r.beneficiaries + EXCLUDED.beneficiaries
+"""
+
+# utilization credited to the donation rollup row of the utilized donation
+_DONATION_UTILIZED = """
+    UPDATE donation_monthly_rollup AS r
+    SET total_utilized = r.total_utilized + s.utilized,
+        utilization_count = r.utilization_count + s.utilizations
+    FROM (
+        SELECT DATE_TRUNC('month', d.donated_at)::date AS month, d.ngo_id, d.donor_id, d.purpose,
+               COALESCE(SUM(u.amount_utilized), 0) AS utilized, COUNT(*) AS utilizations
+        FROM utilizations u
+        JOIN donations d ON d.donation_id = u.donation_id
+        WHERE u.utilization_id = ANY(%s)
+        GROUP BY 1, d.ngo_id, d.donor_id, d.purpose
+    ) s
+    WHERE COALESCE(r.month, '-infinity'::date) = COALESCE(s.month, '-infinity'::date)
+      AND COALESCE(r.ngo_id, 0) = COALESCE(s.ngo_id, 0)
+      AND COALESCE(r.donor_id, 0) = COALESCE(s.donor_id, 0)
+      AND COALESCE(r.purpose, '') = COALESCE(s.purpose, '')
+"""
+
+
+def record_donations(cur, donation_ids):
+    """Add freshly inserted donations to the rollup (caller commits)."""
+    if donation_ids:
+        cur.execute(_DONATION_UPSERT, (list(donation_ids),))
+
+
+def record_utilizations(cur, utilization_ids):
+    """Add freshly inserted utilizations to the rollups (caller commits).
+
+    Their donations must already be recorded.
+    """
+    if utilization_ids:
+        cur.execute(_UTILIZATION_UPSERT, (list(utilization_ids),))
+        cur.execute(_DONATION_UTILIZED, (list(utilization_ids),))
+
+
+def rebuild(conn):
+    """Recompute both rollups from the raw tables in one transaction."""
+    cur = conn.cursor()
+    cur.execute("LOCK TABLE donation_monthly_rollup, utilization_monthly_rollup IN EXCLUSIVE MODE")
+    cur.execute("DELETE FROM donation_monthly_rollup")
+    cur.execute("DELETE FROM utilization_monthly_rollup")
+    cur.execute(_DONATION_UPSERT.replace("WHERE donation_id = ANY(%s)", ""))
+    cur.execute(_UTILIZATION_UPSERT.replace("WHERE u.utilization_id = ANY(%s)", ""))
+    cur.execute(_DONATION_UTILIZED.replace("WHERE u.utilization_id = ANY(%s)", ""))
+    conn.commit()
+    cur.close()
+
+
+if __name__ == "__main__":
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description="Maintain the monthly rollup tables")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from raw rows")
+    if parser.parse_args().rebuild:
+        with db_connection() as conn:
+            rebuild(conn)
+        print("rollups rebuilt")
+    else:
+        parser.print_help()
@@ -0,0 +1,65 @@
+"""Shared fixtures for the backend tests.
+
+    cd backend && python -m pytest tests
+
+The pure tests need nothing but the requirements.  Tests that take the ``db``
+fixture run against the DATABASE_URL / DB_* settings from db.py and are
+skipped when that database cannot be reached (or, for ``seeded_principals``,
+holds no donations yet -- load it with generate_dataset.py).
+"""
+import os
+import sys
+
+import psycopg2
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+import query_stats  # noqa: E402
+
+
+@pytest.fixture
+def statement_budget():
+    """``with statement_budget(2): client.get(...)`` fails when the block runs
+    more than two statements (query_stats.statement_budget)."""
+    return query_stats.statement_budget
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    from app import app
+
+    app.testing = True
+    return app
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+@pytest.fixture(scope="session")
+def db():
+    """A pooled connection to the test database; skips the test when it is unreachable."""
+    from db import get_db
+
+    try:
+        conn = get_db()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database unavailable: {str(e).strip()}")
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def seeded_principals(db, flask_app):
+    """(auth headers by principal, donor_id) for an NGO and one of its donors."""
+    import check_statement_budgets
+
+    try:
+        return check_statement_budgets._principals()
+    except SystemExit as e:
+        pytest.skip(str(e))
@@ -0,0 +1,41 @@
+"""The cached admin dashboard: computed in the request when there is no value,
+refreshed on a background thread when stale (needs a seeded database)."""
+import re
+import time
+
+import pytest
+
+import admin_routes
+
+
+@pytest.fixture
+def dashboard_cache(seeded_principals):
+    cache = admin_routes._dashboard_cache
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_request_that_computes_reports_its_statements(client, statement_budget, dashboard_cache):
+    with statement_budget(4) as stats:
+        response = client.get("/api/admin/dashboard")
+    assert response.status_code == 200
+    assert stats.statements > 0
+    timing = re.search(r'desc="(\d+) statements', response.headers["Server-Timing"])
+    assert timing and int(timing.group(1)) == stats.statements
+
+
+def test_stale_dashboard_refreshes_in_the_background(client, dashboard_cache, monkeypatch):
+    assert client.get("/api/admin/dashboard").status_code == 200
+    monkeypatch.setattr(dashboard_cache, "min_interval", 0)
+    dashboard_cache.invalidate()
+    before = dashboard_cache.stats()
+
+    assert client.get("/api/admin/dashboard").status_code == 200
+    deadline = time.monotonic() + 5
+    while dashboard_cache.stats()["refreshing"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    after = dashboard_cache.stats()
+    assert after["stale_hits"] == before["stale_hits"] + 1
+    assert after["refreshes"] == before["refreshes"] + 1
+    assert after["refresh_errors"] == before["refresh_errors"]
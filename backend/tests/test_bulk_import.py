@@ -0,0 +1,61 @@
+import io
+import time
+from decimal import Decimal
+
+import pytest
+
+from bulk_import import allocate_in_order, import_donations, import_utilizations
+
+
+def test_allocation_skips_rows_that_do_not_fit():
+    # balance 100: 80 fits, 50 does not and must not use up the balance, 20 still fits
+    rows = [(1, 7, Decimal("80"), Decimal("100")),
+            (2, 7, Decimal("50"), Decimal("100")),
+            (3, 7, Decimal("20"), Decimal("100"))]
+    assert allocate_in_order(rows) == [2]
+
+
+def test_allocation_is_per_donation():
+    rows = [(1, 1, 60, 100), (2, 2, 60, 50), (3, 1, 40, 100), (4, 2, 50, 50), (5, 1, 1, 100)]
+    assert allocate_in_order(rows) == [2, 5]
+
+
+def test_allocation_accepts_exact_balance():
+    assert allocate_in_order([(1, 1, 30, 100), (2, 1, 70, 100)]) == []
+
+
+@pytest.fixture
+def donation_of_100(db):
+    cur = db.cursor()
+    cur.execute("INSERT INTO users (email, password_hash, role) VALUES (%s, 'x', 'NGO') RETURNING user_id",
+                (f"test-bulk-{time.time_ns()}@example.org",))
+    user_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO ngos (user_id, name) VALUES (%s, 'Bulk Test NGO') RETURNING ngo_id", (user_id,))
+    ngo_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO donations (ngo_id, amount, purpose) VALUES (%s, 100, 'General') "
+                "RETURNING donation_id", (ngo_id,))
+    donation_id = cur.fetchone()[0]
+    db.commit()
+    try:
+        yield ngo_id, donation_id
+    finally:
+        db.rollback()
+        cur.execute("DELETE FROM donations WHERE donation_id = %s", (donation_id,))
+        cur.execute("DELETE FROM ngos WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        db.commit()
+        cur.close()
+
+
+def test_partial_import_does_not_count_rejected_rows(db, donation_of_100):
+    ngo_id, donation_id = donation_of_100
+    csv = "donation_id,amount_utilized\n" + "".join(f"{donation_id},{amount}\n" for amount in (80, 50, 20))
+    report = import_utilizations(db, io.StringIO(csv), ngo_id=ngo_id, partial=True, dry_run=True)
+    assert report["errors"] == [{"row": 2, "error": "Exceeds the donation's remaining balance"}]
+
+
+def test_ngo_name_matches_case_and_whitespace_insensitively(db, donation_of_100):
+    ngo_id, _ = donation_of_100
+    csv = "ngo_name,amount\n  bulk   TEST ngo ,10\nBulk Test NGOs,10\n"
+    report = import_donations(db, io.StringIO(csv), ngo_id=ngo_id, dry_run=True)
+    assert report["errors"] == [{"row": 2, "error": "Unknown NGO"}]
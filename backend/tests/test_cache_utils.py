@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+import cache_utils
+from cache_utils import SingleFlight, StaleWhileRevalidate, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_utils.time, "monotonic", clock)
+    return clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a", "gone") == "gone"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_per_entry_ttl(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("short", 1, ttl=1)
+    cache.set("never", 2, ttl=0)
+    clock.now += 2
+    assert cache.get("short") is None
+    assert cache.get("never") is None
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_invalidate_and_clear(clock):
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None and len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stale_while_revalidate_serves_fresh_value(clock):
+    swr = StaleWhileRevalidate(ttl=30, stale_ttl=300)
+    calls = []
+    assert swr.get(lambda: calls.append(1) or len(calls)) == 1
+    clock.now += 29
+    assert swr.get(lambda: calls.append(1) or len(calls)) == 1
+    assert calls == [1]
+
+
+def test_stale_while_revalidate_refreshes_in_background(clock, monkeypatch):
+    started = []
+    monkeypatch.setattr(cache_utils.threading, "Thread",
+                        lambda target, args, daemon: started.append((target, args)) or _NoThread())
+    swr = StaleWhileRevalidate(ttl=30, stale_ttl=300)
+    swr.get(lambda: "old")
+    clock.now += 31
+    assert swr.get(lambda: "new") == "old"
+    assert swr.get(lambda: "new") == "old"
+    assert len(started) == 1          # one refresh for any number of stale reads
+    target, args = started[0]
+    target(*args)
+    assert swr.get(lambda: "newer") == "new"
+
+
+def test_stale_while_revalidate_invalidate_respects_min_interval(clock, monkeypatch):
+    monkeypatch.setattr(cache_utils.threading, "Thread", lambda target, args, daemon: _NoThread())
+    swr = StaleWhileRevalidate(ttl=30, stale_ttl=300, min_interval=5)
+    swr.get(lambda: 1)
+    swr.invalidate()
+    clock.now += 4
+    assert swr.stats()["stale_hits"] == 0
+    swr.get(lambda: 2)
+    assert swr.stats()["hits"] == 1
+    clock.now += 1
+    swr.get(lambda: 2)
+    assert swr.stats()["stale_hits"] == 1
+
+
+class _NoThread:
+    def start(self):
+        pass
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    entered = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return {"total": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("ngo:1", slow)))
+    leader.start()
+    entered.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("ngo:1", slow))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    while flight.stats()["coalesced"] < 4:
+        pass
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert calls == [1]
+    assert results == [{"total": 42}] * 5
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_shares_errors_and_forgets_the_call():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()["executed"] == 2
+    assert flight.stats()["errors"] == 1
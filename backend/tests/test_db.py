@@ -0,0 +1,43 @@
+"""PooledConnection forwards attribute writes and ``with`` blocks (needs a database)."""
+import pytest
+from psycopg2 import extensions
+
+from db import get_db
+
+
+@pytest.fixture
+def conn(db):
+    conn = get_db()
+    yield conn
+    conn.close()
+
+
+def test_attribute_writes_reach_the_connection(conn):
+    conn.autocommit = True
+    assert conn.raw.autocommit is True
+    conn.autocommit = False
+    assert conn.raw.autocommit is False
+
+
+def test_with_block_commits(conn):
+    with conn as entered:
+        assert entered is conn
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    assert not conn.closed
+
+
+def test_with_block_rolls_back_on_error(conn):
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE pooled_with_test (n int)")
+    conn.commit()
+    with pytest.raises(RuntimeError):
+        with conn:
+            cur.execute("INSERT INTO pooled_with_test VALUES (1)")
+            raise RuntimeError
+    cur.execute("SELECT COUNT(*) FROM pooled_with_test")
+    assert cur.fetchone()[0] == 0
+    cur.execute("DROP TABLE pooled_with_test")
+    conn.commit()
@@ -0,0 +1,41 @@
+"""The /api/donations/records summary is cached only without filters (needs a seeded database)."""
+import pytest
+
+import donation_routes
+
+
+@pytest.fixture
+def records(client, seeded_principals):
+    headers, _ = seeded_principals
+    donation_routes.invalidate_donation_summary()
+
+    def get(path, principal="ngo"):
+        response = client.get(path, headers=headers[principal])
+        assert response.status_code == 200
+        return response.get_json()
+
+    yield get
+    donation_routes.invalidate_donation_summary()
+
+
+@pytest.mark.parametrize("principal", ["ngo", None])
+def test_unfiltered_summary_is_cached(records, statement_budget, principal):
+    first = records("/api/donations/records?limit=5", principal)
+    with statement_budget(1):
+        again = records("/api/donations/records?limit=5", principal)
+    assert again["summary"] == first["summary"]
+
+
+def test_filtered_summary_is_aggregated_live(records, statement_budget):
+    records("/api/donations/records?limit=5")
+    with statement_budget(2) as stats:
+        records("/api/donations/records?limit=5&purpose=Education")
+    assert stats.statements == 2
+
+
+def test_invalidation_drops_cached_summary(records, statement_budget):
+    records("/api/donations/records?limit=5")
+    donation_routes.invalidate_donation_summary()
+    with statement_budget(2) as stats:
+        records("/api/donations/records?limit=5")
+    assert stats.statements == 2
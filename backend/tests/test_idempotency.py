@@ -0,0 +1,46 @@
+import pytest
+from flask import Flask
+
+import idempotency
+from idempotency import IdempotentRequest, request_hash
+
+
+@pytest.fixture
+def keyed_request(monkeypatch):
+    """Keyed requests in a request context, with an empty hot cache."""
+    monkeypatch.setattr(idempotency, "_responses", idempotency.TTLCache())
+    app = Flask(__name__)
+    with app.test_request_context("/", method="POST", headers={idempotency.HEADER: "k1"}):
+        yield lambda payload: IdempotentRequest.from_request("donation:1", payload)
+
+
+def _stored(payload, status, response):
+    idempotency._responses.set(("donation:1", "k1"), (request_hash(payload), status, response))
+
+
+def test_replayed_response_is_marked(keyed_request):
+    _stored({"amount": 10}, 201, {"success": True})
+    retry = keyed_request({"amount": 10})
+    assert retry.replay()
+    resp = retry.respond()
+    assert resp.status_code == 201
+    assert resp.get_json() == {"success": True}
+    assert resp.headers["Idempotent-Replayed"] == "true"
+
+
+def test_reused_key_is_not_marked_as_replayed(keyed_request):
+    _stored({"amount": 10}, 201, {"success": True})
+    other = keyed_request({"amount": 99})
+    assert other.replay()
+    resp = other.respond()
+    assert resp.status_code == 422
+    assert "Idempotent-Replayed" not in resp.headers
+
+
+def test_in_progress_key_is_not_marked_as_replayed(keyed_request):
+    _stored({"amount": 10}, None, None)
+    pending = keyed_request({"amount": 10})
+    assert pending.replay()
+    resp = pending.respond()
+    assert resp.status_code == 409
+    assert "Idempotent-Replayed" not in resp.headers
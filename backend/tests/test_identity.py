@@ -0,0 +1,23 @@
+"""Authorization header parsing: a bare token without "Bearer " is accepted only
+by the analytics reports (needs a seeded database)."""
+import pytest
+
+
+def _raw(headers):
+    return {"Authorization": headers["Authorization"].split(" ", 1)[1]}
+
+
+def test_raw_token_is_not_a_bearer_token_elsewhere(client, seeded_principals):
+    headers, _ = seeded_principals
+    response = client.get("/api/utilization/projects", headers=_raw(headers["ngo"]))
+    assert response.status_code == 404
+    assert client.get("/api/utilization/projects", headers=headers["ngo"]).status_code == 200
+
+
+@pytest.mark.parametrize("principal, path", [
+    ("ngo", "/api/ngo-analytics/reports"),
+    ("donor", "/api/donor-analytics/reports"),
+])
+def test_analytics_accept_a_raw_token(client, seeded_principals, principal, path):
+    headers, _ = seeded_principals
+    assert client.get(path, headers=_raw(headers[principal])).status_code == 200
@@ -0,0 +1,81 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from pagination import decode_cursor, encode_cursor, keyset_after, keyset_params
+
+
+def _raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).rstrip(b"=").decode()
+
+
+@pytest.fixture
+def query_args():
+    app = Flask(__name__)
+
+    def params(**args):
+        with app.test_request_context("/", query_string=args):
+            return keyset_params()
+
+    return params
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2026, 3, 31, 18, 30, 5, 123456)
+    cursor = encode_cursor(stamp, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == [stamp.isoformat(), 42]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "", _raw_cursor({"a": 1}), _raw_cursor([1, 2, 3])])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, 2)
+
+
+def test_keyset_params_without_args_is_the_whole_list(query_args):
+    assert query_args() == (None, None)
+
+
+def test_keyset_params_first_page(query_args):
+    assert query_args(limit="50") == (50, None)
+    assert query_args(limit="5000") == (1000, None)
+    assert query_args(limit="0") == (1, None)
+
+
+def test_keyset_params_cursor_without_limit_uses_default_page(query_args):
+    assert query_args(cursor=encode_cursor(None, 7)) == (100, (None, 7))
+
+
+def test_keyset_params_parses_cursor(query_args):
+    stamp = datetime(2026, 1, 2, 3, 4, 5)
+    assert query_args(limit="10", cursor=encode_cursor(stamp, 7)) == (10, (stamp, 7))
+    assert query_args(cursor=encode_cursor(None, 7)) == (100, (None, 7))
+
+
+@pytest.mark.parametrize("values", [
+    ["x", "y"],
+    ["2026-01-01T00:00:00", "7"],
+    ["not a date", 7],
+    [1767225600, 7],
+    ["2026-01-01T00:00:00", True],
+    ["2026-01-01T00:00:00", 7.5],
+])
+def test_keyset_params_rejects_wrong_types(query_args, values):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        query_args(cursor=_raw_cursor(values))
+
+
+def test_keyset_after_dated_cursor_is_a_row_comparison():
+    stamp = datetime(2026, 1, 1)
+    assert keyset_after("d.donated_at", "d.donation_id", (stamp, 9)) == \
+        ("(d.donated_at, d.donation_id) < (%s, %s)", [stamp, 9])
+
+
+def test_keyset_after_null_cursor_continues_into_dated_rows():
+    sql, args = keyset_after("u.utilized_at", "u.utilization_id", (None, 9))
+    assert sql == "((u.utilized_at IS NULL AND u.utilization_id < %s) OR u.utilized_at IS NOT NULL)"
+    assert args == [9]
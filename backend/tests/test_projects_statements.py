@@ -0,0 +1,63 @@
+"""GET /api/utilization/projects runs a constant number of statements (needs a database)."""
+import time
+
+import pytest
+
+from jwt_utils import encode_jwt
+
+
+@pytest.fixture
+def scratch_ngo(db, flask_app):
+    """An NGO of our own, removed again with its projects and utilizations."""
+    cur = db.cursor()
+    cur.execute("INSERT INTO users (email, password_hash, role) VALUES (%s, 'x', 'NGO') RETURNING user_id",
+                (f"test-projects-{time.time_ns()}@example.org",))
+    user_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO ngos (user_id, name) VALUES (%s, 'Projects Test NGO') RETURNING ngo_id", (user_id,))
+    ngo_id = cur.fetchone()[0]
+    db.commit()
+    token = encode_jwt({"user_id": user_id, "role": "ngo", "ngo_id": ngo_id, "exp": int(time.time()) + 600},
+                       flask_app.config["SECRET_KEY"])
+    try:
+        yield ngo_id, {"Authorization": "Bearer " + token}
+    finally:
+        cur.execute("DELETE FROM utilizations WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM projects WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM ngos WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        db.commit()
+        cur.close()
+
+
+def _add_projects(db, ngo_id, count):
+    cur = db.cursor()
+    cur.execute("""
+        WITH p AS (
+            INSERT INTO projects (ngo_id, name, budget, status, created_at)
+            SELECT %s, 'Project ' || i, 1000, 'ACTIVE', now() - i * interval '1 minute'
+            FROM generate_series(1, %s) i
+            RETURNING project_id
+        )
+        INSERT INTO utilizations (ngo_id, project_id, amount_utilized, utilized_at)
+        SELECT %s, project_id, 10, now() FROM p, generate_series(1, 3)
+    """, (ngo_id, count, ngo_id))
+    db.commit()
+    cur.close()
+
+
+def test_project_list_statements_do_not_grow_with_projects(client, db, scratch_ngo, statement_budget):
+    ngo_id, headers = scratch_ngo
+    client.get("/api/utilization/projects", headers=headers)  # warm the identity cache
+
+    counts = []
+    for added in (0, 1, 50):
+        _add_projects(db, ngo_id, added)
+        with statement_budget(1) as stats:
+            response = client.get("/api/utilization/projects", headers=headers)
+        assert response.status_code == 200
+        counts.append(stats.statements)
+
+    body = response.get_json()
+    assert body["pagination"]["total"] == 51
+    assert all(p["amount_utilized"] == 30 for p in body["projects"])
+    assert counts[0] == counts[1] == counts[2]
@@ -0,0 +1,18 @@
+"""EXPLAIN checks: the statements the hot endpoints run use their access-path indexes
+(needs a seeded database)."""
+import pytest
+
+from check_plans import HOT_PATHS, capture, check
+
+
+@pytest.fixture(scope="module")
+def plan_failures(db, seeded_principals):
+    failures = {}
+    for label, problem, plan in check(db, capture(*seeded_principals)):
+        failures.setdefault(label, []).append(f"{problem}:\n{plan}")
+    return failures
+
+
+@pytest.mark.parametrize("label", [p[0] for p in HOT_PATHS])
+def test_hot_query_uses_index(plan_failures, label):
+    assert label not in plan_failures, "\n\n".join(plan_failures[label])
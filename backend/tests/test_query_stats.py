@@ -0,0 +1,125 @@
+import json
+import time
+
+import pytest
+from flask import Flask, g
+
+import query_stats
+from query_stats import NPlusOneError, RequestQueryStats, fingerprint
+
+
+def _run(sql, guard=True):
+    """Report one finished statement the way the timed cursors do."""
+    query_stats._observe(None, sql, None, time.perf_counter(), 1, guard=guard)
+
+
+def test_fingerprint_normalizes_literals_and_whitespace():
+    assert fingerprint("SELECT *  FROM donations\n WHERE ngo_id = 12 AND purpose = 'Food'") == \
+        fingerprint("select * from donations where ngo_id = 7 and purpose = 'It''s'")
+
+
+def test_fingerprint_replaces_placeholders():
+    assert fingerprint("SELECT 1 FROM ngos WHERE ngo_id = %s") == \
+        fingerprint("SELECT 1 FROM ngos WHERE ngo_id = %(ngo_id)s") == \
+        "select ? from ngos where ngo_id = ?"
+
+
+def test_fingerprint_collapses_in_lists():
+    assert fingerprint("SELECT 1 FROM donations WHERE donation_id IN (1, 2, 3)") == \
+        fingerprint("SELECT 1 FROM donations WHERE donation_id IN (%s)") == \
+        "select ? from donations where donation_id in (?)"
+
+
+def test_fingerprint_accepts_bytes():
+    assert fingerprint(b"SELECT 1") == fingerprint("SELECT 1")
+
+
+def test_fingerprint_keeps_shapes_apart():
+    assert fingerprint("SELECT name FROM ngos WHERE ngo_id = 1") != \
+        fingerprint("SELECT name FROM donors WHERE donor_id = 1")
+
+
+def test_statement_budget_counts_statements(statement_budget):
+    with statement_budget(2) as stats:
+        _run("SELECT 1")
+        _run("SELECT 2")
+    assert stats.statements == 2
+    assert stats.repeated() == [("select ?", 2)]
+
+
+def test_statement_budget_fails_over_budget(statement_budget):
+    with pytest.raises(AssertionError, match=r"projects ran 3 statements \(budget 2\)"):
+        with statement_budget(2, "projects"):
+            for project_id in range(3):
+                _run(f"SELECT SUM(amount_utilized) FROM utilizations WHERE project_id = {project_id}")
+
+
+def test_statement_budget_only_counts_its_block(statement_budget):
+    _run("SELECT 1")
+    with statement_budget(0) as stats:
+        pass
+    _run("SELECT 1")
+    assert stats.statements == 0
+
+
+@pytest.fixture
+def request_stats():
+    """Install a RequestQueryStats in a request context, as _start_request does."""
+    app = Flask(__name__)
+
+    def install(mode):
+        g._query_stats = RequestQueryStats(n_plus_one=mode)
+        return g._query_stats
+
+    with app.test_request_context("/api/utilization/projects"):
+        yield install
+
+
+def test_n_plus_one_raises_past_threshold(request_stats):
+    request_stats("raise")
+    for project_id in range(query_stats.N_PLUS_ONE_THRESHOLD):
+        _run(f"SELECT 1 FROM projects WHERE project_id = {project_id}")
+    with pytest.raises(NPlusOneError) as e:
+        _run("SELECT 1 FROM projects WHERE project_id = 99")
+    message = json.loads(str(e.value))
+    assert message["count"] == query_stats.N_PLUS_ONE_THRESHOLD + 1
+    assert message["path"] == "/api/utilization/projects"
+    assert message["fingerprint"] == "select ? from projects where project_id = ?"
+
+
+def test_n_plus_one_ignores_distinct_shapes(request_stats):
+    stats = request_stats("raise")
+    for table in ("ngos", "donors", "projects", "donations", "utilizations", "notifications", "users"):
+        _run(f"SELECT COUNT(*) FROM {table}")
+    assert stats.statements == 7
+
+
+def test_n_plus_one_warns_once(request_stats, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(query_stats.statement_logger, "warning", warnings.append)
+    request_stats("warn")
+    for project_id in range(query_stats.N_PLUS_ONE_THRESHOLD + 5):
+        _run(f"SELECT 1 FROM projects WHERE project_id = {project_id}")
+    assert [json.loads(w)["event"] for w in warnings] == ["n_plus_one"]
+
+
+def test_n_plus_one_off_does_not_track(request_stats):
+    stats = request_stats("off")
+    for project_id in range(query_stats.N_PLUS_ONE_THRESHOLD + 5):
+        _run(f"SELECT 1 FROM projects WHERE project_id = {project_id}")
+    assert stats.shapes is None
+
+
+def test_named_cursor_fetches_add_to_their_statement(db, request_stats, statement_budget):
+    stats = request_stats("raise")
+    cur = db.cursor(name="test_batches")
+    with statement_budget(1) as block:
+        cur.execute("SELECT g FROM generate_series(1, 100) g")
+        batches = 0
+        while cur.fetchmany(10):
+            batches += 1
+    cur.close()
+    db.rollback()
+    assert batches > query_stats.N_PLUS_ONE_THRESHOLD
+    assert stats.statements == block.statements == 1
+    assert stats.rows == block.rows == 100
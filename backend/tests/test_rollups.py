@@ -0,0 +1,105 @@
+"""Rollup totals: undated rows still count, and the overall report follows
+utilization through the donation window (needs a database)."""
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from jwt_utils import encode_jwt
+from ledger import apply_utilizations
+from rollups import record_donations, record_utilizations
+
+
+@pytest.fixture
+def scratch_ngo(db, flask_app):
+    """An NGO of our own, removed again with its donations, utilizations and rollup rows."""
+    cur = db.cursor()
+    cur.execute("INSERT INTO users (email, password_hash, role) VALUES (%s, 'x', 'NGO') RETURNING user_id",
+                (f"test-rollups-{time.time_ns()}@example.org",))
+    user_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO ngos (user_id, name) VALUES (%s, 'Rollups Test NGO') RETURNING ngo_id", (user_id,))
+    ngo_id = cur.fetchone()[0]
+    db.commit()
+    token = encode_jwt({"user_id": user_id, "role": "ngo", "ngo_id": ngo_id, "exp": int(time.time()) + 600},
+                       flask_app.config["SECRET_KEY"])
+    try:
+        yield ngo_id, {"Authorization": "Bearer " + token}
+    finally:
+        cur.execute("DELETE FROM utilization_monthly_rollup WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM donation_monthly_rollup WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM utilizations WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM donations WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM ngos WHERE ngo_id = %s", (ngo_id,))
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        db.commit()
+        cur.close()
+
+
+def _add(db, ngo_id, donated_at, amount, utilized_at, utilized):
+    cur = db.cursor()
+    cur.execute("INSERT INTO donations (ngo_id, amount, purpose, donated_at) "
+                "VALUES (%s, %s, 'Food', %s) RETURNING donation_id", (ngo_id, amount, donated_at))
+    donation_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO utilizations (ngo_id, donation_id, amount_utilized, utilized_at) "
+                "VALUES (%s, %s, %s, %s) RETURNING utilization_id", (ngo_id, donation_id, utilized, utilized_at))
+    utilization_id = cur.fetchone()[0]
+    record_donations(cur, [donation_id])
+    apply_utilizations(cur, [utilization_id])
+    record_utilizations(cur, [utilization_id])
+    db.commit()
+    cur.close()
+
+
+def _overall(client, section="all_time_stats"):
+    response = client.get("/api/reports/overall")
+    assert response.status_code == 200
+    return response.get_json()[section]
+
+
+def test_undated_rows_count_in_all_time_totals(client, db, scratch_ngo):
+    ngo_id, headers = scratch_ngo
+    before = _overall(client)
+
+    _add(db, ngo_id, "2026-01-15", 100, "2026-01-20", 30)
+    _add(db, ngo_id, None, 50, None, 20)
+
+    dashboard = client.get("/api/ngo/dashboard", headers=headers).get_json()
+    assert dashboard["summary"]["totalDonationsReceived"] == 150
+    assert dashboard["summary"]["utilizedFunds"] == 50
+
+    after = _overall(client)
+    assert after["total_donations"] == pytest.approx(before["total_donations"] + 150)
+    assert after["total_utilized"] == pytest.approx(before["total_utilized"] + 50)
+
+
+def test_undated_rows_roll_up_under_a_null_month(client, db, scratch_ngo):
+    ngo_id, _ = scratch_ngo
+    _add(db, ngo_id, None, 50, None, 20)
+    _add(db, ngo_id, None, 25, None, 5)
+
+    cur = db.cursor()
+    cur.execute("SELECT month, total_amount, donation_count, total_utilized, utilization_count "
+                "FROM donation_monthly_rollup WHERE ngo_id = %s", (ngo_id,))
+    assert cur.fetchall() == [(None, 75, 2, 25, 2)]
+    cur.execute("SELECT month, total_utilized, utilization_count FROM utilization_monthly_rollup WHERE ngo_id = %s",
+                (ngo_id,))
+    assert cur.fetchall() == [(None, 25, 2)]
+    cur.close()
+
+
+def test_report_utilization_follows_the_donation_month(client, db, scratch_ngo):
+    ngo_id, _ = scratch_ngo
+    this_month = date.today().replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    before = _overall(client, "yearly_summary")
+    trends_before = {m["month"]: m["utilization"] for m in _overall(client, "monthly_trends")}
+
+    # donated last month, utilized this month
+    _add(db, ngo_id, last_month, 100, this_month, 40)
+
+    after = _overall(client, "yearly_summary")
+    trends = {m["month"]: m["utilization"] for m in _overall(client, "monthly_trends")}
+    label = last_month.strftime("%b")
+    assert trends[label] == pytest.approx(trends_before.get(label, 0) + 40)
+    assert after["total_utilized"] == pytest.approx(before["total_utilized"] + 40)
+    assert after["total_utilizations"] == before["total_utilizations"] + 1
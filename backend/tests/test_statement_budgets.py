@@ -0,0 +1,13 @@
+"""Statement budgets of the hot read endpoints (needs a seeded database)."""
+import pytest
+
+from check_statement_budgets import BUDGETS
+
+
+@pytest.mark.parametrize("label,path,principal,budget", BUDGETS, ids=[b[0] for b in BUDGETS])
+def test_endpoint_within_statement_budget(client, statement_budget, seeded_principals,
+                                          label, path, principal, budget):
+    headers, donor_id = seeded_principals
+    with statement_budget(budget, label):
+        response = client.get(path.format(donor_id=donor_id), headers=headers[principal])
+    assert response.status_code == 200, response.get_data(as_text=True)[:500]
@@ -1,66 +1,67 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, g
 from psycopg2.extras import RealDictCursor
-from db import get_db
-from jwt_utils import decode_jwt
+from db import get_db, rows_as_dicts
+from pagination import page_params, keyset_params, keyset_after, encode_cursor
+from export_utils import stream_query
+from rollups import record_utilizations
+from ledger import lock_donations, apply_utilizations
+from bulk_import import import_utilizations
+from admin_routes import invalidate_admin_dashboard
+from donation_routes import invalidate_donation_summary
+from idempotency import IdempotentRequest
 from datetime import datetime
+from werkzeug.http import http_date
+from decimal import Decimal, InvalidOperation
 
 utilization_bp = Blueprint("utilization", __name__, url_prefix="/api/utilization")
 
 
 @utilization_bp.route("/projects", methods=["GET"])
 def get_ngo_projects():
-    """Fetch all projects for the NGO"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
-
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            # Get ngo_id from user_id
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            return jsonify({"error": "Invalid token"}), 401
+    """Fetch all projects for the NGO
+
+    Query args: limit, offset (every project when no limit is given).
+    """
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
 
     if not ngo_id:
         return jsonify({"error": "NGO not found"}), 404
 
+    limit, offset = page_params()
+
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    # Fetch projects with budget info
+    # One statement for the whole page: the utilized total is aggregated per
+    # project of the page only, so the query count does not grow with projects
     cur.execute(
-        "SELECT project_id, name, description, budget, status, created_at "
-        "FROM projects "
-        "WHERE ngo_id = %s "
-        "ORDER BY created_at DESC",
-        (ngo_id,)
+        "WITH page AS ("
+        "    SELECT project_id, name, description, budget, status, created_at, "
+        "           COUNT(*) OVER () as total_count "
+        "    FROM projects "
+        "    WHERE ngo_id = %s "
+        "    ORDER BY created_at DESC, project_id DESC "
+        "    LIMIT %s OFFSET %s"
+        ") "
+        "SELECT page.*, util.total_utilized "
+        "FROM page "
+        "LEFT JOIN LATERAL ("
+        "    SELECT COALESCE(SUM(u.amount_utilized), 0) as total_utilized "
+        "    FROM utilizations u "
+        "    WHERE u.ngo_id = %s AND u.project_id = page.project_id"
+        ") util ON true "
+        "ORDER BY page.created_at DESC, page.project_id DESC",
+        (ngo_id, limit, offset, ngo_id)
     )
     projects = cur.fetchall()
 
     project_list = []
     for p in projects:
         budget = float(p.get("budget")) if p.get("budget") is not None else 0
-        
-        # Get utilization for this project
-        cur.execute(
-            "SELECT COALESCE(SUM(amount_utilized), 0) as total_utilized "
-            "FROM utilizations "
-            "WHERE ngo_id = %s AND project_id = %s",
-            (ngo_id, p.get("project_id"))
-        )
-        util_result = cur.fetchone()
-        utilized = float(util_result["total_utilized"]) if util_result and util_result.get("total_utilized") else 0
-        
+        utilized = float(p.get("total_utilized")) if p.get("total_utilized") else 0
+
         completion_percent = 0
         if budget > 0:
             completion_percent = min(int((utilized / budget) * 100), 100)
@@ -73,37 +74,29 @@ def get_ngo_projects():
             "amount_utilized": utilized,
             "completion_percent": completion_percent,
             "status": p.get("status"),
-            "created_at": p.get("created_at")
+            # RFC 822, as this endpoint has always returned it
+            "created_at": http_date(p["created_at"]) if p.get("created_at") else None
         })
 
     cur.close()
     conn.close()
 
-    return jsonify({"projects": project_list})
+    return jsonify({
+        "projects": project_list,
+        "pagination": {
+            "limit": limit,
+            "offset": offset,
+            "total": projects[0]["total_count"] if projects else 0
+        }
+    })
 
 
 @utilization_bp.route("/donations", methods=["GET"])
 def get_ngo_donations():
     """Fetch all donations for the NGO"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
-
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            return jsonify({"error": "Invalid token"}), 401
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
 
     if not ngo_id:
         return jsonify({"error": "NGO not found"}), 404
@@ -114,12 +107,10 @@ def get_ngo_donations():
     # Fetch donations with utilization stats
     cur.execute(
         "SELECT d.donation_id, dn.name as donor_name, d.amount, d.donated_at, d.purpose, "
-        "COALESCE(SUM(u.amount_utilized), 0) as amount_utilized "
+        "d.amount_utilized "
         "FROM donations d "
         "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
-        "LEFT JOIN utilizations u ON d.donation_id = u.donation_id "
         "WHERE d.ngo_id = %s "
-        "GROUP BY d.donation_id, dn.name, d.amount, d.donated_at, d.purpose "
         "ORDER BY d.donated_at DESC",
         (ngo_id,)
     )
@@ -151,143 +142,136 @@ def get_ngo_donations():
 
 @utilization_bp.route("/records", methods=["GET"])
 def get_utilization_records():
-    """Fetch utilization records - all utilizations if no auth, or NGO-specific if authenticated"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
-
-    # Try to get NGO ID from token
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            pass  # Continue without NGO filter
+    """Fetch utilization records - all utilizations if no auth, or NGO-specific if authenticated
+
+    Query args: limit, cursor.  Without either the whole list is returned;
+    follow ``pagination.next_cursor`` to page.
+    """
+    # NGO filter comes from the token, if any; invalid tokens just drop the filter
+    ngo_id = g.ngo_id
+
+    try:
+        limit, cursor = keyset_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = []
+    params = []
+    if ngo_id:
+        filters.append("u.ngo_id = %s")
+        params.append(ngo_id)
 
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    # Fetch utilizations (NGO-specific or all)
-    if ngo_id:
+    # Summary is computed in SQL once, on the first page
+    summary = None
+    if cursor is None:
         cur.execute(
-            "SELECT u.utilization_id, u.donation_id, u.project_id, u.amount_utilized, u.purpose, "
-            "u.beneficiaries, u.location, u.utilized_at, "
-            "COALESCE(dn.name, 'Anonymous') as donor_name, "
-            "COALESCE(n.name, 'Unknown NGO') as ngo_name "
+            "SELECT COALESCE(SUM(u.amount_utilized), 0) as total_utilized, "
+            "COUNT(DISTINCT u.project_id) as active_projects, "
+            "COUNT(*) FILTER (WHERE u.amount_utilized > 0) as completed_projects, "
+            "COALESCE(SUM(u.beneficiaries), 0) as total_beneficiaries, "
+            "COUNT(*) as total_count "
             "FROM utilizations u "
-            "LEFT JOIN donations d ON u.donation_id = d.donation_id "
-            "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
-            "LEFT JOIN ngos n ON u.ngo_id = n.ngo_id "
-            "WHERE u.ngo_id = %s "
-            "ORDER BY u.utilized_at DESC",
-            (ngo_id,)
-        )
-    else:
-        # Get all utilizations across all NGOs
-        cur.execute(
-            "SELECT u.utilization_id, u.donation_id, u.project_id, u.amount_utilized, u.purpose, "
-            "u.beneficiaries, u.location, u.utilized_at, "
-            "COALESCE(dn.name, 'Anonymous') as donor_name, "
-            "COALESCE(n.name, 'Unknown NGO') as ngo_name "
-            "FROM utilizations u "
-            "LEFT JOIN donations d ON u.donation_id = d.donation_id "
-            "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
-            "LEFT JOIN ngos n ON u.ngo_id = n.ngo_id "
-            "ORDER BY u.utilized_at DESC"
+            + ("WHERE " + " AND ".join(filters) if filters else ""),
+            params
         )
-    
-    records = cur.fetchall()
-
-    utilization_list = []
-    total_utilized = 0
-    active_projects = set()
-    total_beneficiaries = 0
-    completed_count = 0
-    
-    for r in records:
-        amount = float(r.get("amount_utilized")) if r.get("amount_utilized") else 0
-        beneficiaries = r.get("beneficiaries") or 0
-        
-        total_utilized += amount
-        total_beneficiaries += beneficiaries
-        
-        project_name = "Unknown"
-        if r.get("project_id"):
-            cur.execute(
-                "SELECT name FROM projects WHERE project_id = %s",
-                (r.get("project_id"),)
-            )
-            proj_result = cur.fetchone()
-            if proj_result:
-                project_name = proj_result["name"]
-            active_projects.add(r.get("project_id"))
-        
-        # Determine status based on utilization
-        status = "Completed" if amount > 0 else "Pending"
-        if status == "Completed":
-            completed_count += 1
-        
-        utilization_list.append({
-            "utilization_id": r.get("utilization_id"),
-            "donation_id": r.get("donation_id"),
-            "project_id": r.get("project_id"),
-            "donor_name": r.get("donor_name") or "Unknown",
-            "project_name": project_name,
-            "amount_utilized": amount,
-            "purpose": r.get("purpose") or "General",
-            "beneficiaries": beneficiaries,
-            "location": r.get("location") or "Unknown",
-            "utilized_at": str(r.get("utilized_at")) if r.get("utilized_at") else None,
-            "ngo_name": r.get("ngo_name") or "Unknown NGO",
-            "status": status
-        })
+        row = cur.fetchone()
+        summary = {
+            "total_utilized": float(row["total_utilized"]),
+            "active_projects": row["active_projects"],
+            "completed_projects": row["completed_projects"],
+            "total_beneficiaries": int(row["total_beneficiaries"]),
+            "total_count": row["total_count"]
+        }
 
+    # Keyset page over (utilized_at, utilization_id), newest first (undated rows first)
+    page_filters = list(filters)
+    page_args = list(params)
+    if cursor is not None:
+        condition, condition_args = keyset_after("u.utilized_at", "u.utilization_id", cursor)
+        page_filters.append(condition)
+        page_args.extend(condition_args)
+    cur.close()
+    cur = conn.cursor()
+    # Output rows straight from SQL: defaults are applied here and the JSON
+    # provider renders the numeric/timestamp columns
+    cur.execute(
+        "SELECT u.utilization_id, u.donation_id, u.project_id, "
+        "CASE WHEN dn.name = '' THEN 'Unknown' ELSE COALESCE(dn.name, 'Anonymous') END as donor_name, "
+        "COALESCE(NULLIF(p.name, ''), 'Unknown') as project_name, "
+        "COALESCE(u.amount_utilized, 0) as amount_utilized, "
+        "COALESCE(NULLIF(u.purpose, ''), 'General') as purpose, "
+        "COALESCE(u.beneficiaries, 0) as beneficiaries, "
+        "COALESCE(NULLIF(u.location, ''), 'Unknown') as location, "
+        "u.utilized_at, "
+        "COALESCE(NULLIF(n.name, ''), 'Unknown NGO') as ngo_name, "
+        "CASE WHEN u.amount_utilized > 0 THEN 'Completed' ELSE 'Pending' END as status "
+        "FROM utilizations u "
+        "LEFT JOIN donations d ON u.donation_id = d.donation_id "
+        "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
+        "LEFT JOIN ngos n ON u.ngo_id = n.ngo_id "
+        "LEFT JOIN projects p ON u.project_id = p.project_id "
+        + ("WHERE " + " AND ".join(page_filters) + " " if page_filters else "")
+        + "ORDER BY u.utilized_at DESC NULLS FIRST, u.utilization_id DESC "
+        "LIMIT %s",
+        page_args + [None if limit is None else limit + 1]
+    )
+    utilization_list = rows_as_dicts(cur)
     cur.close()
     conn.close()
 
-    return jsonify({
+    next_cursor = None
+    if limit is not None and len(utilization_list) > limit:
+        utilization_list = utilization_list[:limit]
+        last = utilization_list[-1]
+        next_cursor = encode_cursor(last["utilized_at"], last["utilization_id"])
+
+    response = {
         "records": utilization_list,
-        "summary": {
-            "total_utilized": total_utilized,
-            "active_projects": len(active_projects),
-            "completed_projects": completed_count,
-            "total_beneficiaries": total_beneficiaries,
-            "total_count": len(utilization_list)
+        "pagination": {
+            "limit": limit,
+            "next_cursor": next_cursor
         }
-    })
+    }
+    if summary is not None:
+        response["summary"] = summary
+    return jsonify(response)
+
+
+@utilization_bp.route("/export", methods=["GET"])
+def export_utilization_records():
+    """Stream utilization records as NDJSON (default) or CSV (?format=csv), scoped like /records"""
+    ngo_id = g.ngo_id
+
+    try:
+        return stream_query(
+            "SELECT u.utilization_id, u.donation_id, u.project_id, p.name as project_name, "
+            "COALESCE(dn.name, 'Anonymous') as donor_name, "
+            "COALESCE(n.name, 'Unknown NGO') as ngo_name, "
+            "u.amount_utilized, u.purpose, u.beneficiaries, u.location, u.utilized_at "
+            "FROM utilizations u "
+            "LEFT JOIN donations d ON u.donation_id = d.donation_id "
+            "LEFT JOIN donors dn ON d.donor_id = dn.donor_id "
+            "LEFT JOIN ngos n ON u.ngo_id = n.ngo_id "
+            "LEFT JOIN projects p ON u.project_id = p.project_id "
+            + ("WHERE u.ngo_id = %s " if ngo_id else "")
+            + "ORDER BY u.utilized_at DESC, u.utilization_id DESC",
+            [ngo_id] if ngo_id else [],
+            request.args.get("format", "ndjson"),
+            "utilizations"
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @utilization_bp.route("/add-project", methods=["POST"])
 def add_project():
     """Add a new project"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
-
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            return jsonify({"error": "Invalid token"}), 401
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
 
     if not ngo_id:
         return jsonify({"error": "NGO not found"}), 404
@@ -326,25 +310,9 @@ def add_project():
 @utilization_bp.route("/add-utilization", methods=["POST"])
 def add_utilization():
     """Add a new utilization record"""
-    auth_header = request.headers.get("Authorization")
-    ngo_id = None
-
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1]
-        try:
-            payload = decode_jwt(token, current_app.config.get("SECRET_KEY"))
-            user_id = payload.get("user_id")
-            
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT ngo_id FROM ngos WHERE user_id = %s", (user_id,))
-            ngo = cur.fetchone()
-            if ngo:
-                ngo_id = ngo["ngo_id"]
-            cur.close()
-            conn.close()
-        except ValueError:
-            return jsonify({"error": "Invalid token"}), 401
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
 
     if not ngo_id:
         return jsonify({"error": "NGO not found"}), 404
@@ -360,25 +328,111 @@ def add_utilization():
 
     if not donation_id or not amount_utilized:
         return jsonify({"error": "Donation ID and amount are required"}), 400
+    try:
+        donation_id = int(donation_id)
+        amount = Decimal(str(amount_utilized))
+    except (TypeError, ValueError, InvalidOperation):
+        return jsonify({"error": "Invalid donation ID or amount"}), 400
+    if not amount.is_finite() or amount <= 0:
+        return jsonify({"error": "Amount must be positive"}), 400
+
+    # Retries carrying the same Idempotency-Key get the first response back
+    try:
+        idem = IdempotentRequest.from_request(f"utilization:{g.user_id}", data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if idem and idem.replay():
+        return idem.respond()
 
     try:
         conn = get_db()
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        
+
+        # Claim the key before locking the donation, so a duplicate waits for
+        # the first attempt and replays its response
+        if idem and idem.claim(cur):
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return idem.respond()
+
+        # Lock the donation so concurrent utilizations cannot over-allocate it;
+        # only the caller's own donations can be drawn on
+        remaining = lock_donations(cur, [donation_id], ngo_id=ngo_id).get(donation_id)
+        if remaining is None:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({"error": "Donation not found"}), 404
+        if amount > remaining:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({
+                "error": "Amount exceeds the donation's remaining balance",
+                "remaining_balance": float(remaining)
+            }), 400
+
         cur.execute(
             "INSERT INTO utilizations (ngo_id, donation_id, project_id, amount_utilized, purpose, "
             "beneficiaries, location, utilized_at) "
             "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING utilization_id",
-            (ngo_id, donation_id, project_id, amount_utilized, purpose, beneficiaries, location, utilized_at)
+            (ngo_id, donation_id, project_id, amount, purpose, beneficiaries, location, utilized_at)
         )
         result = cur.fetchone()
         utilization_id = result["utilization_id"]
-        
+        apply_utilizations(cur, [utilization_id])
+        record_utilizations(cur, [utilization_id])
+
+        response = {"message": "Utilization record added successfully", "utilization_id": utilization_id}
+        if idem:
+            idem.store(cur, response, 201)
         conn.commit()
+        if idem:
+            idem.committed()
+        invalidate_admin_dashboard()
+        invalidate_donation_summary()
         cur.close()
         conn.close()
 
-        return jsonify({"message": "Utilization record added successfully", "utilization_id": utilization_id}), 201
+        return jsonify(response), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@utilization_bp.route("/bulk", methods=["POST"])
+def bulk_import_utilizations():
+    """Bulk-load utilization rows for the caller's NGO from a CSV or NDJSON body
+
+    ?format=csv|ndjson (default from Content-Type, else csv); ?partial=1 inserts
+    the valid rows even when others fail; ?dry_run=1 only validates.
+    """
+    if g.auth_error:
+        return jsonify({"error": "Invalid token"}), 401
+    ngo_id = g.ngo_id
+    if not ngo_id:
+        return jsonify({"error": "NGO not found"}), 404
 
+    fmt = request.args.get("format") or ("ndjson" if "json" in request.mimetype else "csv")
+    partial = request.args.get("partial") in ("1", "true")
+    dry_run = request.args.get("dry_run") in ("1", "true")
+
+    conn = get_db()
+    try:
+        report = import_utilizations(conn, request.stream, fmt, ngo_id=ngo_id,
+                                     partial=partial, dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        print(f"Error importing utilizations: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    if report["inserted"]:
+        invalidate_admin_dashboard()
+        invalidate_donation_summary()
+    if report["error_count"] and not (partial or dry_run):
+        return jsonify(report), 422
+    return jsonify(report), 201 if report["inserted"] else 200